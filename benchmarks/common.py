@@ -0,0 +1,204 @@
+import io
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from request_logger.core.storage import AbstractStorage
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def summarize(name: str, samples_ns: List[int], params: Optional[Dict[str, Any]] = None, unit_ops: int = 1) -> Dict[str, Any]:
+    """
+    Turn per-iteration timings into a result record. `unit_ops` is the number
+    of operations performed by one iteration.
+    """
+    samples_ns = sorted(samples_ns)
+    total_s = sum(samples_ns) / 1e9
+    quantiles = statistics.quantiles(samples_ns, n=100) if len(samples_ns) > 1 else samples_ns * 99
+    return {
+        'name': name,
+        'params': params or {},
+        'iterations': len(samples_ns),
+        'total_s': total_s,
+        'ops_per_s': (len(samples_ns) * unit_ops) / total_s if total_s else None,
+        'mean_us': statistics.fmean(samples_ns) / 1e3,
+        'p50_us': quantiles[49] / 1e3,
+        'p95_us': quantiles[94] / 1e3,
+        'p99_us': quantiles[98] / 1e3,
+        'max_us': samples_ns[-1] / 1e3,
+    }
+
+
+def measure(func: Callable[[], Any], iterations: int, warmup: int = 0) -> List[int]:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+@contextmanager
+def temp_dir() -> Iterator[str]:
+    path = tempfile.mkdtemp(prefix='request_logger_bench_')
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def make_request_data(i: int, body_size: int = 256) -> Dict[str, Any]:
+    return {
+        'id': f'{i:032x}',
+        'timestamp': f'20240101{(i // 3600) % 24:02d}{(i // 60) % 60:02d}{i % 60:02d}{i % 1000000:06d}',
+        'method': ('GET', 'POST', 'PUT', 'DELETE')[i % 4],
+        'url': f'https://api{i % 10}.example.com/v1/items/{i}?page={i % 7}',
+        'headers': {'Content-Type': 'application/json', 'Content-Length': str(body_size)},
+        'data': None,
+        'json': {'payload': 'x' * body_size},
+        'files': None,
+        'original_kwargs': {},
+    }
+
+
+class NullStorage(AbstractStorage):
+    """
+    Storage that discards everything, used to measure capture overhead alone.
+    """
+    max_logs = None
+
+    def save_request(self, request_id, request_data):
+        pass
+
+    def load_request(self, request_id):
+        raise FileNotFoundError(request_id)
+
+    def delete_request(self, request_id):
+        pass
+
+    def _delete_by_identifier(self, identifier):
+        pass
+
+    def search_requests(self, query):
+        return []
+
+    def list_request_ids(self):
+        return []
+
+    def list_filenames(self):
+        return []
+
+    def get_sorted_identifiers(self):
+        return []
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the subset of the boto3 S3 client used by
+    S3Storage. `latency_s` adds a fixed delay to every call to model a
+    network round-trip.
+    """
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.objects: Dict[str, bytes] = {}
+        self._lock = Lock()
+
+    def _wait(self):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def put_object(self, Bucket, Key, Body):
+        self._wait()
+        with self._lock:
+            self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else Body
+
+    def get_object(self, Bucket, Key):
+        self._wait()
+        with self._lock:
+            if Key not in self.objects:
+                raise self.exceptions.NoSuchKey(Key)
+            return {'Body': io.BytesIO(self.objects[Key])}
+
+    def delete_object(self, Bucket, Key):
+        self._wait()
+        with self._lock:
+            self.objects.pop(Key, None)
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=''):
+                client._wait()
+                with client._lock:
+                    keys = sorted(k for k in client.objects if k.startswith(Prefix))
+                for start in range(0, len(keys), 1000):
+                    yield {'Contents': [{'Key': k} for k in keys[start:start + 1000]]}
+        return Paginator()
+
+
+@contextmanager
+def echo_server() -> Iterator[str]:
+    """
+    Local HTTP server that answers every request with a small JSON body.
+    """
+    body = b'{"ok": true}'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
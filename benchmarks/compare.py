@@ -0,0 +1,57 @@
+"""
+Compare two benchmark result files and report regressions.
+
+Usage:
+    python benchmarks/compare.py baseline.json results.json --threshold 0.15
+
+Exits with status 1 if any benchmark's p50 latency grew by more than the
+threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def _key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(baseline, current, threshold):
+    baseline_results = {_key(r): r for r in baseline['results']}
+    regressions = []
+    rows = []
+    for result in current['results']:
+        before = baseline_results.get(_key(result))
+        if before is None or not before['p50_us']:
+            continue
+        change = (result['p50_us'] - before['p50_us']) / before['p50_us']
+        rows.append((result['name'], result['params'], before['p50_us'], result['p50_us'], change))
+        if change > threshold:
+            regressions.append(rows[-1])
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed relative p50 increase (default: 0.15)')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    for name, params, before, after, change in rows:
+        marker = '  REGRESSION' if change > args.threshold else ''
+        print(f"{name:28} {json.dumps(params):60} {before:12.1f}us -> {after:12.1f}us {change:+7.1%}{marker}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+"""
+Benchmark suite for request_logger.
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --quick --only capture,search
+    python benchmarks/compare.py baseline.json results.json
+
+Results are written as JSON together with the commit and environment they
+were measured on, so runs from different commits can be compared.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import (  # noqa: E402
+    FakeS3Client, NullStorage, echo_server, environment, make_request_data, measure, summarize, temp_dir,
+)
+from request_logger.cli.progress import Checkpoint, Progress  # noqa: E402
+from request_logger.cli.transfer import export_requests  # noqa: E402
+from request_logger.core.metadata_store import MetadataStore  # noqa: E402
+from request_logger.core.replayer import Replayer  # noqa: E402
+from request_logger.core.request_logger import RequestLogger  # noqa: E402
+from request_logger.core.storage.file import FileStorage  # noqa: E402
+from request_logger.core.storage.memory import MemoryStorage  # noqa: E402
+from request_logger.core.storage.s3 import S3Storage  # noqa: E402
+
+
+def bench_capture(quick: bool) -> List[Dict[str, Any]]:
+    iterations = 2000 if quick else 20000
+    results = []
+    logger = RequestLogger(storage=NullStorage(), max_logs=None)
+    cases = {
+        'get': ('GET', 'https://api.example.com/items?b=2&a=1', {}),
+        'json': ('POST', 'https://api.example.com/items', {'json': {'name': 'x' * 64, 'tags': list(range(20))}}),
+        'bytes_64k': ('POST', 'https://api.example.com/upload', {'data': os.urandom(64 * 1024)}),
+    }
+    for case, (method, url, kwargs) in cases.items():
+        samples = measure(lambda: logger.log_request(method, url, **kwargs), iterations, warmup=100)
+        results.append(summarize('log_request', samples, {'case': case, 'storage': 'null'}))
+
+    # Past max_body_size only the first bytes, the length and the hash are recorded
+    large = os.urandom(16 * 1024 * 1024)
+    samples = measure(lambda: logger.log_request('POST', 'https://api.example.com/upload', data=large), 20 if quick else 100, warmup=2)
+    results.append(summarize('log_request', samples, {'case': 'bytes_16m', 'storage': 'null'}))
+
+    with temp_dir() as tmp:
+        storage = FileStorage(
+            storage_dir=os.path.join(tmp, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(tmp, 'metadata.db')),
+        )
+        logger = RequestLogger(storage=storage, max_logs=None)
+        samples = measure(lambda: logger.log_request('GET', 'https://api.example.com/items'), iterations // 4, warmup=10)
+        results.append(summarize('log_request', samples, {'case': 'get', 'storage': 'file'}))
+        storage.close()
+    return results
+
+
+def _storage_roundtrip(name: str, storage, count: int, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    records = [make_request_data(i) for i in range(count)]
+    ids = iter(records)
+
+    def save():
+        request_data = next(ids)
+        storage.save_request(request_data['id'], dict(request_data))
+
+    results = [summarize(f'{name}.save', measure(save, count), params)]
+
+    load_ids = iter([r['id'] for r in records])
+    results.append(summarize(f'{name}.load', measure(lambda: storage.load_request(next(load_ids)), count), params))
+
+    for prefetch in (None, 1, 8):
+        samples = measure(lambda: sum(1 for _ in storage.iter_requests([r['id'] for r in records], prefetch=prefetch)), 1)
+        results.append(summarize(f'{name}.iter_requests', samples, {**params, 'prefetch': prefetch}, unit_ops=count))
+    return results
+
+
+def bench_storage(quick: bool) -> List[Dict[str, Any]]:
+    count = 200 if quick else 2000
+    results = []
+    for durability in ('none', 'group', 'record'):
+        with temp_dir() as tmp:
+            storage = FileStorage(
+                storage_dir=os.path.join(tmp, 'logs'), max_logs=None,
+                metadata_store=MetadataStore(os.path.join(tmp, 'metadata.db')),
+                durability=durability,
+            )
+            results += _storage_roundtrip('file', storage, count, {'records': count, 'durability': durability})
+            storage.close()
+
+    storage = MemoryStorage(max_logs=None)
+    results += _storage_roundtrip('memory', storage, count, {'records': count})
+
+    # A small fixed latency models the S3 round-trip that dominates real use
+    for latency_ms in (0, 2):
+        storage = S3Storage('bench', max_logs=None, s3_client=FakeS3Client(latency_s=latency_ms / 1000))
+        results += _storage_roundtrip('s3', storage, count // 4, {'records': count // 4, 'latency_ms': latency_ms})
+    return results
+
+
+def bench_search(quick: bool) -> List[Dict[str, Any]]:
+    sizes = (10 ** 4,) if quick else (10 ** 4, 10 ** 5, 10 ** 6)
+    queries = {
+        'method': ({'method': 'POST'}, None, None),
+        'url': ({'url': 'api3.example.com'}, None, None),
+        'time_range': ({}, '20240101010000000000', '20240101010100000000'),
+    }
+    results = []
+    for size in sizes:
+        with temp_dir() as tmp:
+            store = MetadataStore(os.path.join(tmp, 'metadata.db'))
+            with store.lock:
+                store.cursor.executemany(
+                    'INSERT INTO request_metadata (id, timestamp, method, url, fingerprint) VALUES (?, ?, ?, ?, ?)',
+                    ((r['id'], r['timestamp'], r['method'], r['url'], f'{i % 1000:x}')
+                     for i, r in enumerate(make_request_data(i, 0) for i in range(size))),
+                )
+                store.connection.commit()
+            for case, (query, start, end) in queries.items():
+                samples = measure(lambda: store.search(query, start_time=start, end_time=end), 20, warmup=2)
+                results.append(summarize('metadata.search', samples, {'rows': size, 'case': case}))
+            samples = measure(lambda: store.list_requests(limit=50), 50, warmup=2)
+            results.append(summarize('metadata.list_requests', samples, {'rows': size}))
+            store.close()
+    return results
+
+
+def bench_retention(quick: bool) -> List[Dict[str, Any]]:
+    count = 300 if quick else 3000
+    results = []
+    for max_logs in (None, 100, 1000):
+        with temp_dir() as tmp:
+            storage = FileStorage(
+                storage_dir=os.path.join(tmp, 'logs'), max_logs=max_logs,
+                metadata_store=MetadataStore(os.path.join(tmp, 'metadata.db')),
+            )
+            records = iter([make_request_data(i) for i in range(count)])
+
+            def save():
+                request_data = next(records)
+                storage.save_request(request_data['id'], request_data)
+
+            results.append(summarize('retention.save', measure(save, count), {'max_logs': max_logs, 'records': count}))
+            storage.close()
+    return results
+
+
+def bench_replay(quick: bool) -> List[Dict[str, Any]]:
+    count = 100 if quick else 1000
+    results = []
+    with temp_dir() as tmp, echo_server() as base_url:
+        storage = FileStorage(
+            storage_dir=os.path.join(tmp, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(tmp, 'metadata.db')),
+        )
+        ids = []
+        for i in range(count):
+            request_data = make_request_data(i, 64)
+            request_data['url'] = f'{base_url}/items/{i}'
+            storage.save_request(request_data['id'], request_data)
+            ids.append(request_data['id'])
+
+        replayer = Replayer(storage)
+        samples = measure(lambda: sum(1 for _ in replayer.replay_requests(ids)), 1)
+        results.append(summarize('replay.replay_requests', samples, {'records': count}, unit_ops=count))
+        storage.close()
+    return results
+
+
+def bench_archive(quick: bool) -> List[Dict[str, Any]]:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print('Skipping archive: pyarrow is not installed', file=sys.stderr)
+        return []
+    from request_logger.core.archive import ParquetArchive
+
+    days = 5
+    per_day = 800 if quick else 4000
+    results = []
+    with temp_dir() as tmp:
+        storage = FileStorage(
+            storage_dir=os.path.join(tmp, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(tmp, 'metadata.db')),
+        )
+        for day in range(days):
+            for i in range(per_day):
+                request_data = make_request_data(i)
+                request_data['id'] = f'{day:02d}{i:030x}'
+                request_data['timestamp'] = f'2024010{day + 1}' + request_data['timestamp'][8:]
+                storage.save_request(request_data['id'], request_data)
+
+        output = os.path.join(tmp, 'archive')
+        pairs = storage.list_sorted_request_ids()
+        samples = measure(lambda: export_requests(
+            storage, output, pairs, Checkpoint(None, {}), Progress('export', enabled=False), format='parquet',
+        ), 1)
+        results.append(summarize('archive.export', samples, {'records': len(pairs)}, unit_ops=len(pairs)))
+
+        # One day of traffic, from JSON files through the metadata index and from Parquet
+        day = ('2024-01-03 00:00:00', '2024-01-03 23:59:59')
+        params = {'records': len(pairs), 'matched': per_day}
+        samples = measure(lambda: storage.search_requests({}, start_time=day[0], end_time=day[1]), 3)
+        results.append(summarize('archive.scan_day', samples, {**params, 'source': 'json'}))
+        archive = ParquetArchive(output)
+        samples = measure(lambda: archive.search_requests({}, start_time=day[0], end_time=day[1]), 3)
+        results.append(summarize('archive.scan_day', samples, {**params, 'source': 'parquet'}))
+        samples = measure(lambda: archive.scan({}, *day, columns=['method', 'host', 'status_code']), 3)
+        results.append(summarize('archive.scan_day', samples, {**params, 'source': 'parquet_columns'}))
+        storage.close()
+    return results
+
+
+# Import time budgets in milliseconds. Optional dependencies must stay out of
+# these imports; run.py exits non-zero when a budget is exceeded.
+IMPORT_BUDGETS_MS = {
+    'request_logger.core': 250,
+}
+# Modules that a plain file-logging import must not load
+HEAVY_MODULES = ('boto3', 'botocore', 'pyarrow', 'psycopg2', 'fastapi')
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter_ns()
+import {module}
+elapsed = time.perf_counter_ns() - start
+print(json.dumps({{'ns': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def bench_import(quick: bool) -> List[Dict[str, Any]]:
+    # Every sample is a fresh interpreter, as imports are cached per process
+    iterations = 5 if quick else 20
+    results = []
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        samples, loaded = [], set()
+        for _ in range(iterations):
+            output = subprocess.run(
+                [sys.executable, '-c', _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            probe = json.loads(output)
+            samples.append(probe['ns'])
+            loaded.update(probe['loaded'])
+        result = summarize('import', samples, {'module': module})
+        result['budget_ms'] = budget_ms
+        result['heavy_modules_loaded'] = sorted(loaded)
+        result['within_budget'] = result['p50_us'] / 1000 <= budget_ms and not loaded
+        results.append(result)
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[bool], List[Dict[str, Any]]]] = {
+    'import': bench_import,
+    'capture': bench_capture,
+    'storage': bench_storage,
+    'search': bench_search,
+    'retention': bench_retention,
+    'replay': bench_replay,
+    'archive': bench_archive,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', '-o', help='Write results as JSON to this file (default: stdout)')
+    parser.add_argument('--only', help=f"Comma separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help='Smaller sizes, for smoke runs')
+    args = parser.parse_args(argv)
+
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results = []
+    for name in selected:
+        print(f'Running {name}...', file=sys.stderr)
+        results.extend(BENCHMARKS[name](args.quick))
+
+    report = {'environment': environment(), 'quick': args.quick, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    over_budget = [r for r in results if r.get('within_budget') is False]
+    for result in over_budget:
+        print(
+            f"Import of {result['params']['module']} is over budget: p50 {result['p50_us'] / 1000:.1f}ms "
+            f"(budget {result['budget_ms']}ms), heavy modules loaded: {result['heavy_modules_loaded'] or 'none'}",
+            file=sys.stderr,
+        )
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
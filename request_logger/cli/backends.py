@@ -0,0 +1,56 @@
+import os
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import AbstractStorage, FileStorage, get_backend
+
+SPEC_HELP = (
+    "Storage location: a directory or file://DIR for file storage (add ?db=PATH "
+    "to choose the metadata database, by default metadata.db next to DIR), or "
+    "s3://BUCKET for S3 storage. Other registered backends are given as "
+    "NAME://LOCATION?OPTION=VALUE and receive the location and options as "
+    "constructor arguments."
+)
+
+
+def parse_spec(spec: str) -> Tuple[str, str, Dict[str, str]]:
+    """
+    Split a storage spec into (scheme, location, options).
+    """
+    location, _, options = spec.partition('?')
+    scheme, sep, rest = location.partition('://')
+    if not sep:
+        scheme, rest = 'file', location
+    return scheme, rest, dict(parse_qsl(options))
+
+
+def default_db_path(storage_dir: str) -> str:
+    # Matches the library defaults, where request_logs/ and metadata.db share a directory
+    return os.path.join(os.path.dirname(os.path.abspath(storage_dir)), 'metadata.db')
+
+
+def open_storage(spec: str, recover: bool = True) -> AbstractStorage:
+    """
+    Open the storage described by `spec` with retention disabled, so that bulk
+    jobs never evict records. Pass `recover=False` when only reading, so that
+    file storage in use by a logging process is left alone.
+    """
+    scheme, location, options = parse_spec(spec)
+    if scheme == 'file':
+        db_path = options.get('db') or default_db_path(location)
+        return FileStorage(storage_dir=location, max_logs=None, metadata_store=MetadataStore(db_path), recover=recover)
+    return get_backend(scheme)(location, max_logs=None, **options)
+
+
+def open_file_storage(spec: str, recover: bool = True) -> FileStorage:
+    storage = open_storage(spec, recover=recover)
+    if not isinstance(storage, FileStorage):
+        raise ValueError(f"{spec!r} is not file storage")
+    return storage
+
+
+def close_storage(storage: AbstractStorage) -> None:
+    close = getattr(storage, 'close', None)
+    if close is not None:
+        close()
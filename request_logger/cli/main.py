@@ -0,0 +1,228 @@
+"""
+request-logger: bulk maintenance of logged requests.
+
+    request-logger copy request_logs s3://my-bucket --checkpoint copy.ckpt
+    request-logger export request_logs archive/ --segment-records 50000 --gzip
+    request-logger export request_logs warehouse/ --format parquet --partition hour
+    request-logger import archive/ file://restored?db=restored.db
+    request-logger rebuild-index request_logs
+    request-logger compact request_logs
+    request-logger verify request_logs --deep --repair
+
+Jobs stream records with a bounded read-ahead window, so memory use does not
+grow with the number of records. With --checkpoint an interrupted job picks
+up where it stopped when run again with the same arguments.
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+from request_logger.cli import maintenance, transfer
+from request_logger.cli.backends import SPEC_HELP, close_storage, default_db_path, open_file_storage, open_storage, parse_spec
+from request_logger.cli.progress import Checkpoint, Progress
+
+
+def _query(args) -> Dict[str, str]:
+    return {field: getattr(args, field) for field in ('method', 'url') if getattr(args, field)}
+
+
+def _check_distinct(source: str, destination: str) -> None:
+    # Two file storages sharing one metadata.db would index each other's records
+    source_scheme, source_dir, source_options = parse_spec(source)
+    destination_scheme, destination_dir, destination_options = parse_spec(destination)
+    if source_scheme == destination_scheme == 'file':
+        source_db = source_options.get('db') or default_db_path(source_dir)
+        destination_db = destination_options.get('db') or default_db_path(destination_dir)
+        if source_db == destination_db:
+            raise ValueError(f"Source and destination share the metadata database {source_db}; pick another with ?db=PATH")
+
+
+def cmd_copy(args) -> int:
+    _check_distinct(args.source, args.destination)
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'copy', 'source': args.source, 'destination': args.destination})
+    source, destination = open_storage(args.source, recover=False), open_storage(args.destination)
+    try:
+        selection = (source, _query(args), args.start, args.end, checkpoint.position)
+        pairs = transfer.select_requests(*selection)
+        progress = Progress('move' if args.move else 'copy', total=None if args.quiet else transfer.count_requests(*selection), enabled=not args.quiet)
+        stats = transfer.copy_requests(
+            source, destination, pairs, checkpoint, progress,
+            readers=args.readers, writers=args.writers, move=args.move,
+        )
+    finally:
+        close_storage(source)
+        close_storage(destination)
+    print(f"Copied {stats['records']} requests in {stats['seconds']:.1f}s")
+    return 0
+
+
+def cmd_export(args) -> int:
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'export', 'source': args.source, 'output': args.output, 'format': args.format})
+    source = open_storage(args.source, recover=False)
+    try:
+        selection = (source, _query(args), args.start, args.end, checkpoint.position)
+        pairs = transfer.select_requests(*selection)
+        progress = Progress('export', total=None if args.quiet else transfer.count_requests(*selection), enabled=not args.quiet)
+        if args.format == 'parquet':
+            writer_options = {'partition': args.partition, 'include_bodies': not args.no_bodies}
+        else:
+            writer_options = {'compress': args.gzip}
+        stats = transfer.export_requests(
+            source, args.output, pairs, checkpoint, progress,
+            readers=args.readers, segment_records=args.segment_records, format=args.format, **writer_options,
+        )
+    finally:
+        close_storage(source)
+    print(f"Exported {stats['records']} requests ({stats['bytes']} bytes) in {stats['seconds']:.1f}s")
+    return 0
+
+
+def cmd_import(args) -> int:
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'import', 'input': args.input, 'destination': args.destination})
+    destination = open_storage(args.destination)
+    try:
+        progress = Progress('import', enabled=not args.quiet)
+        stats = transfer.import_requests(destination, args.input, checkpoint, progress, writers=args.writers)
+    finally:
+        close_storage(destination)
+    print(f"Imported {stats['records']} requests in {stats['seconds']:.1f}s")
+    return 0
+
+
+def cmd_rebuild_index(args) -> int:
+    scheme, storage_dir, options = parse_spec(args.storage)
+    if scheme != 'file':
+        raise ValueError("rebuild-index only applies to file storage")
+    db_path = options.get('db') or default_db_path(storage_dir)
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'rebuild-index', 'storage': args.storage})
+    progress = Progress('index', enabled=not args.quiet)
+    stats = maintenance.rebuild_index(storage_dir, db_path, checkpoint, progress, readers=args.readers)
+    print(f"Indexed {stats['records'] - len(stats['unreadable'])} requests into {db_path}")
+    if stats['tiered']:
+        print(f"Kept {stats['tiered']} requests stored in other tiers")
+    elif stats['tiered'] is None:
+        print("Could not read the old index; requests stored in other tiers are no longer indexed")
+    _print_list('Unreadable files', stats['unreadable'])
+    return 1 if stats['unreadable'] or stats['tiered'] is None else 0
+
+
+def cmd_compact(args) -> int:
+    checkpoint = Checkpoint(args.checkpoint, {'command': 'compact', 'storage': args.storage, 'indent': args.indent})
+    storage = open_file_storage(args.storage)
+    try:
+        progress = Progress('compact', total=len(storage.list_filenames()), enabled=not args.quiet)
+        stats = maintenance.compact(storage, checkpoint, progress, workers=args.writers, indent=args.indent)
+    finally:
+        close_storage(storage)
+    print(f"Compacted {stats['records']} files: {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+    _print_list('Unreadable files', stats['unreadable'])
+    return 1 if stats['unreadable'] else 0
+
+
+def cmd_verify(args) -> int:
+    # Recovery would fix up the files this is about to report on
+    storage = open_file_storage(args.storage, recover=False)
+    try:
+        progress = Progress('verify', enabled=not args.quiet)
+        report = maintenance.verify(storage, progress, deep=args.deep, repair=args.repair, workers=args.readers)
+    finally:
+        close_storage(storage)
+    _print_list('Indexed requests without a file', report['missing_files'])
+    _print_list('Files missing from the index', report['unindexed'])
+    _print_list('Unreadable files', report['unreadable'])
+    _print_list('Requests whose index entry differs from the file', report['mismatched'])
+    problems = sum(len(items) for items in report.values())
+    if not problems:
+        print("Index and storage are consistent")
+    elif args.repair:
+        print(f"Repaired the index ({problems} problems found)")
+    return 1 if problems and not args.repair else 0
+
+
+def _print_list(title: str, items: List[str]) -> None:
+    if items:
+        print(f"{title} ({len(items)}):")
+        for item in items:
+            print(f"  {item}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='request-logger', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--quiet', '-q', action='store_true', help='Do not report progress')
+
+    resumable = argparse.ArgumentParser(add_help=False)
+    resumable.add_argument('--checkpoint', help='File recording progress; resume from it if it exists')
+
+    readers = argparse.ArgumentParser(add_help=False)
+    readers.add_argument('--readers', type=int, default=8, help='Records read ahead in parallel (default: 8)')
+
+    writers = argparse.ArgumentParser(add_help=False)
+    writers.add_argument('--writers', type=int, default=4, help='Parallel writers (default: 4)')
+
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument('--method', help='Only requests whose method contains this')
+    selection.add_argument('--url', help='Only requests whose URL contains this')
+    selection.add_argument('--start', help="Only requests at or after 'YYYY-MM-DD HH:MM:SS'")
+    selection.add_argument('--end', help="Only requests at or before 'YYYY-MM-DD HH:MM:SS'")
+
+    copy = subparsers.add_parser('copy', parents=[common, resumable, readers, writers, selection],
+                                 help='Copy requests from one storage to another', description=SPEC_HELP)
+    copy.add_argument('source')
+    copy.add_argument('destination')
+    copy.add_argument('--move', action='store_true', help='Delete each request from the source once copied')
+    copy.set_defaults(func=cmd_copy)
+
+    export = subparsers.add_parser('export', parents=[common, resumable, readers, selection],
+                                   help='Export requests to JSONL or Parquet segments', description=SPEC_HELP)
+    export.add_argument('source')
+    export.add_argument('output', help='Directory receiving the segments')
+    export.add_argument('--format', choices=sorted(transfer.SEGMENT_WRITERS), default='jsonl', help='Segment format (default: jsonl)')
+    export.add_argument('--segment-records', type=int, help='Requests per segment (default: 10000 for jsonl, 100000 for parquet)')
+    export.add_argument('--gzip', action='store_true', help='Compress JSONL segments with gzip')
+    export.add_argument('--partition', choices=['day', 'hour'], default='day', help='Time partitioning of Parquet files (default: day)')
+    export.add_argument('--no-bodies', action='store_true', help='Leave request and response bodies out of Parquet files')
+    export.set_defaults(func=cmd_export)
+
+    import_ = subparsers.add_parser('import', parents=[common, resumable, writers],
+                                    help='Import requests from JSONL segments', description=SPEC_HELP)
+    import_.add_argument('input', help='A segment file or a directory of segments')
+    import_.add_argument('destination')
+    import_.set_defaults(func=cmd_import)
+
+    rebuild = subparsers.add_parser('rebuild-index', parents=[common, resumable, readers],
+                                    help='Rebuild the metadata database from stored files', description=SPEC_HELP)
+    rebuild.add_argument('storage')
+    rebuild.set_defaults(func=cmd_rebuild_index)
+
+    compact = subparsers.add_parser('compact', parents=[common, resumable, writers],
+                                    help='Re-encode stored files', description=SPEC_HELP)
+    compact.add_argument('storage')
+    compact.add_argument('--indent', type=int, help='Indent JSON by this many spaces (default: compact JSON)')
+    compact.set_defaults(func=cmd_compact)
+
+    verify = subparsers.add_parser('verify', parents=[common, readers],
+                                   help='Check the metadata index against stored files', description=SPEC_HELP)
+    verify.add_argument('storage')
+    verify.add_argument('--deep', action='store_true', help='Also read every file and compare it with its index entry')
+    verify.add_argument('--repair', action='store_true', help='Fix the index to match the stored files')
+    verify.set_defaults(func=cmd_verify)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with the same --checkpoint to resume", file=sys.stderr)
+        return 130
+    except (ValueError, OSError, ImportError) as e:
+        print(f"request-logger: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from request_logger.cli.progress import Checkpoint, Progress, ordered_map
+from request_logger.core.metadata_store import SUMMARY_FIELDS, MetadataStore
+from request_logger.core.storage import FileStorage
+from request_logger.core.storage.file import TMP_SUFFIX
+
+# Fields that are both indexed in metadata.db and stored in the record
+INDEXED_FIELDS = ('timestamp', 'method', 'url', 'fingerprint')
+
+
+def _read_record(storage: FileStorage, filename: str) -> Optional[Dict[str, Any]]:
+    # Unreadable files are reported by the caller instead of aborting the job
+    try:
+        with open(os.path.join(storage.storage_dir, filename), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _metadata(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: request_data.get(field) for field in SUMMARY_FIELDS}
+
+
+def _tiered_rows(db_path: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Index rows of requests that TieredStorage moved out of the hot tier, whose
+    files are not in the storage directory. None if the index cannot be read.
+    """
+    if not os.path.exists(db_path):
+        return []
+    try:
+        connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(request_metadata)')]
+            if 'tier' not in columns:
+                return []
+            rows = connection.execute(
+                f"SELECT {', '.join(SUMMARY_FIELDS)}, tier FROM request_metadata WHERE tier IS NOT NULL"
+            ).fetchall()
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError:
+        return None
+    return [dict(zip(SUMMARY_FIELDS + ('tier',), row)) for row in rows]
+
+
+def rebuild_index(
+    storage_dir: str,
+    db_path: str,
+    checkpoint: Checkpoint,
+    progress: Progress,
+    readers: int = 8,
+    batch_size: int = 500,
+) -> Dict[str, Any]:
+    """
+    Rebuild the metadata database from the stored files. The new database is
+    built next to the old one and swapped in once complete, so the old index
+    stays usable (or, if it is corrupt, untouched) until then. Requests that
+    TieredStorage moved to another tier have no file here, so their rows are
+    copied from the old index; `tiered` is how many, or None if it could
+    not be read.
+    """
+    rebuild_path = f'{db_path}.rebuild'
+    if not checkpoint.resumed and os.path.exists(rebuild_path):
+        os.remove(rebuild_path)
+    store = MetadataStore(rebuild_path)
+    # Recovery would fix up the files this is about to report on
+    storage = FileStorage(storage_dir=storage_dir, max_logs=None, metadata_store=store, recover=False)
+
+    filenames = [identifier for identifier in storage.get_sorted_identifiers()
+                 if checkpoint.position is None or identifier > checkpoint.position]
+    unreadable = []
+    batch = []
+    try:
+        for filename, request_data in ordered_map(lambda name: _read_record(storage, name), filenames, readers):
+            if request_data is None or 'id' not in request_data:
+                unreadable.append(filename)
+            else:
+                batch.append(_metadata(request_data))
+            if len(batch) >= batch_size:
+                store.add_many(batch)
+                batch = []
+                checkpoint.update(filename)
+            progress.advance()
+        if batch:
+            store.add_many(batch)
+
+        tiered = _tiered_rows(db_path)
+        if tiered:
+            store.add_many(tiered)
+            by_tier: Dict[str, List[str]] = {}
+            for row in tiered:
+                by_tier.setdefault(row['tier'], []).append(row['id'])
+            for tier, request_ids in by_tier.items():
+                store.set_tier(request_ids, tier)
+    finally:
+        store.close()
+
+    # A write-ahead log left by a crash would be replayed into the new database
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(rebuild_path, db_path)
+    checkpoint.complete()
+    return {**progress.finish(), 'unreadable': unreadable, 'tiered': None if tiered is None else len(tiered)}
+
+
+def compact(
+    storage: FileStorage,
+    checkpoint: Checkpoint,
+    progress: Progress,
+    workers: int = 4,
+    indent: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Re-encode every stored file, by default as compact JSON. Each file is
+    replaced atomically, and files already in the target encoding are left
+    alone.
+    """
+    separators = (',', ':') if indent is None else None
+
+    def rewrite(filename: str) -> Optional[Tuple[int, int]]:
+        path = os.path.join(storage.storage_dir, filename)
+        try:
+            with open(path, 'rb') as f:
+                original = f.read()
+            encoded = json.dumps(json.loads(original), indent=indent, separators=separators).encode('utf-8')
+        except (OSError, ValueError):
+            return None
+        if encoded != original:
+            # Hidden like FileStorage's own temporary files, so recover() removes it after a crash
+            tmp_path = os.path.join(storage.storage_dir, f'.{filename}{TMP_SUFFIX}')
+            with open(tmp_path, 'wb') as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        return len(original), len(encoded)
+
+    filenames = [identifier for identifier in storage.get_sorted_identifiers()
+                 if checkpoint.position is None or identifier > checkpoint.position]
+    bytes_before = bytes_after = 0
+    unreadable = []
+    for filename, sizes in ordered_map(rewrite, filenames, workers):
+        if sizes is None:
+            unreadable.append(filename)
+        else:
+            bytes_before += sizes[0]
+            bytes_after += sizes[1]
+        checkpoint.update(filename)
+        progress.advance(nbytes=sizes[0] if sizes else 0)
+
+    checkpoint.complete()
+    return {**progress.finish(), 'bytes_before': bytes_before, 'bytes_after': bytes_after, 'unreadable': unreadable}
+
+
+def verify(
+    storage: FileStorage,
+    progress: Progress,
+    deep: bool = False,
+    repair: bool = False,
+    workers: int = 8,
+    page_size: int = 1000,
+) -> Dict[str, List[str]]:
+    """
+    Compare the metadata index with the stored files.
+
+    Only requests in the hot tier are expected to have a file here. Reports
+    request IDs indexed without a file (`missing_files`), files that are not
+    indexed (`unindexed`) and, with `deep`, files that cannot be
+    parsed (`unreadable`) or whose indexed fields differ from the index
+    (`mismatched`). `repair` treats the files as the source of truth and
+    fixes the index accordingly.
+    """
+    files = {storage._extract_request_id(filename): filename for filename in storage.list_filenames()}
+    report: Dict[str, List[str]] = {'missing_files': [], 'unindexed': [], 'unreadable': [], 'mismatched': []}
+
+    mismatched_files = []
+    after = None
+    while True:
+        # Walk the index in keyset pages rather than loading it at once
+        page = storage.metadata_store.list_requests(sort='timestamp', descending=False, after=after, limit=page_size, hot_only=True)
+        if not page:
+            break
+        after = (page[-1]['timestamp'], page[-1]['id'])
+
+        to_check = []
+        for row in page:
+            filename = files.pop(row['id'], None)
+            if filename is None:
+                report['missing_files'].append(row['id'])
+            elif deep:
+                to_check.append((row, filename))
+            else:
+                progress.advance()
+
+        for (row, filename), request_data in ordered_map(lambda item: _read_record(storage, item[1]), to_check, workers):
+            if request_data is None:
+                report['unreadable'].append(filename)
+            elif any(row[field] != request_data.get(field) for field in INDEXED_FIELDS):
+                report['mismatched'].append(row['id'])
+                mismatched_files.append(filename)
+            progress.advance()
+
+    # Hot copies left behind by an interrupted migration are indexed in their new tier
+    report['unindexed'] = sorted(filename for request_id, filename in files.items()
+                                 if storage.metadata_store.get_location(request_id) is None)
+    progress.finish()
+
+    if repair:
+        for request_id in report['missing_files']:
+            storage.metadata_store.delete_request_metadata(request_id)
+        batch = []
+        for filename in report['unindexed'] + mismatched_files:
+            request_data = _read_record(storage, filename)
+            if request_data is not None and 'id' in request_data:
+                batch.append(_metadata(request_data))
+            if len(batch) >= page_size:
+                storage.metadata_store.add_many(batch)
+                batch = []
+        if batch:
+            storage.metadata_store.add_many(batch)
+    return report
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class Progress:
+    """
+    Prints records done, throughput and ETA to stderr, at most once per
+    `interval` seconds.
+    """
+
+    def __init__(self, label: str, total: Optional[int] = None, stream: Optional[TextIO] = None, interval: float = 1.0, enabled: bool = True):
+        self.label = label
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.enabled = enabled
+        self.records = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._inline = self.stream.isatty()
+
+    def advance(self, records: int = 1, nbytes: int = 0) -> None:
+        self.records += records
+        self.bytes += nbytes
+        now = time.monotonic()
+        if self.enabled and now - self._last_report >= self.interval:
+            self._last_report = now
+            self._write(self._line(now), final=False)
+
+    def finish(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        if self.enabled:
+            self._write(self._line(time.monotonic()), final=True)
+        return {
+            'records': self.records,
+            'bytes': self.bytes,
+            'seconds': elapsed,
+            'records_per_s': self.records / elapsed if elapsed else None,
+        }
+
+    def _line(self, now: float) -> str:
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.records / elapsed
+        parts = [f'{self.label}: {self.records}']
+        if self.total:
+            parts[0] += f'/{self.total} ({100 * self.records / self.total:.1f}%)'
+        parts.append(f'{rate:.0f} rec/s')
+        if self.bytes:
+            parts.append(f'{self.bytes / elapsed / 1e6:.1f} MB/s')
+        if self.total and rate and self.records < self.total:
+            parts.append(f'eta {(self.total - self.records) / rate:.0f}s')
+        return '  '.join(parts)
+
+    def _write(self, line: str, final: bool) -> None:
+        if self._inline:
+            self.stream.write('\r\033[K' + line + ('\n' if final else ''))
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+
+class Checkpoint:
+    """
+    Remembers how far a job got so that it can be resumed.
+
+    The position is the last item (in the job's processing order) up to which
+    everything has been done. It is written atomically at most once per
+    `interval` seconds and removed when the job completes. Without a path the
+    checkpoint only lives in memory.
+    """
+
+    def __init__(self, path: Optional[str], job: Dict[str, Any], interval: float = 2.0):
+        self.path = path
+        self.job = job
+        self.interval = interval
+        self.position: Optional[str] = None
+        self.state: Dict[str, Any] = {}
+        self._last_save = 0.0
+
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            if saved.get('job') != job:
+                raise ValueError(f"Checkpoint {path} belongs to a different job: {saved.get('job')}")
+            self.position = saved.get('position')
+            self.state = saved.get('state', {})
+
+    @property
+    def resumed(self) -> bool:
+        return self.position is not None
+
+    def update(self, position: str, force: bool = False, **state) -> None:
+        self.position = position
+        self.state.update(state)
+        now = time.monotonic()
+        if force or now - self._last_save >= self.interval:
+            self._last_save = now
+            self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'job': self.job, 'position': self.position, 'state': self.state}, f)
+        os.replace(tmp_path, self.path)
+
+    def complete(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def ordered_map(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[Tuple[T, R]]:
+    """
+    Apply `func` to `items` on `workers` threads and yield (item, result) in
+    input order. At most twice `workers` items are in flight, so memory stays
+    bounded however many items there are. An exception from `func` is raised
+    when its item is reached, after in-flight work has finished.
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                yield done, future.result()
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,276 @@
+import bisect
+import gzip
+import json
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from request_logger.cli.progress import Checkpoint, Progress, ordered_map
+from request_logger.core.archive import ParquetSegmentWriter
+from request_logger.core.storage import AbstractStorage
+
+SEGMENT_PREFIX = 'requests-'
+# Summaries fetched per query when selecting requests
+SELECT_PAGE_SIZE = 1000
+
+
+def select_requests(
+    storage: AbstractStorage,
+    query: Optional[Dict[str, str]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the (identifier, request ID) pairs to process, oldest first,
+    skipping everything up to and including the identifier `after`.
+    """
+    identifiers = storage.get_sorted_identifiers()
+    position = 0 if after is None else bisect.bisect_right(identifiers, after)
+    pairs = (
+        (identifiers[i], storage._extract_request_id(identifiers[i]))
+        for i in range(position, len(identifiers))
+    )
+    if not (query or start_time or end_time):
+        return pairs
+    return _matching_pairs(storage, pairs, query, start_time, end_time, after)
+
+
+def count_requests(
+    storage: AbstractStorage,
+    query: Optional[Dict[str, str]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    after: Optional[str] = None,
+) -> int:
+    """
+    Count the pairs select_requests would yield, without holding them.
+    """
+    return sum(1 for _ in select_requests(storage, query, start_time, end_time, after))
+
+
+def _identifier_timestamp(identifier: str) -> str:
+    # Identifiers are '<timestamp>_<request ID>.json'
+    return identifier[:-5].rpartition('_')[0]
+
+
+def _matching_pairs(
+    storage: AbstractStorage,
+    pairs: Iterator[Tuple[str, str]],
+    query: Optional[Dict[str, str]],
+    start_time: Optional[str],
+    end_time: Optional[str],
+    after: Optional[str],
+) -> Iterator[Tuple[str, str]]:
+    # Merge the identifiers with the matching summaries, both ordered by
+    # timestamp, so that only the matches of the current timestamp are held
+    summaries = _iter_summaries(storage, query, start_time, end_time, None if after is None else _identifier_timestamp(after))
+    upcoming = next(summaries, None)
+    matched: Dict[str, str] = {}
+    current = None
+    for identifier, request_id in pairs:
+        timestamp = _identifier_timestamp(identifier)
+        if timestamp != current:
+            # Matches from earlier timestamps have no file left
+            matched = {key: value for key, value in matched.items() if value >= timestamp}
+            current = timestamp
+        while upcoming is not None and (upcoming['timestamp'] or '') <= timestamp:
+            matched[upcoming['id']] = upcoming['timestamp'] or ''
+            upcoming = next(summaries, None)
+        if matched.pop(request_id, None) is not None:
+            yield identifier, request_id
+
+
+def _iter_summaries(
+    storage: AbstractStorage,
+    query: Optional[Dict[str, str]],
+    start_time: Optional[str],
+    end_time: Optional[str],
+    after_timestamp: Optional[str],
+) -> Iterator[Dict[str, Any]]:
+    # Keyset pagination in timestamp order, one page in memory at a time
+    position = None if after_timestamp is None else (after_timestamp, '')
+    while True:
+        page = storage.list_request_summaries(
+            query or None, start_time, end_time,
+            sort='timestamp', descending=False, after=position, limit=SELECT_PAGE_SIZE,
+        )
+        yield from page
+        if len(page) < SELECT_PAGE_SIZE:
+            return
+        position = (page[-1]['timestamp'], page[-1]['id'])
+
+
+def iter_pair_records(source: AbstractStorage, pairs: Iterable[Tuple[str, str]], prefetch: int = 8) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Load the records of `pairs` in order and yield (identifier, record).
+    Requests that no longer exist are skipped. Only the pairs within the
+    read-ahead window are held.
+    """
+    queued = deque()
+
+    def request_ids() -> Iterator[str]:
+        for pair in pairs:
+            queued.append(pair)
+            yield pair[1]
+
+    for request_data in source.iter_requests(request_ids(), prefetch=prefetch):
+        identifier, request_id = queued.popleft()
+        while request_id != request_data['id']:
+            identifier, request_id = queued.popleft()
+        yield identifier, request_data
+
+
+def copy_requests(
+    source: AbstractStorage,
+    destination: AbstractStorage,
+    pairs: Iterable[Tuple[str, str]],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    readers: int = 8,
+    writers: int = 4,
+    move: bool = False,
+) -> Dict[str, Any]:
+    """
+    Stream records from `source` to `destination`. Records are read `readers`
+    at a time ahead of the writers, so only a bounded window is in memory.
+    With `move` each record is deleted from the source once written.
+    """
+    def write(item: Tuple[str, Dict[str, Any]]) -> None:
+        request_data = item[1]
+        destination.save_request(request_data['id'], request_data)
+
+    for (identifier, _), _ in ordered_map(write, iter_pair_records(source, pairs, prefetch=readers), writers):
+        if move:
+            source._delete_by_identifier(identifier)
+        checkpoint.update(identifier)
+        progress.advance()
+
+    checkpoint.complete()
+    return progress.finish()
+
+
+class JsonlSegmentWriter:
+    """
+    Writes one segment of newline-delimited JSON, optionally gzipped. The
+    segment only appears under its final name once it is closed.
+    """
+    extension = '.jsonl'
+    default_segment_records = 10000
+
+    def __init__(self, path: str, compress: bool = False):
+        self.path = path + ('.gz' if compress else '')
+        self._partial_path = self.path + '.partial'
+        self._file = gzip.open(self._partial_path, 'wb') if compress else open(self._partial_path, 'wb')
+
+    def write(self, request_data: Dict[str, Any]) -> int:
+        line = json.dumps(request_data, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._file.write(line)
+        return len(line)
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._partial_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.remove(self._partial_path)
+
+
+SEGMENT_WRITERS = {
+    'jsonl': JsonlSegmentWriter,
+    'parquet': ParquetSegmentWriter,
+}
+
+
+def export_requests(
+    source: AbstractStorage,
+    output_dir: str,
+    pairs: Iterable[Tuple[str, str]],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    readers: int = 8,
+    segment_records: Optional[int] = None,
+    format: str = 'jsonl',
+    **writer_options,
+) -> Dict[str, Any]:
+    """
+    Export records into numbered segments of at most `segment_records`
+    records each. The checkpoint advances whenever a segment is complete, so
+    a resumed export rewrites at most one segment.
+    """
+    writer_class = SEGMENT_WRITERS[format]
+    segment_records = segment_records or writer_class.default_segment_records
+    os.makedirs(output_dir, exist_ok=True)
+    segment = checkpoint.state.get('segment', 0)
+    writer = None
+    written = 0
+    last_identifier = None
+
+    try:
+        for identifier, request_data in iter_pair_records(source, pairs, prefetch=readers):
+            if writer is None:
+                path = os.path.join(output_dir, f'{SEGMENT_PREFIX}{segment:06d}{writer_class.extension}')
+                writer = writer_class(path, **writer_options)
+            progress.advance(nbytes=writer.write(request_data))
+            written += 1
+            last_identifier = identifier
+
+            if written >= segment_records:
+                writer.close()
+                writer, written, segment = None, 0, segment + 1
+                checkpoint.update(last_identifier, force=True, segment=segment)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is not None:
+        writer.close()
+        checkpoint.update(last_identifier, force=True, segment=segment + 1)
+    checkpoint.complete()
+    return progress.finish()
+
+
+def list_segments(path: str) -> List[str]:
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.startswith(SEGMENT_PREFIX) and (name.endswith('.jsonl') or name.endswith('.jsonl.gz'))
+    )
+
+
+def iter_segment_records(path: str, after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (position, record) from a JSONL segment or a directory of them. The
+    position is '<segment name>:<line number>' and sorts in reading order.
+    """
+    for segment_path in list_segments(path):
+        name = os.path.basename(segment_path)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(segment_path, 'rt', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                position = f'{name}:{line_number:012d}'
+                if (after is not None and position <= after) or not line.strip():
+                    continue
+                yield position, json.loads(line)
+
+
+def import_requests(
+    destination: AbstractStorage,
+    path: str,
+    checkpoint: Checkpoint,
+    progress: Progress,
+    writers: int = 4,
+) -> Dict[str, Any]:
+    def write(item: Tuple[str, Dict[str, Any]]) -> None:
+        request_data = item[1]
+        destination.save_request(request_data['id'], request_data)
+
+    for (position, _), _ in ordered_map(write, iter_segment_records(path, checkpoint.position), writers):
+        checkpoint.update(position)
+        progress.advance()
+
+    checkpoint.complete()
+    return progress.finish()
@@ -0,0 +1,358 @@
+import datetime
+import json
+import math
+import re
+import sqlite3
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from request_logger.core.storage import AbstractStorage
+
+# Path segments that look like identifiers are collapsed so that rollups are
+# keyed by endpoint rather than by individual resource
+ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{16,})$')
+
+GRANULARITIES = {
+    # name: (table, length of the timestamp prefix used as bucket)
+    'minute': ('rollup_minute', 12),
+    'hour': ('rollup_hour', 10),
+}
+
+
+def normalize_path(path: str) -> str:
+    segments = ['{id}' if ID_SEGMENT.match(segment) else segment for segment in (path or '/').split('/')]
+    return '/'.join(segments) or '/'
+
+
+class LatencySketch:
+    """
+    Mergeable latency histogram with logarithmic buckets. Quantiles are
+    accurate to within `relative_accuracy` of the true value, and two sketches
+    merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None, zero_count: int = 0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = buckets or {}
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other: 'LatencySketch') -> None:
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket, within relative_accuracy of any value in it
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def to_json(self) -> str:
+        return json.dumps({'a': self.relative_accuracy, 'z': self.zero_count, 'b': self.buckets})
+
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> 'LatencySketch':
+        if not data:
+            return cls()
+        raw = json.loads(data)
+        return cls(raw['a'], {int(k): v for k, v in raw['b'].items()}, raw['z'])
+
+
+class _Rollup:
+    __slots__ = ('count', 'request_bytes', 'response_bytes', 'max_response_bytes', 'errors', 'latency')
+
+    def __init__(self):
+        self.count = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.max_response_bytes = 0
+        self.errors = 0
+        self.latency = LatencySketch()
+
+
+class RollupStore:
+    """
+    Per-minute and per-hour traffic rollups keyed by method, host and path,
+    maintained as requests are saved.
+
+    Updates are aggregated in memory and written every `flush_every` requests
+    (and before every query). Minute rollups are pruned after
+    `minute_retention_hours`; hour rollups are kept until pruned explicitly,
+    so they outlive the raw requests removed by `max_logs`.
+
+    The process that logs requests maintains the rollups, e.g. through
+    `RequestLogger(rollups=...)`; other processes, such as the web UI, open
+    the same `db_path` and only query them.
+    """
+
+    def __init__(self, db_path: str = 'metadata.db', flush_every: int = 100, minute_retention_hours: Optional[int] = 24 * 7):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        self.minute_retention_hours = minute_retention_hours
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.cursor = self.connection.cursor()
+        self.lock = Lock()
+        self._pending: Dict[Tuple[str, str, str, str, str], _Rollup] = {}
+        self._pending_count = 0
+        self._initialize_db()
+
+    def _initialize_db(self):
+        with self.lock:
+            for table, _ in GRANULARITIES.values():
+                self.cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        bucket TEXT,
+                        method TEXT,
+                        host TEXT,
+                        path TEXT,
+                        count INTEGER,
+                        request_bytes INTEGER,
+                        response_bytes INTEGER,
+                        max_response_bytes INTEGER,
+                        errors INTEGER,
+                        latency_sketch TEXT,
+                        PRIMARY KEY (bucket, method, host, path)
+                    )
+                ''')
+            self.connection.commit()
+
+    def attach(self, storage: AbstractStorage) -> 'RollupStore':
+        """
+        Update the rollups whenever `storage` saves a request.
+        """
+        storage.events.add_listener(self.record)
+        return self
+
+    def detach(self, storage: AbstractStorage) -> None:
+        storage.events.remove_listener(self.record)
+        self.flush()
+
+    def record(self, request_data: Dict[str, Any]) -> None:
+        timestamp = request_data.get('timestamp')
+        if not isinstance(timestamp, str) or len(timestamp) < 12:
+            return
+        parts = urlsplit(request_data.get('url') or '')
+        key = (request_data.get('method') or '', (parts.hostname or '').lower(), normalize_path(parts.path))
+        request_bytes = _request_size(request_data)
+        response = request_data.get('response') or {}
+        response_bytes = _response_size(response)
+        latency = response.get('elapsed_ms')
+        is_error = (response.get('status_code') or 0) >= 500
+
+        with self.lock:
+            for granularity, (_, prefix) in GRANULARITIES.items():
+                rollup = self._pending.get((granularity, timestamp[:prefix]) + key)
+                if rollup is None:
+                    rollup = self._pending[(granularity, timestamp[:prefix]) + key] = _Rollup()
+                rollup.count += 1
+                rollup.request_bytes += request_bytes
+                rollup.response_bytes += response_bytes
+                rollup.max_response_bytes = max(rollup.max_response_bytes, response_bytes)
+                rollup.errors += is_error
+                if latency is not None:
+                    rollup.latency.add(latency)
+            self._pending_count += 1
+            if self._pending_count >= self.flush_every:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        # Several processes may flush into the same buckets, so each sketch is
+        # read, merged and written back under the database write lock
+        self.cursor.execute('BEGIN IMMEDIATE')
+        try:
+            self._write_pending()
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        self._pending.clear()
+        self._pending_count = 0
+        self._prune_minutes()
+
+    def _write_pending(self) -> None:
+        for (granularity, bucket, method, host, path), rollup in self._pending.items():
+            table = GRANULARITIES[granularity][0]
+            self.cursor.execute(
+                f'SELECT latency_sketch FROM {table} WHERE bucket = ? AND method = ? AND host = ? AND path = ?',
+                (bucket, method, host, path),
+            )
+            row = self.cursor.fetchone()
+            # Merged into a copy, so the pending sketch is unchanged if the transaction is rolled back
+            latency = LatencySketch.from_json(row[0]) if row is not None else LatencySketch()
+            latency.merge(rollup.latency)
+            self.cursor.execute(f'''
+                INSERT INTO {table} (bucket, method, host, path, count, request_bytes, response_bytes, max_response_bytes, errors, latency_sketch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bucket, method, host, path) DO UPDATE SET
+                    count = count + excluded.count,
+                    request_bytes = request_bytes + excluded.request_bytes,
+                    response_bytes = response_bytes + excluded.response_bytes,
+                    max_response_bytes = MAX(max_response_bytes, excluded.max_response_bytes),
+                    errors = errors + excluded.errors,
+                    latency_sketch = excluded.latency_sketch
+            ''', (
+                bucket, method, host, path, rollup.count, rollup.request_bytes, rollup.response_bytes,
+                rollup.max_response_bytes, rollup.errors, latency.to_json(),
+            ))
+
+    def _prune_minutes(self) -> None:
+        if self.minute_retention_hours is None:
+            return
+        self.cursor.execute('SELECT MAX(bucket) FROM rollup_minute')
+        latest = self.cursor.fetchone()[0]
+        if latest is None:
+            return
+        # Retention is relative to the newest bucket, so replayed or imported
+        # traffic with old timestamps is not pruned immediately
+        cutoff = _shift_bucket(latest, -self.minute_retention_hours)
+        self.cursor.execute('DELETE FROM rollup_minute WHERE bucket < ?', (cutoff,))
+        self.connection.commit()
+
+    def prune(self, before: str, granularity: str = 'hour') -> None:
+        """
+        Delete rollups of buckets older than `before` (a timestamp prefix such
+        as '2024010100').
+        """
+        with self.lock:
+            self._flush()
+            self.cursor.execute(f'DELETE FROM {self._table(granularity)} WHERE bucket < ?', (before,))
+            self.connection.commit()
+
+    def _table(self, granularity: str) -> str:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity {granularity}. Expected one of {tuple(GRANULARITIES)}")
+        return GRANULARITIES[granularity][0]
+
+    def _select(self, columns: str, granularity: str, filters: Dict[str, Optional[str]], group_by: Iterable[str], order_by: str, limit: Optional[int] = None) -> List[tuple]:
+        table = self._table(granularity)
+        conditions, params = [], []
+        for field in ('method', 'host', 'path'):
+            if filters.get(field):
+                conditions.append(f"{field} = ?")
+                params.append(filters[field])
+        if filters.get('start'):
+            conditions.append("bucket >= ?")
+            params.append(filters['start'])
+        if filters.get('end'):
+            conditions.append("bucket <= ?")
+            params.append(filters['end'])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        group = f"GROUP BY {', '.join(group_by)}" if group_by else ''
+        sql = f"SELECT {columns} FROM {table} {where} {group} ORDER BY {order_by}"
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            self._flush()
+            self.cursor.execute(sql, params)
+            return self.cursor.fetchall()
+
+    def requests_per_bucket(self, granularity: str = 'minute', start: Optional[str] = None, end: Optional[str] = None,
+                            method: Optional[str] = None, host: Optional[str] = None, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Request counts per time bucket and endpoint, oldest first.
+        """
+        rows = self._select(
+            'bucket, method, host, path, count, errors', granularity,
+            {'start': start, 'end': end, 'method': method, 'host': host, 'path': path},
+            group_by=(), order_by='bucket, method, host, path',
+        )
+        return [dict(zip(('bucket', 'method', 'host', 'path', 'count', 'errors'), row)) for row in rows]
+
+    def latency_quantiles(self, group_by: str = 'host', quantiles: Iterable[float] = (0.5, 0.95, 0.99), granularity: str = 'hour',
+                          start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Latency quantiles in milliseconds per host, method, path or endpoint
+        (method, host and path), merged across the selected buckets.
+        """
+        keys = ('method', 'host', 'path') if group_by == 'endpoint' else (group_by,)
+        if any(k not in ('method', 'host', 'path') for k in keys):
+            raise ValueError("group_by must be one of 'method', 'host', 'path' or 'endpoint'")
+        rows = self._select(
+            f"{', '.join(keys)}, latency_sketch", granularity, {'start': start, 'end': end},
+            group_by=(), order_by=', '.join(keys),
+        )
+        merged: Dict[tuple, LatencySketch] = {}
+        for row in rows:
+            sketch = merged.setdefault(row[:-1], LatencySketch())
+            sketch.merge(LatencySketch.from_json(row[-1]))
+
+        results = []
+        for group, sketch in merged.items():
+            if sketch.count == 0:
+                continue
+            result = dict(zip(keys, group))
+            result['count'] = sketch.count
+            for q in quantiles:
+                result[f"p{round(q * 100, 1):g}"] = sketch.quantile(q)
+            results.append(result)
+        return results
+
+    def top_payload_sizes(self, limit: int = 10, granularity: str = 'hour', start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Endpoints with the largest response payloads.
+        """
+        rows = self._select(
+            'method, host, path, SUM(count), SUM(request_bytes), SUM(response_bytes), MAX(max_response_bytes)', granularity,
+            {'start': start, 'end': end}, group_by=('method', 'host', 'path'), order_by='MAX(max_response_bytes) DESC', limit=limit,
+        )
+        fields = ('method', 'host', 'path', 'count', 'request_bytes', 'response_bytes', 'max_response_bytes')
+        return [dict(zip(fields, row)) for row in rows]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def _request_size(request_data: Dict[str, Any]) -> int:
+    for name, value in (request_data.get('headers') or {}).items():
+        if name.lower() == 'content-length':
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+
+def _response_size(response: Dict[str, Any]) -> int:
+    if response.get('truncated'):
+        return response.get('size') or 0
+    content = response.get('content')
+    if not content:
+        return 0
+    # Size of the decoded body, without decoding it
+    return len(content) * 3 // 4 - content[-2:].count('=')
+
+
+def _shift_bucket(bucket: str, hours: int) -> str:
+    dt = datetime.datetime.strptime(bucket[:12], '%Y%m%d%H%M') + datetime.timedelta(hours=hours)
+    return dt.strftime('%Y%m%d%H%M')
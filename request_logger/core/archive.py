@@ -0,0 +1,319 @@
+"""
+Columnar archive of logged requests in time-partitioned Parquet files.
+
+Metadata is stored in typed columns so that scans read only what they need
+and filters on time, method, host, path or status skip whole partitions and
+row groups. Requires the optional `pyarrow` dependency
+(`pip install 'py-requests-logger[parquet]'`).
+"""
+import base64
+import datetime
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Union
+from urllib.parse import urlsplit
+
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S%f'
+
+# Request fields holding the body, stored together in the request_body column
+BODY_FIELDS = ('data', 'json', 'files', 'original_kwargs')
+
+# Fields kept as typed columns; everything else goes into the `record` column
+COLUMN_FIELDS = ('id', 'timestamp', 'method', 'url', 'fingerprint', 'response')
+
+PARTITIONS = {
+    'day': lambda ts: f"date={ts:%Y-%m-%d}",
+    'hour': lambda ts: f"date={ts:%Y-%m-%d}/hour={ts:%H}",
+}
+
+# Partition of records whose timestamp cannot be parsed
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+TimeBound = Union[str, datetime.datetime, None]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet archives require pyarrow: pip install 'py-requests-logger[parquet]'") from e
+    return pyarrow
+
+
+def archive_schema():
+    pa = _require_pyarrow()
+    return pa.schema([
+        ('id', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('method', pa.string()),
+        ('url', pa.string()),
+        ('host', pa.string()),
+        ('path', pa.string()),
+        ('status_code', pa.int16()),
+        ('request_size', pa.int64()),
+        ('response_size', pa.int64()),
+        ('elapsed_ms', pa.float64()),
+        ('fingerprint', pa.string()),
+        ('record', pa.string()),
+        ('request_body', pa.binary()),
+        ('response_body', pa.binary()),
+    ])
+
+
+def _parse_timestamp(timestamp: Optional[str]) -> Optional[datetime.datetime]:
+    if not timestamp:
+        return None
+    try:
+        return datetime.datetime.strptime(timestamp[:20], TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+
+def _parse_bound(value: TimeBound) -> Optional[datetime.datetime]:
+    # Accepts the 'YYYY-MM-DD HH:MM:SS' strings used by FileStorage searches
+    if value is None or isinstance(value, datetime.datetime):
+        bound = value
+    else:
+        try:
+            bound = datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise ValueError("Invalid time format. Expected format: YYYY-MM-DD HH:MM:SS")
+    if bound is not None and bound.tzinfo is None:
+        bound = bound.replace(tzinfo=datetime.timezone.utc)
+    return bound
+
+
+def _content_length(headers: Optional[Dict[str, str]]) -> Optional[int]:
+    for name, value in (headers or {}).items():
+        if name.lower() == 'content-length':
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def record_to_row(request_data: Dict[str, Any], include_bodies: bool = True) -> Dict[str, Any]:
+    """
+    Convert a stored request into an archive row.
+    """
+    parts = urlsplit(request_data.get('url') or '')
+    response = request_data.get('response')
+    rest = {k: v for k, v in request_data.items() if k not in COLUMN_FIELDS and k not in BODY_FIELDS}
+    response_body = None
+    response_size = None
+    if response:
+        rest['response'] = {k: v for k, v in response.items() if k != 'content'}
+        if response.get('content') is not None:
+            response_body = base64.b64decode(response['content'])
+        if response.get('truncated'):
+            response_size = response.get('size')
+        elif response_body is not None:
+            response_size = len(response_body)
+        else:
+            response_size = _content_length(response.get('headers'))
+
+    return {
+        'id': request_data['id'],
+        'timestamp': _parse_timestamp(request_data.get('timestamp')),
+        'method': request_data.get('method'),
+        'url': request_data.get('url'),
+        'host': (parts.hostname or '').lower() or None,
+        'path': parts.path or '/',
+        'status_code': response.get('status_code') if response else None,
+        'request_size': _content_length(request_data.get('headers')),
+        'response_size': response_size,
+        'elapsed_ms': response.get('elapsed_ms') if response else None,
+        'fingerprint': request_data.get('fingerprint'),
+        'record': json.dumps(rest, separators=(',', ':')),
+        'request_body': json.dumps({f: request_data.get(f) for f in BODY_FIELDS}).encode('utf-8') if include_bodies else None,
+        'response_body': response_body if include_bodies else None,
+    }
+
+
+def row_to_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an archive row back into the stored request format. Bodies that
+    were not archived come back as None.
+    """
+    request_data = json.loads(row['record'])
+    timestamp = row['timestamp']
+    request_data.update({
+        'id': row['id'],
+        'timestamp': timestamp.strftime(TIMESTAMP_FORMAT) if timestamp else None,
+        'method': row['method'],
+        'url': row['url'],
+        'fingerprint': row['fingerprint'],
+    })
+    request_body = row.get('request_body')
+    request_data.update(json.loads(request_body) if request_body is not None else dict.fromkeys(BODY_FIELDS))
+    response = request_data.get('response')
+    if response is not None:
+        response_body = row.get('response_body')
+        response['content'] = base64.b64encode(response_body).decode('utf-8') if response_body is not None else None
+    return request_data
+
+
+class ParquetSegmentWriter:
+    """
+    Writes one export segment as one Parquet file per time partition, e.g.
+    `date=2024-01-01/requests-000003.parquet`.
+
+    Rows are buffered per partition and written as row groups of
+    `row_group_size` rows sorted by timestamp, so the row group statistics
+    let readers skip groups outside a time range. Files are written under a
+    hidden name, which dataset readers ignore, and renamed on close.
+    """
+    extension = '.parquet'
+    default_segment_records = 100000
+
+    def __init__(self, path: str, partition: str = 'day', include_bodies: bool = True, row_group_size: int = 10000, compression: str = 'zstd'):
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partitioning {partition!r}. Expected one of {tuple(PARTITIONS)}")
+        self._pa = _require_pyarrow()
+        self.directory, self.name = os.path.split(path)
+        self.partition = PARTITIONS[partition]
+        self.include_bodies = include_bodies
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = archive_schema()
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._writers: Dict[str, Any] = {}
+
+    def _paths(self, key: str):
+        directory = os.path.join(self.directory, key)
+        return os.path.join(directory, f'.{self.name}.partial'), os.path.join(directory, self.name)
+
+    def write(self, request_data: Dict[str, Any]) -> int:
+        row = record_to_row(request_data, include_bodies=self.include_bodies)
+        key = self.partition(row['timestamp'] or EPOCH)
+        rows = self._rows.setdefault(key, [])
+        rows.append(row)
+        if len(rows) >= self.row_group_size:
+            self._flush(key)
+        return len(row['record']) + len(row['request_body'] or b'') + len(row['response_body'] or b'')
+
+    def _flush(self, key: str) -> None:
+        rows = self._rows.pop(key, None)
+        if not rows:
+            return
+        rows.sort(key=lambda r: r['timestamp'] or EPOCH)
+        writer = self._writers.get(key)
+        if writer is None:
+            partial_path, _ = self._paths(key)
+            os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+            writer = self._writers[key] = self._pa.parquet.ParquetWriter(partial_path, self.schema, compression=self.compression)
+        writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema), row_group_size=len(rows))
+
+    def close(self) -> None:
+        for key in list(self._rows):
+            self._flush(key)
+        for key, writer in self._writers.items():
+            writer.close()
+            os.replace(*self._paths(key))
+        self._writers = {}
+
+    def abort(self) -> None:
+        for key, writer in self._writers.items():
+            writer.close()
+            os.remove(self._paths(key)[0])
+        self._writers = {}
+        self._rows = {}
+
+
+class ParquetArchive:
+    """
+    Reads an archive written by ParquetSegmentWriter (or any Parquet files
+    with the archive schema).
+
+    Time bounds prune `date=` partitions and, through the timestamp
+    statistics, row groups; other filters are evaluated while scanning.
+    Query keys follow FileStorage: `method` and `url` match substrings
+    case-insensitively and `fingerprint` matches exactly. The archive also
+    supports `host` (exact), `path` (prefix) and `status_code`.
+    """
+
+    def __init__(self, path: str):
+        self._pa = _require_pyarrow()
+        self.path = path
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Pick up files added since the archive was opened.
+        """
+        self.dataset = self._pa.dataset.dataset(self.path, format='parquet', partitioning='hive')
+
+    def is_empty(self) -> bool:
+        return not self.dataset.files
+
+    def _filter(self, query: Optional[Dict[str, Any]], start_time: TimeBound, end_time: TimeBound):
+        pa, ds, pc = self._pa, self._pa.dataset, self._pa.compute
+        query = query or {}
+        conditions = []
+        timestamp_type = pa.timestamp('us', tz='UTC')
+        partitioned = 'date' in self.dataset.schema.names
+
+        start, end = _parse_bound(start_time), _parse_bound(end_time)
+        if start is not None:
+            conditions.append(ds.field('timestamp') >= pa.scalar(start, type=timestamp_type))
+            if partitioned:
+                conditions.append(ds.field('date') >= start.astimezone(datetime.timezone.utc).strftime('%Y-%m-%d'))
+        if end is not None:
+            conditions.append(ds.field('timestamp') <= pa.scalar(end, type=timestamp_type))
+            if partitioned:
+                conditions.append(ds.field('date') <= end.astimezone(datetime.timezone.utc).strftime('%Y-%m-%d'))
+
+        for field in ('method', 'url'):
+            if query.get(field):
+                conditions.append(pc.match_substring(ds.field(field), pattern=str(query[field]), ignore_case=True))
+        if query.get('fingerprint'):
+            conditions.append(ds.field('fingerprint') == query['fingerprint'])
+        if query.get('host'):
+            conditions.append(ds.field('host') == str(query['host']).lower())
+        if query.get('path'):
+            conditions.append(pc.starts_with(ds.field('path'), pattern=query['path']))
+        if query.get('status_code') is not None:
+            conditions.append(ds.field('status_code') == int(query['status_code']))
+        if query.get('id'):
+            conditions.append(ds.field('id') == query['id'])
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def scan(self, query: Optional[Dict[str, Any]] = None, start_time: TimeBound = None, end_time: TimeBound = None, columns: Optional[List[str]] = None):
+        """
+        Return the matching rows as a pyarrow Table, reading only `columns`.
+        """
+        return self.dataset.to_table(columns=columns, filter=self._filter(query, start_time, end_time))
+
+    def iter_requests(self, query: Optional[Dict[str, Any]] = None, start_time: TimeBound = None, end_time: TimeBound = None, include_bodies: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over matching requests in the stored request format, one
+        record batch in memory at a time.
+        """
+        columns = ['id', 'timestamp', 'method', 'url', 'fingerprint', 'record']
+        if include_bodies:
+            columns += ['request_body', 'response_body']
+        for batch in self.dataset.to_batches(columns=columns, filter=self._filter(query, start_time, end_time)):
+            for row in batch.to_pylist():
+                yield row_to_record(row)
+
+    def search_requests(self, query: Dict[str, Any], start_time: TimeBound = None, end_time: TimeBound = None) -> List[Dict[str, Any]]:
+        return list(self.iter_requests(query, start_time, end_time))
+
+    def search_request_ids(self, query: Dict[str, Any], start_time: TimeBound = None, end_time: TimeBound = None) -> List[str]:
+        return self.scan(query, start_time, end_time, columns=['id']).column('id').to_pylist()
+
+    def count(self, query: Optional[Dict[str, Any]] = None, start_time: TimeBound = None, end_time: TimeBound = None) -> int:
+        return self.dataset.count_rows(filter=self._filter(query, start_time, end_time))
+
+    def load_request(self, request_id: str) -> Dict[str, Any]:
+        for request_data in self.iter_requests({'id': request_id}):
+            return request_data
+        raise FileNotFoundError(f"Request with ID {request_id} not found.")
@@ -0,0 +1,191 @@
+import base64
+import hashlib
+import os
+import tempfile
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Union
+
+from requests.utils import super_len
+
+# Bodies are recorded up to this many bytes; longer ones keep their length and hash
+DEFAULT_MAX_BODY_SIZE = 10 * 1024 * 1024
+# Captured stream contents beyond this many bytes are buffered on disk
+DEFAULT_SPILL_THRESHOLD = 256 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def is_stream(data: Any) -> bool:
+    """
+    Whether requests sends `data` as a stream (a file-like object, generator
+    or other iterable) rather than encoding it up front.
+    """
+    return (
+        data is not None
+        and hasattr(data, '__iter__')
+        and not isinstance(data, (str, bytes, bytearray, list, tuple, Mapping))
+    )
+
+
+def encode_body(body: Union[bytes, bytearray, str], max_size: Optional[int] = DEFAULT_MAX_BODY_SIZE) -> Dict[str, Any]:
+    """
+    Record of a body held in memory: text as is, bytes as base64. Bodies over
+    `max_size` (bytes, or characters for text) are truncated and record
+    their full length in bytes and SHA-256 instead.
+    """
+    if max_size is None or len(body) <= max_size:
+        if isinstance(body, str):
+            return {'content': body, 'is_base64': False}
+        return {'content': base64.b64encode(body).decode('utf-8'), 'is_base64': True}
+
+    digest = hashlib.sha256()
+    size = 0
+    if isinstance(body, str):
+        # Encode piecewise so that the whole body is never copied
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE].encode('utf-8')
+            digest.update(chunk)
+            size += len(chunk)
+        content, is_base64 = body[:max_size], False
+    else:
+        view = memoryview(body)
+        digest.update(view)
+        size = len(view)
+        content, is_base64 = base64.b64encode(view[:max_size]).decode('utf-8'), True
+    return {'content': content, 'is_base64': is_base64, 'truncated': True, 'size': size, 'sha256': digest.hexdigest()}
+
+
+class BodyCapture:
+    """
+    Collects a body that is only available as a stream while it is read.
+    Every chunk is counted and hashed; the first `max_size` bytes are kept,
+    in memory up to `spill_threshold` bytes and in a temporary file beyond.
+    """
+
+    def __init__(self, max_size: Optional[int] = DEFAULT_MAX_BODY_SIZE, spill_threshold: int = DEFAULT_SPILL_THRESHOLD):
+        self.max_size = max_size
+        self.size = 0
+        # Set once the stream has been read to its end
+        self.complete = False
+        self._digest = hashlib.sha256()
+        self._buffer = tempfile.SpooledTemporaryFile(max_size=spill_threshold)
+        self._kept = 0
+
+    def reset(self) -> None:
+        """
+        Discard what was captured, for a body that is read again.
+        """
+        self.size = 0
+        self.complete = False
+        self._digest = hashlib.sha256()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._kept = 0
+
+    def write(self, chunk: Union[bytes, bytearray, str]) -> None:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        keep = len(chunk) if self.max_size is None else min(len(chunk), self.max_size - self._kept)
+        if keep > 0:
+            self._buffer.write(memoryview(chunk)[:keep])
+            self._kept += keep
+
+    def read_from(self, fileobj) -> None:
+        """
+        Capture `fileobj` from its start and rewind it, so that it can still
+        be sent (preparing a request reads upload files to the end).
+        """
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+            if not chunk:
+                break
+            self.write(chunk)
+        self.complete = True
+        fileobj.seek(0)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        The record of the captured body, in the format of encode_body.
+        Closes the capture.
+        """
+        self._buffer.seek(0)
+        record = {'content': base64.b64encode(self._buffer.read()).decode('utf-8'), 'is_base64': True}
+        self._buffer.close()
+        if self._kept < self.size:
+            record.update(truncated=True, size=self.size, sha256=self._digest.hexdigest())
+        return record
+
+
+class _TeeIterator:
+    """
+    Passes a streamed body through to requests unchanged while capturing it.
+    """
+
+    def __init__(self, source, capture: BodyCapture):
+        self._source = source
+        self._capture = capture
+        # requests sets Content-Length from this, as it would for the source
+        self._length = super_len(source)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._source:
+            self._capture.write(chunk)
+            yield chunk
+        self._capture.complete = True
+
+
+class _TeeReader(_TeeIterator):
+    def read(self, size: int = -1):
+        chunk = self._source.read(size)
+        if chunk:
+            self._capture.write(chunk)
+        if not chunk or size is None or size < 0:
+            self._capture.complete = True
+        return chunk
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in iter(lambda: self.read(CHUNK_SIZE), b''):
+            if not chunk:
+                return
+            yield chunk
+
+
+class _SeekableTeeReader(_TeeReader):
+    """
+    A file body that requests can rewind to send it again after a 307 or 308
+    redirect. Rewinding restarts the capture, so the body is recorded once.
+    """
+
+    def __init__(self, source, capture: BodyCapture):
+        super().__init__(source, capture)
+        # requests subtracts tell() from the length, so report the end offset
+        try:
+            self._length += source.tell()
+        except OSError:
+            pass
+
+    def tell(self) -> int:
+        return self._source.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._source.seek(offset, whence)
+        self._capture.reset()
+        return position
+
+
+def tee_body(data, capture: BodyCapture):
+    """
+    Wrap a streamed body so that `capture` sees it as requests sends it.
+    """
+    if hasattr(data, 'read') and hasattr(data, 'seek') and hasattr(data, 'tell'):
+        return _SeekableTeeReader(data, capture)
+    if hasattr(data, 'read'):
+        return _TeeReader(data, capture)
+    return _TeeIterator(data, capture)
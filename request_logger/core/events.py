@@ -0,0 +1,185 @@
+import logging
+from collections import deque
+from threading import Condition, Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from request_logger.core.metrics import metrics
+
+if TYPE_CHECKING:
+    # Only needed by subscribers on an event loop, so imported there
+    import asyncio
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ('id', 'timestamp', 'method', 'url', 'fingerprint')
+
+
+def summarize_request(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a request record to the fields needed to display it in a list, so
+    subscriber buffers never hold request or response bodies.
+    """
+    summary = {field: request_data.get(field) for field in SUMMARY_FIELDS}
+    response = request_data.get('response')
+    summary['status_code'] = response.get('status_code') if response else None
+    return summary
+
+
+def make_request_filter(method: Optional[str] = None, host: Optional[str] = None, path: Optional[str] = None) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """
+    Build a predicate over request summaries. The method and host must match
+    exactly (case-insensitive) and the path is matched as a prefix.
+    """
+    if not (method or host or path):
+        return None
+    method = method.upper() if method else None
+    host = host.lower() if host else None
+
+    def matches(summary: Dict[str, Any]) -> bool:
+        if method and (summary.get('method') or '').upper() != method:
+            return False
+        if host or path:
+            parts = urlsplit(summary.get('url') or '')
+            if host and (parts.hostname or '') != host:
+                return False
+            if path and not parts.path.startswith(path):
+                return False
+        return True
+    return matches
+
+
+class Subscription:
+    """
+    A bounded buffer of events for one subscriber. When the buffer is full the
+    oldest event is dropped and counted, so a slow subscriber never blocks the
+    publisher.
+    """
+
+    def __init__(self, bus: 'EventBus', maxsize: int = 1000, filter: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.bus = bus
+        self.filter = filter
+        self.dropped = 0
+        self._items = deque(maxlen=maxsize)
+        self._condition = Condition()
+        self._waiters: List['asyncio.Future'] = []
+        self.closed = False
+
+    def put(self, event: Dict[str, Any]) -> None:
+        if self.filter is not None and not self.filter(event):
+            return
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                metrics.increment('events_dropped')
+            self._items.append(event)
+            self._condition.notify()
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            try:
+                waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # The subscriber's event loop has already been closed
+                pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Block until an event is available. Returns None on timeout.
+        """
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    async def aget(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for an event without blocking the event loop. Returns None on timeout.
+        """
+        import asyncio
+
+        with self._condition:
+            if self._items:
+                return self._items.popleft()
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._condition:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            return self._items.popleft() if self._items else None
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+        self.closed = True
+
+    def __enter__(self) -> 'Subscription':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _resolve(waiter: 'asyncio.Future') -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for newly saved requests.
+
+    Listeners are called synchronously with the full request record on the
+    write path and must be cheap. Subscriptions receive request summaries
+    through their own bounded buffer.
+    """
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = Lock()
+
+    def subscribe(self, maxsize: int = 1000, filter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Subscription:
+        subscription = Subscription(self, maxsize=maxsize, filter=filter)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            # Bound methods are created on every access, so compare by equality
+            self._listeners = [l for l in self._listeners if l != listener]
+
+    def queue_depth(self) -> int:
+        """
+        Number of events buffered across all subscriptions.
+        """
+        return sum(len(s._items) for s in self._subscriptions)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, request_data: Dict[str, Any]) -> None:
+        # The lists are replaced rather than mutated, so they can be read without the lock
+        for listener in self._listeners:
+            try:
+                listener(request_data)
+            except Exception:
+                # A broken listener must not fail the request being logged
+                logger.exception("Request event listener %r failed", listener)
+        subscriptions = self._subscriptions
+        if not subscriptions:
+            return
+        summary = summarize_request(request_data)
+        for subscription in subscriptions:
+            subscription.put(summary)
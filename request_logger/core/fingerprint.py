@@ -0,0 +1,140 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests.models import Request
+
+from request_logger.core.util import RequestUtil
+
+# Headers that take part in the fingerprint by default. Content-Type is reduced
+# to its media type so that multipart boundaries do not change the fingerprint.
+DEFAULT_HEADER_ALLOWLIST = ('content-type',)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url: str, include_host: bool = True) -> str:
+    """
+    Normalise a URL: lowercase scheme and host, drop default ports and the
+    fragment, and sort query parameters.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    path = parts.path or '/'
+    if not include_host:
+        return f"{path}?{query}" if query else path
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def canonical_headers(headers: Optional[Dict[str, str]], header_allowlist: Iterable[str] = DEFAULT_HEADER_ALLOWLIST) -> str:
+    headers = {k.lower(): str(v).strip() for k, v in (headers or {}).items()}
+    selected = []
+    for name in sorted(h.lower() for h in header_allowlist):
+        value = headers.get(name)
+        if value is None:
+            continue
+        if name == 'content-type':
+            value = value.split(';', 1)[0].strip().lower()
+        selected.append(f"{name}:{value}")
+    return '\n'.join(selected)
+
+
+def body_hash(body: Union[bytes, str, None], content_type: Optional[str] = None) -> str:
+    """
+    Hash a request body. JSON and form bodies are normalised first so that key
+    order does not matter, and multipart boundaries are replaced by a constant.
+    """
+    if body is None:
+        return ''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes):
+        # Streams and generators cannot be hashed without consuming them
+        return 'unhashable'
+
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    if media_type == 'application/json' or media_type.endswith('+json'):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+        except ValueError:
+            pass
+    elif media_type == 'application/x-www-form-urlencoded':
+        pairs = parse_qsl(body.decode('latin-1'), keep_blank_values=True)
+        body = urlencode(sorted(pairs)).encode('latin-1')
+    elif media_type.startswith('multipart/'):
+        boundary = _content_type_param(content_type, 'boundary')
+        if boundary:
+            body = body.replace(boundary.encode('latin-1'), b'boundary')
+    return hashlib.sha256(body).hexdigest()
+
+
+def compute_fingerprint(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    body: Union[bytes, str, None] = None,
+    header_allowlist: Iterable[str] = DEFAULT_HEADER_ALLOWLIST,
+    include_host: bool = True,
+) -> str:
+    """
+    Compute a stable fingerprint from the method, normalised URL, allow-listed
+    headers and body hash of a request.
+    """
+    content_type = None
+    for name, value in (headers or {}).items():
+        if name.lower() == 'content-type':
+            content_type = value
+            break
+
+    canonical = '\n'.join([
+        method.upper(),
+        canonical_url(url, include_host=include_host),
+        canonical_headers(headers, header_allowlist),
+        body_hash(body, content_type),
+    ])
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def fingerprint_prepared(prepared, header_allowlist: Iterable[str] = DEFAULT_HEADER_ALLOWLIST, include_host: bool = True) -> str:
+    """
+    Fingerprint a requests.PreparedRequest.
+    """
+    return compute_fingerprint(
+        prepared.method,
+        prepared.url,
+        headers=dict(prepared.headers),
+        body=prepared.body,
+        header_allowlist=header_allowlist,
+        include_host=include_host,
+    )
+
+
+def fingerprint_request_data(request_data: Dict[str, Any], header_allowlist: Iterable[str] = DEFAULT_HEADER_ALLOWLIST, include_host: bool = True) -> str:
+    """
+    Fingerprint a stored request record by preparing it the way requests
+    would have sent it.
+    """
+    request_kwargs = RequestUtil.parse_request_kwargs(request_data)
+    # Let requests recompute framing headers; a stored multipart Content-Type
+    # carries the boundary of the original body, not of the re-prepared one
+    dropped = {'content-length'}
+    if request_kwargs.get('files'):
+        dropped.add('content-type')
+    if request_kwargs.get('headers'):
+        request_kwargs['headers'] = {k: v for k, v in request_kwargs['headers'].items() if k.lower() not in dropped}
+    prepared = Request(method=request_data['method'], url=request_data['url'], **request_kwargs).prepare()
+    return fingerprint_prepared(prepared, header_allowlist=header_allowlist, include_host=include_host)
+
+
+def _content_type_param(content_type: Optional[str], name: str) -> Optional[str]:
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == name:
+            return value.strip().strip('"')
+    return None
@@ -1,8 +1,22 @@
-
 import sqlite3
 import json
 from threading import Lock
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+SORT_FIELDS = ('timestamp', 'method', 'url')
+SUMMARY_FIELDS = ('id', 'timestamp', 'method', 'url', 'fingerprint')
+
+# Re-saving a request updates its fields but keeps the tier TieredStorage
+# assigned to it (and its rowid, so added_since does not report it again)
+UPSERT = '''
+    INSERT INTO request_metadata (id, timestamp, method, url, fingerprint)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        timestamp = excluded.timestamp,
+        method = excluded.method,
+        url = excluded.url,
+        fingerprint = excluded.fingerprint
+'''
 
 class MetadataStore:
     def __init__(self, db_path='metadata.db'):
@@ -19,45 +33,81 @@ class MetadataStore:
                     id TEXT PRIMARY KEY,
                     timestamp TEXT,
                     method TEXT,
-                    url TEXT
+                    url TEXT,
+                    fingerprint TEXT
                 )
             ''')
+            # Databases created before fingerprints were recorded lack the column
+            columns = [row[1] for row in self.cursor.execute('PRAGMA table_info(request_metadata)')]
+            if 'fingerprint' not in columns:
+                self.cursor.execute('ALTER TABLE request_metadata ADD COLUMN fingerprint TEXT')
+            # Storage tier of the request for TieredStorage; NULL is the primary (hot) tier
+            if 'tier' not in columns:
+                self.cursor.execute('ALTER TABLE request_metadata ADD COLUMN tier TEXT')
             self.cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_timestamp ON request_metadata (timestamp);
             ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_fingerprint ON request_metadata (fingerprint);
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tier_timestamp ON request_metadata (tier, timestamp);
+            ''')
+            # Keyset pagination orders by (field, id); these indexes keep a page
+            # lookup independent of how many requests are stored
+            for field in SORT_FIELDS:
+                self.cursor.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{field}_id ON request_metadata ({field}, id);
+                ''')
             self.connection.commit()
 
     def add_request_metadata(self, request_data: Dict[str, Any]):
         with self.lock:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO request_metadata (id, timestamp, method, url)
-                VALUES (?, ?, ?, ?)
-            ''', (
+            self.cursor.execute(UPSERT, (
                 request_data['id'],
                 request_data['timestamp'],
                 request_data['method'],
-                request_data['url']
+                request_data['url'],
+                request_data.get('fingerprint'),
             ))
             self.connection.commit()
 
-    def search(self, query: Dict[str, str], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+    def add_many(self, records: List[Dict[str, Any]]):
+        """
+        Insert or update the metadata of several requests in one transaction.
+        """
         with self.lock:
-            conditions = []
-            params = []
-            # Handle method and URL conditions as before
-            for field in ['method', 'url']:
-                if field in query:
-                    conditions.append(f"{field} LIKE ?")
-                    params.append(f"%{query[field]}%")
-
-            # Handle timestamp range
-            if start_time:
-                conditions.append("timestamp >= ?")
-                params.append(start_time)
-            if end_time:
-                conditions.append("timestamp <= ?")
-                params.append(end_time)
+            self.cursor.executemany(UPSERT, [
+                (r['id'], r['timestamp'], r['method'], r['url'], r.get('fingerprint'))
+                for r in records
+            ])
+            self.connection.commit()
 
+    def _build_conditions(self, query: Dict[str, str], start_time: Optional[str] = None, end_time: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+        conditions = []
+        params = []
+        # Handle method and URL conditions as before
+        for field in ['method', 'url']:
+            if field in query:
+                conditions.append(f"{field} LIKE ?")
+                params.append(f"%{query[field]}%")
+
+        if 'fingerprint' in query:
+            conditions.append("fingerprint = ?")
+            params.append(query['fingerprint'])
+
+        # Handle timestamp range
+        if start_time:
+            conditions.append("timestamp >= ?")
+            params.append(start_time)
+        if end_time:
+            conditions.append("timestamp <= ?")
+            params.append(end_time)
+        return conditions, params
+
+    def search(self, query: Dict[str, str], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        with self.lock:
+            conditions, params = self._build_conditions(query, start_time, end_time)
             if not conditions:
                 return []
             sql_query = f"SELECT id FROM request_metadata WHERE {' AND '.join(conditions)}"
@@ -65,10 +115,165 @@ class MetadataStore:
             results = self.cursor.fetchall()
             return [row[0] for row in results]
 
+    def list_requests(
+        self,
+        query: Optional[Dict[str, str]] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        sort: str = 'timestamp',
+        descending: bool = True,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+        hot_only: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return one page of request metadata. `after` is the (sort value, id)
+        of the last row of the previous page. `hot_only` leaves out requests
+        that TieredStorage moved to another tier.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {sort}. Expected one of {SORT_FIELDS}")
+
+        with self.lock:
+            conditions, params = self._build_conditions(query or {}, start_time, end_time)
+            if hot_only:
+                conditions.append('tier IS NULL')
+            if after is not None:
+                conditions.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+                params.extend(after)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            direction = 'DESC' if descending else 'ASC'
+            self.cursor.execute(f'''
+                SELECT {', '.join(SUMMARY_FIELDS)} FROM request_metadata {where}
+                ORDER BY {sort} {direction}, id {direction} LIMIT ?
+            ''', params + [limit])
+            return [dict(zip(SUMMARY_FIELDS, row)) for row in self.cursor.fetchall()]
+
+    def last_added(self) -> int:
+        """
+        Position of the most recently added row, for added_since.
+        """
+        with self.lock:
+            self.cursor.execute('SELECT COALESCE(MAX(rowid), 0) FROM request_metadata')
+            return self.cursor.fetchone()[0]
+
+    def added_since(self, position: int, limit: int = 500) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Return (position, summary) of the rows added after `position`, by any
+        connection, in the order they were added.
+        """
+        with self.lock:
+            self.cursor.execute(f'''
+                SELECT rowid, {', '.join(SUMMARY_FIELDS)} FROM request_metadata
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+            ''', (position, limit))
+            return [(row[0], dict(zip(SUMMARY_FIELDS, row[1:]))) for row in self.cursor.fetchall()]
+
+    def count_by_fingerprint(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        """
+        Count requests per fingerprint, most frequent first. Requests logged
+        without a fingerprint are counted under their own ID.
+        """
+        with self.lock:
+            conditions, params = self._build_conditions(query or {}, start_time, end_time)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            self.cursor.execute(f'''
+                SELECT COALESCE(fingerprint, id) AS grp, COUNT(*) AS n
+                FROM request_metadata {where}
+                GROUP BY grp ORDER BY n DESC
+            ''', params)
+            return {row[0]: row[1] for row in self.cursor.fetchall()}
+
+    def representative_ids(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        """
+        Return the ID of the earliest request of every fingerprint group, in
+        timestamp order.
+        """
+        with self.lock:
+            conditions, params = self._build_conditions(query or {}, start_time, end_time)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            # SQLite returns the id of the row holding MIN(timestamp)
+            self.cursor.execute(f'''
+                SELECT id, MIN(timestamp) AS first_seen
+                FROM request_metadata {where}
+                GROUP BY COALESCE(fingerprint, id) ORDER BY first_seen
+            ''', params)
+            return [row[0] for row in self.cursor.fetchall()]
+
+    def get_location(self, request_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Return the (timestamp, tier) of a request, or None if it is not indexed.
+        """
+        with self.lock:
+            self.cursor.execute('SELECT timestamp, tier FROM request_metadata WHERE id = ?', (request_id,))
+            row = self.cursor.fetchone()
+            return (row[0], row[1]) if row else None
+
+    def set_tier(self, request_ids: List[str], tier: Optional[str]):
+        with self.lock:
+            self.cursor.executemany(
+                'UPDATE request_metadata SET tier = ? WHERE id = ?',
+                [(tier, request_id) for request_id in request_ids],
+            )
+            self.connection.commit()
+
+    def count_in_tier(self, tier: Optional[str] = None, before: Optional[str] = None) -> int:
+        """
+        Count the requests in `tier`, optionally only those older than `before`.
+        """
+        with self.lock:
+            conditions, params = self._tier_conditions(tier, before)
+            self.cursor.execute(f"SELECT COUNT(*) FROM request_metadata WHERE {' AND '.join(conditions)}", params)
+            return self.cursor.fetchone()[0]
+
+    def oldest_in_tier(self, tier: Optional[str] = None, limit: int = 100, after: Optional[Tuple[str, str]] = None) -> List[Tuple[str, str]]:
+        """
+        Return (id, timestamp) of the oldest requests in `tier`. `after` is the
+        (timestamp, id) of the last row of the previous page.
+        """
+        with self.lock:
+            conditions, params = self._tier_conditions(tier, None)
+            if after is not None:
+                conditions.append('(timestamp, id) > (?, ?)')
+                params.extend(after)
+            self.cursor.execute(f'''
+                SELECT id, timestamp FROM request_metadata WHERE {' AND '.join(conditions)}
+                ORDER BY timestamp, id LIMIT ?
+            ''', params + [limit])
+            return [(row[0], row[1]) for row in self.cursor.fetchall()]
+
+    def _tier_conditions(self, tier: Optional[str], before: Optional[str]) -> Tuple[List[str], List[Any]]:
+        conditions, params = (['tier IS NULL'], []) if tier is None else (['tier = ?'], [tier])
+        if before is not None:
+            conditions.append('timestamp < ?')
+            params.append(before)
+        return conditions, params
+
     def delete_request_metadata(self, request_id: str):
         with self.lock:
             self.cursor.execute('DELETE FROM request_metadata WHERE id = ?', (request_id,))
             self.connection.commit()
 
+    def use_write_ahead_log(self):
+        """
+        Journal to a write-ahead log with synchronous=NORMAL, so that commits
+        no longer wait for an fsync. After a power loss the latest commits may
+        be missing, but the database is never corrupted.
+        """
+        with self.lock:
+            self.cursor.execute('PRAGMA journal_mode=WAL')
+            self.cursor.execute('PRAGMA synchronous=NORMAL')
+
+    def checkpoint(self) -> bool:
+        """
+        Copy the write-ahead log into the database and fsync it, making every
+        commit so far durable. Returns False if readers kept the checkpoint
+        from completing.
+        """
+        with self.lock:
+            self.cursor.execute('PRAGMA wal_checkpoint(FULL)')
+            busy, _, _ = self.cursor.fetchone()
+            return busy == 0
+
     def close(self):
         self.connection.close()
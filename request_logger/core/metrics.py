@@ -0,0 +1,244 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import cProfile
+
+# Upper bounds in seconds of the stage latency histogram buckets
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class MetricsHook:
+    """
+    Receives every measurement. Subclass it to forward metrics to another
+    system (statsd, OpenTelemetry, logs) and register it with add_hook.
+    """
+
+    def observe(self, stage: str, seconds: float) -> None:
+        pass
+
+    def increment(self, name: str, value: float = 1) -> None:
+        pass
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry: 'MetricsRegistry', stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self) -> '_Timer':
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.registry.observe(self.stage, perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry(MetricsHook):
+    """
+    In-process store of stage timings, counters and gauges, rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, prefix: str = 'request_logger', buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.enabled = True
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._hooks: List[MetricsHook] = []
+        self._lock = Lock()
+
+    def timed(self, stage: str):
+        """
+        Context manager timing one stage:
+
+            with metrics.timed('storage.save'):
+                ...
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = _Histogram(len(self.buckets) + 1)
+            histogram.counts[bisect_left(self.buckets, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+        for hook in self._hooks:
+            hook.observe(stage, seconds)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for hook in self._hooks:
+            hook.increment(name, value)
+
+    def register_gauge(self, name: str, callback: Callable[[], float]) -> None:
+        """
+        Report the value returned by `callback` at collection time, e.g. a
+        queue depth.
+        """
+        with self._lock:
+            self._gauges[name] = callback
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: MetricsHook) -> None:
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count, total and mean seconds per stage.
+        """
+        with self._lock:
+            return {
+                stage: {'count': h.count, 'sum': h.sum, 'mean': h.sum / h.count if h.count else 0.0}
+                for stage, h in self._histograms.items()
+            }
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.sum, h.count) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = []
+        name = f'{self.prefix}_stage_seconds'
+        lines.append(f'# HELP {name} Time spent in each stage of logging, storage and replay.')
+        lines.append(f'# TYPE {name} histogram')
+        for stage in sorted(histograms):
+            counts, total, count = histograms[stage]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for counter in sorted(counters):
+            metric = f'{self.prefix}_{_metric_name(counter)}_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {counters[counter]:g}')
+
+        for gauge in sorted(gauges):
+            try:
+                value = gauges[gauge]()
+            except Exception:
+                continue
+            metric = f'{self.prefix}_{_metric_name(gauge)}'
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _metric_name(name: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+# Registry used by the package's own instrumentation
+metrics = MetricsRegistry()
+
+
+# The profiling modules are imported on use to keep them out of import time
+_profiler: Optional['cProfile.Profile'] = None
+_profiler_lock = Lock()
+
+
+def start_profiler() -> None:
+    """
+    Start a cProfile profiler. cProfile only follows the thread that starts it,
+    which for the web app is the event loop running the async handlers.
+    """
+    import cProfile
+
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            raise RuntimeError("Profiler is already running")
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profiler(sort_by: str = 'cumulative', limit: int = 50) -> str:
+    """
+    Stop the running profiler and return its statistics as text.
+    """
+    import io
+    import pstats
+
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            raise RuntimeError("Profiler is not running")
+        profiler, _profiler = _profiler, None
+    profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats(sort_by).print_stats(limit)
+    return output.getvalue()
+
+
+def start_tracemalloc(frames: int = 10) -> None:
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def tracemalloc_report(limit: int = 25, stop: bool = False) -> str:
+    """
+    Return the allocation sites holding the most memory, optionally stopping
+    tracing afterwards.
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    if stop:
+        tracemalloc.stop()
+    lines = [f'current={current} peak={peak}']
+    lines += [str(stat) for stat in snapshot.statistics('lineno')[:limit]]
+    return '\n'.join(lines) + '\n'
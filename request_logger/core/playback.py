@@ -0,0 +1,266 @@
+import base64
+import io
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from request_logger.core.fingerprint import DEFAULT_HEADER_ALLOWLIST, compute_fingerprint, fingerprint_prepared, fingerprint_request_data
+from request_logger.core.storage import AbstractStorage
+
+MISSING_POLICIES = ('raise', 'not_found')
+AMBIGUOUS_POLICIES = ('first', 'last', 'cycle', 'raise')
+
+# The recorded body is already decoded, so framing headers must be recomputed
+DROPPED_RESPONSE_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length', 'connection')
+
+
+class PlaybackMissError(LookupError):
+    pass
+
+
+class PlaybackAmbiguousError(LookupError):
+    pass
+
+
+class RecordedResponse:
+    __slots__ = ('status_code', 'reason', 'headers', 'content')
+
+    def __init__(self, status_code: int, reason: str, headers: Dict[str, str], content: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @classmethod
+    def from_record(cls, response_data: Dict[str, Any]) -> 'RecordedResponse':
+        headers = {
+            k: v for k, v in (response_data.get('headers') or {}).items()
+            if k.lower() not in DROPPED_RESPONSE_HEADERS
+        }
+        content = response_data.get('content')
+        return cls(
+            status_code=response_data['status_code'],
+            reason=response_data.get('reason') or '',
+            headers=headers,
+            content=base64.b64decode(content) if content else b'',
+        )
+
+    def to_response(self, request=None, connection=None) -> Response:
+        response = Response()
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.headers['Content-Length'] = str(len(self.content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(self.content)
+        response._content = self.content
+        response._content_consumed = True
+        if request is not None:
+            response.url = request.url
+            response.request = request
+        response.connection = connection
+        return response
+
+
+NOT_FOUND = RecordedResponse(404, 'Not Found', {'Content-Type': 'text/plain'}, b'No recorded response matches this request')
+
+
+class PlaybackIndex:
+    """
+    Maps request fingerprints to recorded responses.
+
+    The index is built once from storage so that lookups are a dictionary
+    access. Use include_host=False when requests are sent to a local
+    PlaybackServer rather than to their original host.
+    """
+
+    def __init__(
+        self,
+        storage: Optional[AbstractStorage] = None,
+        header_allowlist: Iterable[str] = DEFAULT_HEADER_ALLOWLIST,
+        include_host: bool = True,
+        on_missing: str = 'raise',
+        on_ambiguous: str = 'first',
+        query: Optional[Dict[str, Any]] = None,
+        prefetch: Optional[int] = None,
+    ):
+        if on_missing not in MISSING_POLICIES:
+            raise ValueError(f"on_missing must be one of {MISSING_POLICIES}")
+        if on_ambiguous not in AMBIGUOUS_POLICIES:
+            raise ValueError(f"on_ambiguous must be one of {AMBIGUOUS_POLICIES}")
+
+        self.header_allowlist = tuple(h.lower() for h in header_allowlist)
+        self.include_host = include_host
+        self.on_missing = on_missing
+        self.on_ambiguous = on_ambiguous
+        self._responses: Dict[str, List[RecordedResponse]] = {}
+        self._cursors: Dict[str, Any] = {}
+        self._lock = Lock()
+
+        if storage is not None:
+            self.build(storage, query=query, prefetch=prefetch)
+
+    def build(self, storage: AbstractStorage, query: Optional[Dict[str, Any]] = None, prefetch: Optional[int] = None) -> None:
+        # Add requests in the order they were logged, which the first, last
+        # and cycle policies depend on
+        request_ids = [request_id for _, request_id in storage.list_sorted_request_ids()]
+        if query is not None:
+            wanted = set(storage.search_request_ids(query))
+            request_ids = [request_id for request_id in request_ids if request_id in wanted]
+        for request_data in storage.iter_requests(request_ids, prefetch=prefetch):
+            self.add(request_data)
+
+    def add(self, request_data: Dict[str, Any]) -> None:
+        # Records logged without a response, or with a truncated body, cannot
+        # be played back
+        response_data = request_data.get('response')
+        if not response_data or response_data.get('truncated'):
+            return
+        fingerprint = request_data.get('fingerprint')
+        if not fingerprint or self.header_allowlist != DEFAULT_HEADER_ALLOWLIST or not self.include_host:
+            # The stored fingerprint was computed with the default settings
+            fingerprint = fingerprint_request_data(request_data, header_allowlist=self.header_allowlist, include_host=self.include_host)
+        with self._lock:
+            self._responses.setdefault(fingerprint, []).append(RecordedResponse.from_record(response_data))
+            self._cursors.pop(fingerprint, None)
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def lookup(self, fingerprint: str) -> RecordedResponse:
+        """
+        Return the recorded response for a fingerprint, applying the missing
+        and ambiguous match policies.
+        """
+        candidates = self._responses.get(fingerprint)
+        if not candidates:
+            if self.on_missing == 'raise':
+                raise PlaybackMissError(f"No recorded response for fingerprint {fingerprint}")
+            return NOT_FOUND
+
+        if len(candidates) == 1 or self.on_ambiguous == 'first':
+            return candidates[0]
+        if self.on_ambiguous == 'last':
+            return candidates[-1]
+        if self.on_ambiguous == 'raise':
+            raise PlaybackAmbiguousError(f"{len(candidates)} recorded responses for fingerprint {fingerprint}")
+
+        # cycle: hand out the recorded responses in order, wrapping around
+        with self._lock:
+            cursor = self._cursors.get(fingerprint)
+            if cursor is None:
+                cursor = self._cursors[fingerprint] = itertools.cycle(candidates)
+            return next(cursor)
+
+    def lookup_prepared(self, prepared) -> RecordedResponse:
+        return self.lookup(fingerprint_prepared(prepared, header_allowlist=self.header_allowlist, include_host=self.include_host))
+
+
+class PlaybackAdapter(HTTPAdapter):
+    """
+    Transport adapter that answers requests from a PlaybackIndex without
+    touching the network.
+
+    Usage:
+        session = requests.Session()
+        adapter = PlaybackAdapter(PlaybackIndex(storage))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    """
+
+    def __init__(self, index: PlaybackIndex):
+        super().__init__()
+        self.index = index
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None) -> Response:
+        return self.index.lookup_prepared(request).to_response(request, connection=self)
+
+
+class PlaybackServer:
+    """
+    Local HTTP server that answers from a PlaybackIndex. Requests to it carry
+    the server's own host, so the index must be built with include_host=False
+    to match on path and query only.
+
+    Unmatched requests get a 404 and ambiguous ones (with on_ambiguous='raise')
+    a 300 response.
+    """
+
+    def __init__(self, index: PlaybackIndex, host: str = '127.0.0.1', port: int = 0):
+        if index.include_host:
+            raise ValueError("PlaybackServer needs an index built with include_host=False")
+        self.index = index
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler(index))
+        self.httpd.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def start(self) -> 'PlaybackServer':
+        self._thread = Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'PlaybackServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @staticmethod
+    def _make_handler(index: PlaybackIndex):
+        class PlaybackHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else None
+                fingerprint = compute_fingerprint(
+                    self.command,
+                    self.path,
+                    headers=dict(self.headers.items()),
+                    body=body,
+                    header_allowlist=index.header_allowlist,
+                    include_host=False,
+                )
+                try:
+                    recorded = index.lookup(fingerprint)
+                except PlaybackMissError:
+                    recorded = NOT_FOUND
+                except PlaybackAmbiguousError as e:
+                    recorded = RecordedResponse(300, 'Multiple Choices', {'Content-Type': 'text/plain'}, str(e).encode('utf-8'))
+
+                self.send_response(recorded.status_code, recorded.reason or None)
+                for name, value in recorded.headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(recorded.content)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(recorded.content)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _handle
+
+            def log_message(self, format, *args):
+                # Per-request logging to stderr dominates throughput
+                pass
+
+        return PlaybackHandler
@@ -1,5 +1,6 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 import requests
+from request_logger.core.metrics import metrics
 from request_logger.core.storage import AbstractStorage
 from request_logger.core.util import RequestUtil
 
@@ -10,7 +11,8 @@ class Replayer:
     def replay_request(
         self,
         request_id: str,
-        modifications: Optional[Dict[str, Any]] = None
+        modifications: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
     ) -> requests.Response:
         """
         Replays a request based on its ID.
@@ -18,19 +20,88 @@ class Replayer:
         Args:
             request_id (str): The ID of the request to replay.
             modifications (Optional[Dict[str, Any]]): Optional modifications to apply to the request.
+            stream (bool): Return before the response body is downloaded, as in requests.
 
         Returns:
             requests.Response: The response from the server.
         """
 
-        request_data = self.storage.load_request(request_id)
+        with metrics.timed('replay.load'):
+            request_data = self.storage.load_request(request_id)
+        return self.replay_request_data(request_data, modifications, stream=stream)
+
+    def replay_requests(
+        self,
+        request_ids: Optional[Iterable[str]] = None,
+        query: Optional[Dict[str, Any]] = None,
+        modifications: Optional[Dict[str, Any]] = None,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[Tuple[str, requests.Response]]:
+        """
+        Replays several requests in order, loading them from storage ahead of
+        the replay loop.
+
+        Args:
+            request_ids (Optional[Iterable[str]]): The IDs of the requests to replay.
+            query (Optional[Dict[str, Any]]): Search query used when no IDs are given.
+            modifications (Optional[Dict[str, Any]]): Optional modifications to apply to every request.
+            prefetch (Optional[int]): How many records to read ahead of the replay loop; by default the storage decides.
+
+        Yields:
+            Tuple[str, requests.Response]: The request ID and the response from the server.
+        """
+        for request_data in self.storage.iter_requests(request_ids, query=query, prefetch=prefetch):
+            yield request_data['id'], self.replay_request_data(request_data, modifications)
+
+    def replay_unique(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        modifications: Optional[Dict[str, Any]] = None,
+        prefetch: Optional[int] = None,
+    ) -> Iterator[Tuple[str, requests.Response]]:
+        """
+        Replays one representative request per fingerprint group, skipping
+        duplicates of requests that were already replayed.
+
+        Args:
+            query (Optional[Dict[str, Any]]): Optional search query restricting the requests considered.
+            modifications (Optional[Dict[str, Any]]): Optional modifications to apply to every request.
+            prefetch (Optional[int]): How many records to read ahead of the replay loop; by default the storage decides.
+
+        Yields:
+            Tuple[str, requests.Response]: The request ID and the response from the server.
+        """
+        request_ids = self.storage.representative_request_ids(query)
+        return self.replay_requests(request_ids, modifications=modifications, prefetch=prefetch)
+
+    def replay_request_data(
+        self,
+        request_data: Dict[str, Any],
+        modifications: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        Replays an already loaded request record.
+
+        Args:
+            request_data (Dict[str, Any]): The stored request record.
+            modifications (Optional[Dict[str, Any]]): Optional modifications to apply to the request.
+            stream (bool): Return before the response body is downloaded, as in requests.
+
+        Returns:
+            requests.Response: The response from the server.
+
+        Raises:
+            ValueError: If the request body was truncated when it was logged.
+        """
         if modifications:
             # Apply modifications to the request data
             request_data.update(modifications)
-        # import pdb; pdb.set_trace()
+        if RequestUtil.is_body_truncated(request_data):
+            raise ValueError(f"The body of request {request_data.get('id')} was not logged in full and cannot be replayed")
         method = request_data['method']
         url = request_data['url']
         request_kwargs = RequestUtil.parse_request_kwargs(request_data)
-        print(method, url, request_kwargs)
-        response = requests.request(method=method, url=url, **request_kwargs)
+        with metrics.timed('replay.send'):
+            response = requests.request(method=method, url=url, stream=stream, **request_kwargs)
         return response
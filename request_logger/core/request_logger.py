@@ -1,20 +1,44 @@
 import base64
 import uuid
 import datetime
-from typing import Any, Dict, Callable, List, Optional
+from typing import Any, Dict, Callable, Iterable, Iterator, List, Optional, Tuple
 from functools import wraps
 import requests
 from requests.models import Request
+from request_logger.core.analytics import RollupStore
+from request_logger.core.capture import DEFAULT_MAX_BODY_SIZE, DEFAULT_SPILL_THRESHOLD, BodyCapture, encode_body, is_stream, tee_body
+from request_logger.core.fingerprint import fingerprint_prepared
+from request_logger.core.metrics import metrics
 from request_logger.core.storage import AbstractStorage, FileStorage
 
+# Keyword arguments of requests.request that describe the request itself
+REQUEST_KWARGS = ('headers', 'files', 'data', 'params', 'auth', 'cookies', 'hooks', 'json')
+
 class RequestLogger:
-    def __init__(self, storage: AbstractStorage = None, max_logs: int = 100):
+    def __init__(
+        self,
+        storage: AbstractStorage = None,
+        max_logs: int = 100,
+        capture_responses: bool = False,
+        max_body_size: Optional[int] = DEFAULT_MAX_BODY_SIZE,
+        spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+        rollups: Optional[RollupStore] = None,
+    ):
         if storage is None:
             storage = FileStorage(max_logs=max_logs)
         else:
             storage.max_logs = max_logs
 
         self.storage = storage
+        # Store the response of requests sent through get_logged_session() or
+        # get_logged_method(), for offline playback
+        self.capture_responses = capture_responses
+        # Request and response bodies and files longer than this are recorded
+        # truncated, with their length and SHA-256
+        self.max_body_size = max_body_size
+        self.spill_threshold = spill_threshold
+        # Traffic rollups updated as requests are saved, for the analytics page
+        self.rollups = rollups.attach(storage) if rollups is not None else None
 
     def log_request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
         """
@@ -22,21 +46,46 @@ class RequestLogger:
 
         Parameters match those accepted by requests.request.
         """
+        with metrics.timed('log_request'):
+            request_id, request_data = self._build_request_data(method, url, **kwargs)
+
+            # Save request data
+            with metrics.timed('log_request.save'):
+                self.storage.save_request(request_id, request_data)
+
+        # Return request parameters for immediate use
+        request_params = kwargs.copy()
+        if kwargs.get('files'):
+            request_params['files'] = kwargs['files']  # Keep the original file objects
+        return request_id, {
+            'method': method,
+            'url': url,
+            **request_params,
+        }
+
+    def _build_request_data(self, method: str, url: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
         # Generate a unique request ID
         request_id = str(uuid.uuid4())
 
         timestamp = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
 
-
-        # Create a Request object to handle parameter processing
-        req = Request(method=method.upper(), url=url, **kwargs)
-        prepared = req.prepare()
+        # Create a Request object to handle parameter processing. Transport
+        # options such as timeout or stream are not accepted by Request.
+        request_kwargs = {k: v for k, v in kwargs.items() if k in REQUEST_KWARGS}
+        with metrics.timed('log_request.prepare'):
+            req = Request(method=method.upper(), url=url, **request_kwargs)
+            prepared = req.prepare()
 
         data = kwargs.get('data')
         json_data = kwargs.get('json')
         files = kwargs.get('files')
 
-        processed_files = self._process_files(files) if files else None
+        with metrics.timed('log_request.process_files'):
+            processed_files = self._process_files(files) if files else None
+        with metrics.timed('log_request.process_data'):
+            processed_data = self._process_data(data)
+        with metrics.timed('log_request.fingerprint'):
+            fingerprint = fingerprint_prepared(prepared)
         
         # Prepare the request data to be saved
         request_data = {
@@ -45,24 +94,68 @@ class RequestLogger:
             'method': method.upper(),
             'url': prepared.url,
             'headers': dict(prepared.headers),
-            'data': self._process_data(data),
+            'data': processed_data,
             'json': json_data,
             'files': processed_files,
             'original_kwargs': self._sanitize_kwargs(kwargs),            
+            'fingerprint': fingerprint,
         }
+        return request_id, request_data
 
-        # Save request data
-        self.storage.save_request(request_id, request_data)
+    def _send_and_log(self, send: Callable[[], requests.Response], method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through `send`, called with the request keyword
+        arguments, and logs it together with its response. The request is
+        still logged if sending fails.
+        """
+        with metrics.timed('log_request'):
+            request_id, request_data = self._build_request_data(method, url, **kwargs)
+        capture = None
+        if is_stream(kwargs.get('data')):
+            # Record the body as requests reads it instead of consuming it here
+            capture = BodyCapture(self.max_body_size, self.spill_threshold)
+            kwargs['data'] = tee_body(kwargs['data'], capture)
+        try:
+            response = send(**kwargs)
+        except Exception:
+            if capture is not None:
+                request_data['data'] = capture.result()
+                if not capture.complete:
+                    # Sending failed before the body was read to its end, so
+                    # its full size and hash are unknown
+                    request_data['data'].pop('size', None)
+                    request_data['data'].pop('sha256', None)
+                    request_data['data']['truncated'] = True
+            with metrics.timed('log_request.save'):
+                self.storage.save_request(request_id, request_data)
+            raise
 
-        # Return request parameters for immediate use
-        request_params = kwargs.copy()
-        if files:
-            request_params['files'] = files  # Keep the original file objects
-        return request_id, {
-            'method': method,
-            'url': url,
-            **request_params,
+        if capture is not None:
+            request_data['data'] = capture.result()
+
+        if self.capture_responses:
+            with metrics.timed('log_request.process_response'):
+                request_data['response'] = self._process_response(response, read_body=not kwargs.get('stream'))
+        with metrics.timed('log_request.save'):
+            self.storage.save_request(request_id, request_data)
+        return response
+
+    def _process_response(self, response: requests.Response, read_body: bool = True) -> Dict[str, Any]:
+        """
+        Convert a response to a serializable format, encoding the body with base64
+        and truncating it beyond max_body_size. Streamed responses are recorded
+        without their body so they are not consumed.
+        """
+        response_data = {
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'content': None,
+            'elapsed_ms': response.elapsed.total_seconds() * 1000,
         }
+        if read_body:
+            response_data.update(encode_body(response.content, self.max_body_size))
+        return response_data
 
     def _process_files(self, files):
         """
@@ -76,19 +169,21 @@ class RequestLogger:
                 file_obj = file_info[1]
                 content_type = file_info[2] if len(file_info) > 2 else None
 
-                # Read the file content and encode it with base64
+                # Read the file content in chunks and encode it with base64
                 if hasattr(file_obj, 'read'):
-                    file_content = file_obj.read()
-                    file_obj.seek(0)  # Reset file pointer
+                    capture = BodyCapture(self.max_body_size, self.spill_threshold)
+                    capture.read_from(file_obj)
+                    record = capture.result()
                 else:
-                    file_content = file_obj  # Handle string or bytes directly
-
-                encoded_content = base64.b64encode(file_content).decode('utf-8')
+                    if isinstance(file_obj, str):
+                        file_obj = file_obj.encode('utf-8')
+                    record = encode_body(file_obj, self.max_body_size)  # Handle string or bytes directly
+                record.pop('is_base64')
 
                 processed_files[key] = {
                     'filename': filename,
-                    'content': encoded_content,
                     'content_type': content_type,
+                    **record,
                 }
             else:
                 # Handle the case where file_info is not a tuple/list
@@ -102,12 +197,13 @@ class RequestLogger:
         """
         if data is None:
             return None
-        if isinstance(data, bytes):
-            # Encode bytes data with base64
-            encoded_data = base64.b64encode(data).decode('utf-8')
-            return {'content': encoded_data, 'is_base64': True}
-        elif isinstance(data, str):
-            return {'content': data, 'is_base64': False}
+        if isinstance(data, (bytes, bytearray, str)):
+            # Bytes are encoded with base64; both are truncated over max_body_size
+            return encode_body(data, self.max_body_size)
+        elif is_stream(data):
+            # Reading it here would consume it before it is sent. Requests sent
+            # through a logged session or method capture it while sending.
+            return {'content': None, 'is_base64': False, 'truncated': True}
         elif isinstance(data, dict):
             return data  # Assume it's serializable
         else:
@@ -116,9 +212,10 @@ class RequestLogger:
 
     def _sanitize_kwargs(self, kwargs):
         """
-        Remove file objects from kwargs to prevent serialization issues.
+        Remove file objects from kwargs to prevent serialization issues. The
+        body is left out, as it is already recorded under 'data' and 'json'.
         """
-        sanitized = kwargs.copy()
+        sanitized = {k: v for k, v in kwargs.items() if k not in ('data', 'json')}
         if 'files' in sanitized:
             sanitized['files'] = {k: v[0] for k, v in sanitized['files'].items()}  # Keep filenames only
         return sanitized
@@ -129,10 +226,11 @@ class RequestLogger:
         """
         @wraps(method)
         def wrapper(url, *args, **kwargs):
-            # Log the request
-            self.log_request(method=method.__name__.upper(), url=url, **kwargs)
-            # Call the original requests method
-            return method(url, *args, **kwargs)
+            # Call the original requests method and log it with its response
+            return self._send_and_log(
+                lambda **send_kwargs: method(url, *args, **send_kwargs),
+                method=method.__name__.upper(), url=url, **kwargs
+            )
         return wrapper
 
     def get_logged_session(self) -> requests.Session:
@@ -143,10 +241,11 @@ class RequestLogger:
 
         class LoggedSession(requests.Session):
             def request(self_inner, method, url, **kwargs):
-                # Log the request
-                logger.log_request(method=method, url=url, **kwargs)
-                # Call the original request method
-                return super(LoggedSession, self_inner).request(method, url, **kwargs)
+                # Call the original request method and log it with its response
+                return logger._send_and_log(
+                    lambda **send_kwargs: super(LoggedSession, self_inner).request(method, url, **send_kwargs),
+                    method=method, url=url, **kwargs
+                )
 
         return LoggedSession()
 
@@ -155,5 +254,15 @@ class RequestLogger:
 
     def search_requests(self, query: Dict[str, str],  start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[Dict[str, Any]]:
         return self.storage.search_requests(query, start_time=start_time, end_time=end_time)
+
+    def iter_requests(self, request_ids: Optional[Iterable[str]] = None, query: Optional[Dict[str, str]] = None, prefetch: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        return self.storage.iter_requests(request_ids, query=query, prefetch=prefetch)
+
+    def list_request_summaries(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+        return self.storage.list_request_summaries(query, start_time=start_time, end_time=end_time, **kwargs)
+
+    def count_by_fingerprint(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        return self.storage.count_by_fingerprint(query, start_time=start_time, end_time=end_time)
+
     def list_request_ids(self):
         return self.storage.list_request_ids()
\ No newline at end of file
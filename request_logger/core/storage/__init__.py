@@ -1,4 +1,14 @@
 from request_logger.core.storage.base import AbstractStorage
 from request_logger.core.storage.file import FileStorage
-from request_logger.core.storage.s3 import S3Storage
-from request_logger.core.storage.postgres import PostgresStorage
\ No newline at end of file
+from request_logger.core.storage.memory import MemoryStorage
+from request_logger.core.storage.tiered import TieredStorage
+from request_logger.core.storage.registry import available_backends, get_backend, register_backend
+
+# Backends with optional dependencies are imported on first access
+_LAZY_BACKENDS = {'S3Storage': 's3', 'PostgresStorage': 'postgres'}
+
+
+def __getattr__(name):
+    if name in _LAZY_BACKENDS:
+        return get_backend(_LAZY_BACKENDS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,32 @@
+import datetime
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from request_logger.core.events import EventBus
+
+# Threads shared by the read-ahead of all iter_requests calls on one storage
+PREFETCH_WORKERS = 16
+_prefetch_pool_lock = Lock()
+
 
 class AbstractStorage(ABC):
+    # Read-ahead of iter_requests when none is given. Loads from local disk or
+    # memory are faster without threads; backends with network round trips
+    # raise this.
+    default_prefetch = 1
+
+    @property
+    def events(self) -> EventBus:
+        """
+        Publish/subscribe hook notified of every request saved through this storage.
+        """
+        bus = self.__dict__.get('_events')
+        if bus is None:
+            bus = self.__dict__['_events'] = EventBus()
+        return bus
+
     @abstractmethod
     def save_request(self, request_id: str, request_data: Dict[str, Any]) -> None:
         pass
@@ -40,3 +65,186 @@ class AbstractStorage(ABC):
     def get_sorted_identifiers(self) -> List[str]:
         # Return filenames sorted lexicographically, which sorts by timestamp
         pass
+
+    def list_sorted_request_ids(self) -> List[Tuple[str, str]]:
+        """
+        Return (identifier, request ID) pairs, oldest first. Identifiers sort by
+        timestamp, which makes them usable as a resume position.
+        """
+        return [(identifier, self._extract_request_id(identifier)) for identifier in self.get_sorted_identifiers()]
+
+    def load_request_by_identifier(self, identifier: str) -> Dict[str, Any]:
+        """
+        Load a request by its identifier (filename or object key). Backends
+        override this to skip the lookup of the identifier by request ID.
+        """
+        return self.load_request(self._extract_request_id(identifier))
+
+    def _extract_request_id(self, identifier: str) -> str:
+        # Identifiers of the built-in backends are '<timestamp>_<request id>.json'
+        parts = identifier[:-5].split('_')
+        return parts[-1] if len(parts) > 1 else identifier[:-5]
+
+    def search_request_ids(self, query: Dict[str, Any], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        """
+        Return the IDs of requests matching the query. Backends with an index
+        should override this so that no records have to be loaded.
+        """
+        start, end = self._convert_time_range(start_time, end_time)
+        return [
+            request_data['id'] for request_data in self.search_requests(query)
+            if (start is None or str(request_data.get('timestamp')) >= start)
+            and (end is None or str(request_data.get('timestamp')) <= end)
+        ]
+
+    def _convert_time_range(self, start_time: Optional[str], end_time: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        # Convert start_time and end_time to timestamp strings matching the stored format
+        start_time_formatted = self._convert_to_timestamp(start_time) if start_time else None
+        end_time_formatted = self._convert_to_timestamp(end_time) if end_time else None
+        return start_time_formatted, end_time_formatted
+
+    def _convert_to_timestamp(self, time_str: str) -> str:
+        # Assuming the input time_str is in 'YYYY-MM-DD HH:MM:SS' format
+        try:
+            dt = datetime.datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
+            # Convert to the timestamp format used in the database
+            return dt.strftime('%Y%m%d%H%M%S%f')
+        except ValueError:
+            raise ValueError("Invalid time format. Expected format: YYYY-MM-DD HH:MM:SS")
+
+    def count_by_fingerprint(self, query: Optional[Dict[str, Any]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        """
+        Count requests per fingerprint, most frequent first. Requests without a
+        fingerprint are counted under their own ID.
+        """
+        counts: Dict[str, int] = {}
+        for request_data in self._iter_matching(query, start_time, end_time):
+            group = request_data.get('fingerprint') or request_data['id']
+            counts[group] = counts.get(group, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def representative_request_ids(self, query: Optional[Dict[str, Any]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        """
+        Return the ID of the earliest request of every fingerprint group.
+        """
+        first_seen: Dict[str, Dict[str, Any]] = {}
+        for request_data in self._iter_matching(query, start_time, end_time):
+            group = request_data.get('fingerprint') or request_data['id']
+            current = first_seen.get(group)
+            if current is None or request_data['timestamp'] < current['timestamp']:
+                first_seen[group] = {'id': request_data['id'], 'timestamp': request_data['timestamp']}
+        return [r['id'] for r in sorted(first_seen.values(), key=lambda r: r['timestamp'])]
+
+    def list_request_summaries(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        sort: str = 'timestamp',
+        descending: bool = True,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return one page of request summaries (id, timestamp, method, url)
+        ordered by `sort`. `after` is the (sort value, id) of the last summary
+        of the previous page. Backends with an index should override this; the
+        default loads every matching record.
+        """
+        summaries = [
+            {field: request_data.get(field) for field in ('id', 'timestamp', 'method', 'url', 'fingerprint')}
+            for request_data in self._iter_matching(query, start_time, end_time)
+        ]
+        summaries.sort(key=lambda s: (s[sort] or '', s['id']), reverse=descending)
+        if after is not None:
+            after = tuple(after)
+            if descending:
+                summaries = [s for s in summaries if (s[sort] or '', s['id']) < after]
+            else:
+                summaries = [s for s in summaries if (s[sort] or '', s['id']) > after]
+        return summaries[:limit]
+
+    def _iter_matching(self, query: Optional[Dict[str, Any]], start_time: Optional[str], end_time: Optional[str]) -> Iterator[Dict[str, Any]]:
+        # An empty query selects everything here, unlike search_requests
+        if not query and start_time is None and end_time is None:
+            return self.iter_requests()
+        return self.iter_requests(query=query or {}, start_time=start_time, end_time=end_time)
+
+    def iter_requests(
+        self,
+        request_ids: Optional[Iterable[str]] = None,
+        query: Optional[Dict[str, Any]] = None,
+        prefetch: Optional[int] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over stored requests, reading up to `prefetch` records ahead on a
+        thread pool (by default `default_prefetch` of the backend).
+
+        Records are yielded in the order of `request_ids` (or of the search
+        results when a query is given). Requests that no longer exist are
+        skipped. At most `prefetch` records are loaded or held at a time.
+        """
+        if request_ids is None:
+            if query is None and start_time is None and end_time is None:
+                request_ids = self.list_request_ids()
+            else:
+                request_ids = self.search_request_ids(query or {}, start_time=start_time, end_time=end_time)
+        if prefetch is None:
+            prefetch = self.default_prefetch
+
+        load = self._make_loader()
+        if prefetch <= 1:
+            for request_id in request_ids:
+                try:
+                    yield load(request_id)
+                except FileNotFoundError:
+                    continue
+            return
+
+        ids = iter(request_ids)
+        executor = self._prefetch_executor()
+        pending = deque()
+        try:
+            for request_id in ids:
+                pending.append(executor.submit(load, request_id))
+                if len(pending) >= prefetch:
+                    break
+
+            while pending:
+                future = pending.popleft()
+                try:
+                    request_data = future.result()
+                except FileNotFoundError:
+                    request_data = None
+                # Refill the read-ahead window before handing out the record
+                next_id = next(ids, None)
+                if next_id is not None:
+                    pending.append(executor.submit(load, next_id))
+                if request_data is not None:
+                    yield request_data
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _prefetch_executor(self) -> ThreadPoolExecutor:
+        executor = self.__dict__.get('_prefetch_pool')
+        if executor is None:
+            with _prefetch_pool_lock:
+                executor = self.__dict__.get('_prefetch_pool')
+                if executor is None:
+                    executor = self.__dict__['_prefetch_pool'] = ThreadPoolExecutor(
+                        max_workers=PREFETCH_WORKERS, thread_name_prefix='request-logger-prefetch',
+                    )
+        return executor
+
+    def _shutdown_prefetch(self) -> None:
+        executor = self.__dict__.pop('_prefetch_pool', None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _make_loader(self) -> Callable[[str], Dict[str, Any]]:
+        # Return the function used by iter_requests to load a single record.
+        # Backends can override this to resolve all locations in one listing.
+        return self.load_request
@@ -1,19 +1,134 @@
 import datetime
+import logging
 import os
 import json
-from typing import Any, Dict, List, Optional
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.metrics import metrics
 from request_logger.core.storage import AbstractStorage
 from request_logger.core.storage.mixins import LogManagementMixin
 
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('none', 'group', 'record')
+# Hidden files, so that they never show up as stored requests
+RECOVERY_MARKER = '.recovery'
+RECOVERY_LOCK = '.recovery.lock'
+TMP_SUFFIX = '.tmp'
+CORRUPT_SUFFIX = '.corrupt'
+
+
+def _try_lock(path: str) -> Optional[int]:
+    # Exclusive lock held until the descriptor is closed, or None if another
+    # process (or storage) holds it
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _fsync_dir(path: str) -> None:
+    # Persists renames within the directory; directories cannot be opened on Windows
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class FileStorage(AbstractStorage, LogManagementMixin):
-    def __init__(self, storage_dir: str = "request_logs", max_logs: int = 100, metadata_store: MetadataStore | None = None):
+    """
+    Stores every request as a JSON file, indexed in a MetadataStore.
+
+    Files are written under a temporary name and renamed into place, so a
+    crash never leaves a partial record. `durability` selects when they reach
+    the disk:
+
+    - 'none': never fsync. Records survive a process crash, not a power loss.
+    - 'group': a background thread fsyncs the records saved in the last
+      `sync_interval` seconds, or sooner once `sync_records` are pending, in
+      one go. At most that window is lost on a power loss.
+    - 'record': fsync every record before save_request returns.
+
+    The recovery point moves on a background thread, every `sync_records`
+    saves (and every `sync_interval` seconds with 'group'), never past a
+    request whose save has not finished. Unless the storage was closed cleanly, opening it runs `recover()` over
+    the requests saved since the last sync point. Only one storage at a time
+    recovers a directory and keeps its recovery marker: the one holding the
+    lock on it. Others sharing the directory leave both alone, as do storages
+    opened with `recover=False`, which is how readers should open it.
+    """
+
+    def __init__(
+        self,
+        storage_dir: str = "request_logs",
+        max_logs: int = 100,
+        metadata_store: MetadataStore | None = None,
+        archive=None,
+        durability: str = 'none',
+        sync_interval: float = 0.05,
+        sync_records: int = 100,
+        recover: bool = True,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {durability!r}. Expected one of {DURABILITY_MODES}")
         self.storage_dir = storage_dir
         self.max_logs = max_logs
-        
+        # Optional ParquetArchive holding requests exported out of this storage
+        self.archive = archive
+        self.durability = durability
+        self.sync_interval = sync_interval
+        self.sync_records = sync_records
+
         os.makedirs(self.storage_dir, exist_ok=True)
         self.metadata_store = metadata_store or MetadataStore()
-    
+        if durability == 'group':
+            # Commits are not fsynced one by one; sync() checkpoints the log
+            # before it moves the recovery point past them
+            self.metadata_store.use_write_ahead_log()
+
+        self._state_lock = Lock()
+        self._sync_lock = Lock()
+        # Saved since the last sync, and saves still in progress by identifier
+        self._unsynced: List[str] = []
+        self._in_flight: Dict[str, int] = {}
+        # Saved before a save still in progress, so not yet behind the recovery point
+        self._held: List[str] = []
+        self._saved_since_sync = 0
+
+        self._lock_fd: Optional[int] = None
+        if recover and fcntl is not None:
+            self._lock_fd = _try_lock(os.path.join(self.storage_dir, RECOVERY_LOCK))
+        # Without fcntl nothing can be locked; the storage recovers as if alone
+        self._owns_marker = recover and (fcntl is None or self._lock_fd is not None)
+
+        marker = self._read_marker()
+        # Every request with an identifier up to this one is known to be consistent
+        self._synced: Optional[str] = marker.get('synced')
+        if self._owns_marker:
+            if not marker.get('clean'):
+                self.recover(since=self._synced)
+            self._write_marker(clean=False)
+
+        self._stop = Event()
+        self._sync_due = Event()
+        self._sync_thread = None
+        # Only needed to fsync ('group') or to keep the recovery marker
+        self._tracks_saves = durability == 'group' or self._owns_marker
+        if self._tracks_saves:
+            self._sync_thread = Thread(target=self._run_sync, name='request-logger-sync', daemon=True)
+            self._sync_thread.start()
+
     def _generate_filename(self, request_id: str, timestamp: str) -> str:
         # Sanitize timestamp to remove special characters
         safe_timestamp = timestamp.replace(':', '').replace('-', '')
@@ -29,12 +144,185 @@ class FileStorage(AbstractStorage, LogManagementMixin):
         self.save_request_with_log_management(filename, request_data)
 
     def _save_request(self, filename: str, request_data: Dict[str, Any]) -> None:
+        with self._state_lock:
+            self._in_flight[filename] = self._in_flight.get(filename, 0) + 1
+        try:
+            # The file goes first: a crash in between leaves a file that recover()
+            # indexes, never an index entry without its record
+            with metrics.timed('storage.save.write'):
+                self._write_file(filename, request_data)
+
+            with metrics.timed('storage.save.metadata'):
+                self.metadata_store.add_request_metadata(request_data)
+        except BaseException:
+            self._end_save(filename, saved=False)
+            raise
+        self._end_save(filename, saved=True)
+
+    def _write_file(self, filename: str, request_data: Dict[str, Any]) -> None:
         file_path = os.path.join(self.storage_dir, filename)
+        tmp_path = os.path.join(self.storage_dir, f'.{filename}{TMP_SUFFIX}')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(request_data, f, indent=2)
+                if self.durability == 'record':
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, file_path)
+        if self.durability == 'record':
+            _fsync_dir(self.storage_dir)
+
+    def _end_save(self, filename: str, saved: bool) -> None:
+        with self._state_lock:
+            if self._in_flight[filename] == 1:
+                del self._in_flight[filename]
+            else:
+                self._in_flight[filename] -= 1
+            if not (saved and self._tracks_saves):
+                return
+            self._unsynced.append(filename)
+            self._saved_since_sync += 1
+            due = self._saved_since_sync >= self.sync_records
+        if due:
+            self._sync_due.set()
 
-        with open(file_path, 'w') as f:
-            json.dump(request_data, f, indent=2)
+    def sync(self) -> None:
+        """
+        Flush the records saved so far to disk ('group' durability) and move
+        the point from which recover() scans past them.
+        """
+        with self._sync_lock:
+            with self._state_lock:
+                filenames, self._unsynced = self._unsynced, []
+                oldest_in_flight = min(self._in_flight) if self._in_flight else None
+                self._saved_since_sync = 0
 
-        self.metadata_store.add_request_metadata(request_data)
+            if filenames and self.durability == 'group':
+                with metrics.timed('storage.sync'):
+                    for filename in filenames:
+                        try:
+                            fd = os.open(os.path.join(self.storage_dir, filename), os.O_RDONLY)
+                        except FileNotFoundError:
+                            continue  # Deleted since it was saved
+                        try:
+                            os.fsync(fd)
+                        finally:
+                            os.close(fd)
+                    _fsync_dir(self.storage_dir)
+                metrics.increment('storage_synced', len(filenames))
+
+            # Identifiers follow capture time, and requests are saved right
+            # after they are captured, so they arrive (nearly) in order. One
+            # still being saved may sort before others already saved; the
+            # recovery point stays below it until its save has finished.
+            saved = self._held + filenames
+            self._held = [f for f in saved if oldest_in_flight is not None and f >= oldest_in_flight]
+            settled = max((f for f in saved if oldest_in_flight is None or f < oldest_in_flight), default=None)
+            if settled is not None and (self._synced is None or settled > self._synced):
+                # The index entries must be on disk before recovery stops
+                # looking at these records
+                if self.durability == 'group' and not self.metadata_store.checkpoint():
+                    logger.warning("Checkpoint of %s was blocked; keeping the recovery point", self.storage_dir)
+                    self._held.append(settled)
+                    return
+                self._synced = settled
+                self._write_marker(clean=False)
+
+    def _run_sync(self) -> None:
+        # Without fsyncs to batch, there is nothing to do between sync_records saves
+        interval = self.sync_interval if self.durability == 'group' else None
+        while not self._stop.is_set():
+            self._sync_due.wait(interval)
+            self._sync_due.clear()
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Syncing saved requests to disk failed")
+
+    def _read_marker(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.storage_dir, RECOVERY_MARKER), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Missing or torn by a crash: scan everything
+            return {}
+
+    def _write_marker(self, clean: bool) -> None:
+        if not self._owns_marker:
+            return
+        path = os.path.join(self.storage_dir, RECOVERY_MARKER)
+        with open(path + TMP_SUFFIX, 'w') as f:
+            json.dump({'clean': clean, 'synced': self._synced}, f)
+        # A lost update only makes the next recovery scan start earlier
+        os.replace(path + TMP_SUFFIX, path)
+
+    def recover(self, since: Optional[str] = None, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Reconcile the stored files with the metadata index for the requests
+        whose identifier sorts after `since` (all requests if None). Files
+        missing from the index are indexed, unreadable files are renamed to
+        '<name>.corrupt', index entries without a file are dropped and
+        leftover temporary files are removed. Progress is recorded after every
+        `batch_size` files, so an interrupted scan resumes where it stopped.
+        Nothing else may be writing to the directory meanwhile.
+        """
+        result = {'indexed': 0, 'corrupt': 0, 'dangling': 0, 'partial': 0}
+        with metrics.timed('storage.recover'):
+            names = os.listdir(self.storage_dir)
+            for name in names:
+                if name.startswith('.') and name.endswith(TMP_SUFFIX):
+                    os.remove(os.path.join(self.storage_dir, name))
+                    result['partial'] += 1
+
+            filenames = sorted(name for name in names if name.endswith('.json') and (since is None or name > since))
+            on_disk = set(filenames)
+            indexed = set()
+            for request_id, timestamp in self._indexed_since(since):
+                identifier = self._generate_filename(request_id, timestamp)
+                if identifier in on_disk or os.path.exists(os.path.join(self.storage_dir, identifier)):
+                    indexed.add(identifier)
+                else:
+                    self.metadata_store.delete_request_metadata(request_id)
+                    result['dangling'] += 1
+
+            for start in range(0, len(filenames), batch_size):
+                batch = filenames[start:start + batch_size]
+                records = []
+                for filename in batch:
+                    if filename in indexed:
+                        continue
+                    file_path = os.path.join(self.storage_dir, filename)
+                    try:
+                        with open(file_path, 'r') as f:
+                            records.append(json.load(f))
+                    except ValueError:
+                        os.replace(file_path, file_path + CORRUPT_SUFFIX)
+                        result['corrupt'] += 1
+                if records:
+                    self.metadata_store.add_many(records)
+                    result['indexed'] += len(records)
+                self._synced = batch[-1]
+                self._write_marker(clean=False)
+
+        if any(result.values()):
+            logger.warning("Recovered %s: %s", self.storage_dir, result)
+        metrics.increment('storage_recovered', result['indexed'])
+        return result
+
+    def _indexed_since(self, since: Optional[str]) -> List[Tuple[str, str]]:
+        # Hot-tier index entries from the timestamp of `since` onwards
+        after = (since.split('_', 1)[0], '') if since is not None else None
+        rows = []
+        while True:
+            page = self.metadata_store.oldest_in_tier(None, limit=10000, after=after)
+            if not page:
+                return rows
+            rows.extend(page)
+            after = (page[-1][1], page[-1][0])
 
     def _find_filename_by_request_id(self, request_id: str) -> str:
         for filename in os.listdir(self.storage_dir):
@@ -43,15 +331,22 @@ class FileStorage(AbstractStorage, LogManagementMixin):
         return None
 
     def load_request(self, request_id: str) -> Dict[str, Any]:
-        filename = self._find_filename_by_request_id(request_id)
+        with metrics.timed('storage.load.find'):
+            filename = self._find_filename_by_request_id(request_id)
         if not filename:
             raise FileNotFoundError(f"Request with ID {request_id} not found.")
 
         file_path = os.path.join(self.storage_dir, filename)
-        with open(file_path, 'r') as f:
-            request_data = json.load(f)
+        with metrics.timed('storage.load.read'):
+            with open(file_path, 'r') as f:
+                request_data = json.load(f)
         return request_data
 
+    def load_request_by_identifier(self, identifier: str) -> Dict[str, Any]:
+        with metrics.timed('storage.load.read'):
+            with open(os.path.join(self.storage_dir, identifier), 'r') as f:
+                return json.load(f)
+
     def list_request_ids(self) -> List[str]:
         return [self._extract_request_id(filename) for filename in os.listdir(self.storage_dir) if filename.endswith('.json')]
     
@@ -67,38 +362,70 @@ class FileStorage(AbstractStorage, LogManagementMixin):
         return sorted(self.list_filenames())
 
     def search_requests(self, query: Dict[str, str], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[Dict[str, Any]]:
-        # Convert start_time and end_time to timestamp strings matching the format in the database
-        if start_time:
-            start_time_formatted = self._convert_to_timestamp(start_time)
-        else:
-            start_time_formatted = None
+        # Metadata exists but the file does not: iter_requests skips those
+        with metrics.timed('storage.search'):
+            results = list(self.iter_requests(query=query, start_time=start_time, end_time=end_time))
+        if self.archive is not None and (query or start_time or end_time) and self._reaches_archive(start_time):
+            with metrics.timed('storage.search.archive'):
+                found = {request_data['id'] for request_data in results}
+                results += [
+                    request_data for request_data in self.archive.iter_requests(query, start_time, end_time)
+                    if request_data['id'] not in found
+                ]
+        return results
 
-        if end_time:
-            end_time_formatted = self._convert_to_timestamp(end_time)
-        else:
-            end_time_formatted = None
+    def _reaches_archive(self, start_time: Optional[str]) -> bool:
+        # Archived requests are older than the stored ones, so a range that
+        # starts after the oldest stored request has nothing in the archive
+        if start_time is None:
+            return not self.archive.is_empty()
+        start, _ = self._convert_time_range(start_time, None)
+        oldest = self.metadata_store.oldest_in_tier(None, limit=1)
+        return not oldest or start < oldest[0][1]
 
+    def search_request_ids(self, query: Dict[str, str], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
         # Use the metadata store to search
-        matching_request_ids = self.metadata_store.search(query, start_time=start_time_formatted, end_time=end_time_formatted)
-        results = []
-        for request_id in matching_request_ids:
-            try:
-                request_data = self.load_request(request_id)
-                results.append(request_data)
-            except FileNotFoundError:
-                # Handle the case where the metadata exists but the file does not
-                continue
-        return results
+        start_time_formatted, end_time_formatted = self._convert_time_range(start_time, end_time)
+        with metrics.timed('storage.search.metadata'):
+            return self.metadata_store.search(query, start_time=start_time_formatted, end_time=end_time_formatted)
 
-    def _convert_to_timestamp(self, time_str: str) -> str:
-        # Assuming the input time_str is in 'YYYY-MM-DD HH:MM:SS' format
-        try:
-            dt = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-            # Convert to the timestamp format used in the database
-            timestamp = dt.strftime('%Y%m%d%H%M%S%f')
-            return timestamp
-        except ValueError:
-            raise ValueError("Invalid time format. Expected format: YYYY-MM-DD HH:MM:SS")
+    def count_by_fingerprint(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        start_time_formatted, end_time_formatted = self._convert_time_range(start_time, end_time)
+        return self.metadata_store.count_by_fingerprint(query, start_time=start_time_formatted, end_time=end_time_formatted)
+
+    def representative_request_ids(self, query: Optional[Dict[str, str]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        start_time_formatted, end_time_formatted = self._convert_time_range(start_time, end_time)
+        return self.metadata_store.representative_ids(query, start_time=start_time_formatted, end_time=end_time_formatted)
+
+    def list_request_summaries(
+        self,
+        query: Optional[Dict[str, str]] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        sort: str = 'timestamp',
+        descending: bool = True,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        start_time_formatted, end_time_formatted = self._convert_time_range(start_time, end_time)
+        return self.metadata_store.list_requests(
+            query, start_time=start_time_formatted, end_time=end_time_formatted,
+            sort=sort, descending=descending, after=after, limit=limit,
+        )
+
+    def _make_loader(self) -> Callable[[str], Dict[str, Any]]:
+        # List the directory once instead of scanning it for every request ID
+        filenames = {self._extract_request_id(filename): filename for filename in self.list_filenames()}
+
+        def load(request_id: str) -> Dict[str, Any]:
+            filename = filenames.get(request_id)
+            if filename is None:
+                return self.load_request(request_id)
+            # Raises FileNotFoundError if the file was deleted after the listing
+            with metrics.timed('storage.load.read'):
+                with open(os.path.join(self.storage_dir, filename), 'r') as f:
+                    return json.load(f)
+        return load
 
     def delete_request(self, request_id: str) -> None:
         filename = self._find_filename_by_request_id(request_id)
@@ -114,6 +441,22 @@ class FileStorage(AbstractStorage, LogManagementMixin):
             os.remove(file_path)
         request_id = self._extract_request_id(identifier)
         self.metadata_store.delete_request_metadata(request_id)
+
+    def _remove_file(self, identifier: str) -> None:
+        # Remove the stored file but keep its metadata, for records moved elsewhere
+        file_path = os.path.join(self.storage_dir, identifier)
+        if os.path.exists(file_path):
+            os.remove(file_path)
     
     def close(self):
-        self.metadata_store.close()
\ No newline at end of file
+        self._stop.set()
+        self._sync_due.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        self._shutdown_prefetch()
+        self.sync()
+        self._write_marker(clean=True)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        self.metadata_store.close()
@@ -0,0 +1,278 @@
+import datetime
+import json
+import logging
+import signal
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from request_logger.core.metrics import metrics
+from request_logger.core.storage import AbstractStorage
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+class _Slot:
+    """
+    One stored request: the fields searches look at, and the record itself as
+    compact JSON, which is decoded only when the request is loaded.
+    """
+    __slots__ = ('request_id', 'timestamp', 'method', 'url', 'fingerprint', 'payload', 'snapshotted')
+
+    def __init__(self, request_id: str, request_data: Dict[str, Any], payload: bytes):
+        self.request_id = request_id
+        self.timestamp = request_data['timestamp']
+        self.method = request_data.get('method')
+        self.url = request_data.get('url')
+        self.fingerprint = request_data.get('fingerprint')
+        self.payload = payload
+        self.snapshotted = False
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'id': self.request_id, 'timestamp': self.timestamp, 'method': self.method,
+            'url': self.url, 'fingerprint': self.fingerprint,
+        }
+
+
+class MemoryStorage(AbstractStorage):
+    """
+    Keeps the most recent requests in memory, for services where only the last
+    minutes of traffic are of interest and saving must not touch the disk.
+
+    Requests are held in insertion order and the oldest are evicted once more
+    than `max_logs` requests or `max_bytes` of encoded records are stored, or
+    once they are older than `max_age`. Loads are a dict lookup; searches scan
+    the stored requests without decoding them.
+
+    `snapshot()` copies the stored requests to another storage. With
+    `snapshot_to` set, snapshots can also be taken every `snapshot_interval`
+    seconds, on a signal (`snapshot_on_signal`) or on request from any thread
+    (`request_snapshot`, e.g. in an error handler), and on close.
+    """
+
+    def __init__(
+        self,
+        max_logs: Optional[int] = 10000,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        max_age: Optional[datetime.timedelta] = None,
+        snapshot_to: Optional[AbstractStorage] = None,
+        snapshot_interval: Optional[float] = None,
+    ):
+        self.max_logs = max_logs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.snapshot_to = snapshot_to
+        self.snapshot_interval = snapshot_interval
+        self.nbytes = 0
+
+        self._slots: 'OrderedDict[str, _Slot]' = OrderedDict()
+        self._lock = Lock()
+        self._snapshot_lock = Lock()
+        self._stop = Event()
+        self._snapshot_requested = Event()
+        self._thread = None
+        if snapshot_to is not None and snapshot_interval:
+            self._start_snapshot_thread()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def save_request(self, request_id: str, request_data: Dict[str, Any]) -> None:
+        if not request_data.get('timestamp'):
+            request_data['timestamp'] = datetime.datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+        with metrics.timed('storage.save.write'):
+            slot = _Slot(request_id, request_data, json.dumps(request_data, separators=(',', ':')).encode('utf-8'))
+            with self._lock:
+                previous = self._slots.pop(request_id, None)
+                if previous is not None:
+                    self.nbytes -= len(previous.payload)
+                self._slots[request_id] = slot
+                self.nbytes += len(slot.payload)
+                evicted = self._evict()
+        if evicted:
+            metrics.increment('storage_evicted', evicted)
+
+        self.events.publish(request_data)
+
+    def _evict(self) -> int:
+        # Called with the lock held. The newest request is always kept, even
+        # if it alone exceeds max_bytes.
+        cutoff = None
+        if self.max_age is not None:
+            cutoff = (datetime.datetime.utcnow() - self.max_age).strftime(TIMESTAMP_FORMAT)
+        evicted = 0
+        while len(self._slots) > 1:
+            oldest = next(iter(self._slots.values()))
+            if not (
+                (self.max_logs is not None and len(self._slots) > self.max_logs)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+                or (cutoff is not None and oldest.timestamp < cutoff)
+            ):
+                break
+            self._slots.popitem(last=False)
+            self.nbytes -= len(oldest.payload)
+            evicted += 1
+        return evicted
+
+    def load_request(self, request_id: str) -> Dict[str, Any]:
+        slot = self._slots.get(request_id)
+        if slot is None:
+            raise FileNotFoundError(f"Request with ID {request_id} not found.")
+        return json.loads(slot.payload)
+
+    def delete_request(self, request_id: str) -> None:
+        with self._lock:
+            slot = self._slots.pop(request_id, None)
+            if slot is not None:
+                self.nbytes -= len(slot.payload)
+
+    def _delete_by_identifier(self, identifier: str) -> None:
+        self.delete_request(self._extract_request_id(identifier))
+
+    def _identifier(self, slot: _Slot) -> str:
+        return f"{slot.timestamp}_{slot.request_id}.json"
+
+    def list_request_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._slots)
+
+    def list_filenames(self) -> List[str]:
+        with self._lock:
+            return [self._identifier(slot) for slot in self._slots.values()]
+
+    def get_sorted_identifiers(self) -> List[str]:
+        return sorted(self.list_filenames())
+
+    def _matching(self, query: Optional[Dict[str, Any]], start_time: Optional[str], end_time: Optional[str]) -> Iterator[_Slot]:
+        # Same matching as the metadata index of FileStorage: method and URL
+        # are case-insensitive substrings, the fingerprint must be equal
+        query = query or {}
+        method = query['method'].lower() if 'method' in query else None
+        url = query['url'].lower() if 'url' in query else None
+        start, end = self._convert_time_range(start_time, end_time)
+        with self._lock:
+            slots = list(self._slots.values())
+        for slot in slots:
+            if method is not None and method not in (slot.method or '').lower():
+                continue
+            if url is not None and url not in (slot.url or '').lower():
+                continue
+            if 'fingerprint' in query and slot.fingerprint != query['fingerprint']:
+                continue
+            if (start is not None and slot.timestamp < start) or (end is not None and slot.timestamp > end):
+                continue
+            yield slot
+
+    def search_requests(self, query: Dict[str, Any], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[Dict[str, Any]]:
+        with metrics.timed('storage.search'):
+            return list(self.iter_requests(self.search_request_ids(query, start_time, end_time), prefetch=1))
+
+    def search_request_ids(self, query: Dict[str, Any], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        return [slot.request_id for slot in self._matching(query, start_time, end_time)]
+
+    def list_request_summaries(
+        self,
+        query: Optional[Dict[str, Any]] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        sort: str = 'timestamp',
+        descending: bool = True,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        summaries = [slot.summary() for slot in self._matching(query, start_time, end_time)]
+        summaries.sort(key=lambda s: (s[sort] or '', s['id']), reverse=descending)
+        if after is not None:
+            after = tuple(after)
+            if descending:
+                summaries = [s for s in summaries if (s[sort] or '', s['id']) < after]
+            else:
+                summaries = [s for s in summaries if (s[sort] or '', s['id']) > after]
+        return summaries[:limit]
+
+    def count_by_fingerprint(self, query: Optional[Dict[str, Any]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for slot in self._matching(query, start_time, end_time):
+            group = slot.fingerprint or slot.request_id
+            counts[group] = counts.get(group, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def snapshot(self, target: Optional[AbstractStorage] = None) -> int:
+        """
+        Save the stored requests to `target` (by default `snapshot_to`) and
+        return how many were saved. Snapshots to `snapshot_to` only save the
+        requests it does not have yet.
+        """
+        incremental = target is None or target is self.snapshot_to
+        target = target or self.snapshot_to
+        if target is None:
+            raise ValueError("No storage to snapshot to")
+
+        with self._snapshot_lock:
+            with self._lock:
+                slots = [slot for slot in self._slots.values() if not (incremental and slot.snapshotted)]
+            with metrics.timed('storage.snapshot'):
+                for slot in slots:
+                    target.save_request(slot.request_id, json.loads(slot.payload))
+                    if incremental:
+                        slot.snapshotted = True
+        metrics.increment('storage_snapshotted', len(slots))
+        return len(slots)
+
+    def request_snapshot(self) -> None:
+        """
+        Take a snapshot to `snapshot_to` on the snapshot thread. Safe to call
+        from signal handlers and from threads that must not block.
+        """
+        if self._thread is None:
+            self._start_snapshot_thread()
+        self._snapshot_requested.set()
+
+    def snapshot_on_signal(self, signum: Optional[int] = None) -> None:
+        """
+        Take a snapshot when the process receives `signum` (SIGUSR1 by
+        default). Must be called from the main thread.
+        """
+        if self.snapshot_to is None:
+            raise ValueError("No storage to snapshot to")
+        signum = signal.SIGUSR1 if signum is None else signum
+        previous = signal.getsignal(signum)
+
+        def handler(received, frame):
+            self.request_snapshot()
+            if callable(previous):
+                previous(received, frame)
+
+        # Start the thread here; threads cannot be started safely in a handler
+        if self._thread is None:
+            self._start_snapshot_thread()
+        signal.signal(signum, handler)
+
+    def _start_snapshot_thread(self) -> None:
+        self._thread = Thread(target=self._run_snapshots, name='request-logger-snapshot', daemon=True)
+        self._thread.start()
+
+    def _run_snapshots(self) -> None:
+        while True:
+            self._snapshot_requested.wait(self.snapshot_interval)
+            self._snapshot_requested.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception("Snapshot of in-memory requests failed")
+
+    def close(self) -> None:
+        self._shutdown_prefetch()
+        self._stop.set()
+        self._snapshot_requested.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.snapshot_to is not None:
+            self.snapshot()
+
@@ -1,6 +1,7 @@
 
 import datetime
 from typing import Any, Dict, List
+from request_logger.core.metrics import metrics
 
 class LogManagementMixin:
     max_logs: int = 100 
@@ -9,9 +10,13 @@ class LogManagementMixin:
         # Save the request data using the storage's save_request method
         self._save_request(identifier, request_data)
 
+        # Notify live subscribers once the request is stored
+        self.events.publish(request_data)
+
         # Enforce the maximum logs limit
         if self.max_logs is not None:
-            self._enforce_max_logs()
+            with metrics.timed('storage.enforce_max_logs'):
+                self._enforce_max_logs()
 
     def _enforce_max_logs(self):
         identifiers = self.get_sorted_identifiers()
@@ -25,3 +30,4 @@ class LogManagementMixin:
         # Delete old logs
         for identifier in identifiers_to_delete:
             self._delete_by_identifier(identifier)
+        metrics.increment('storage_evicted', num_to_delete)
@@ -0,0 +1,70 @@
+import importlib
+from threading import Lock
+from typing import Dict, List, Type, Union
+
+# Entry point group under which third-party packages register storage backends:
+#
+#     [project.entry-points."request_logger.storage"]
+#     redis = "my_package.storage:RedisStorage"
+ENTRY_POINT_GROUP = 'request_logger.storage'
+
+# Built-in backends as 'module:attribute', imported on first use so that their
+# dependencies (boto3, psycopg2) are only needed when they are used
+_backends: Dict[str, Union[str, type]] = {
+    'file': 'request_logger.core.storage.file:FileStorage',
+    's3': 'request_logger.core.storage.s3:S3Storage',
+    'postgres': 'request_logger.core.storage.postgres:PostgresStorage',
+}
+_entry_points_loaded = False
+_lock = Lock()
+
+
+def register_backend(name: str, backend: Union[str, type]) -> None:
+    """
+    Register a storage backend class, or a 'module:attribute' path to import
+    it from when it is first requested.
+    """
+    with _lock:
+        _backends[name] = backend
+
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    if hasattr(found, 'select'):
+        found = found.select(group=ENTRY_POINT_GROUP)
+    else:
+        # Python < 3.10 returns a dict of groups
+        found = found.get(ENTRY_POINT_GROUP, [])
+    with _lock:
+        for entry_point in found:
+            # Built-in and explicitly registered backends take precedence
+            _backends.setdefault(entry_point.name, entry_point.value)
+        _entry_points_loaded = True
+
+
+def get_backend(name: str) -> Type:
+    """
+    Return the storage class registered under `name`, importing it if needed.
+    """
+    if name not in _backends:
+        _load_entry_points()
+    try:
+        backend = _backends[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend '{name}'. Available: {', '.join(available_backends())}")
+    if isinstance(backend, str):
+        module_name, _, attribute = backend.partition(':')
+        backend = getattr(importlib.import_module(module_name), attribute)
+        with _lock:
+            _backends[name] = backend
+    return backend
+
+
+def available_backends() -> List[str]:
+    _load_entry_points()
+    return sorted(_backends)
@@ -1,17 +1,31 @@
 
 import datetime
 import json
-import boto3
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 from request_logger.core.storage import AbstractStorage
+from request_logger.core.metrics import metrics
 from request_logger.core.storage.mixins import LogManagementMixin
 
 class S3Storage(AbstractStorage, LogManagementMixin):
-    def __init__(self, bucket_name: str, max_logs: int = 100):
-        self.s3_client = boto3.client('s3')
+    # Every load is a round trip, so read ahead in parallel
+    default_prefetch = 8
+
+    def __init__(self, bucket_name: str, max_logs: int = 100, s3_client=None):
+        self._s3_client = s3_client
         self.bucket_name = bucket_name
         self.max_logs = max_logs
 
+    @property
+    def s3_client(self):
+        # boto3 is imported and the client created on first use
+        if self._s3_client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise ImportError("S3Storage requires boto3: pip install 'py-requests-logger[s3]'") from e
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
+
     def save_request(self, request_id: str, request_data: Dict[str, Any]) -> None:
         # Generate the key with the timestamp
         timestamp = request_data.get('timestamp')
@@ -28,31 +42,50 @@ class S3Storage(AbstractStorage, LogManagementMixin):
         return f"{safe_timestamp}_{request_id}.json"
 
     def _save_request(self, key: str, request_data: Dict[str, Any]) -> None:
-        self.s3_client.put_object(
-            Bucket=self.bucket_name,
-            Key=key,
-            Body=json.dumps(request_data)
-        )
+        with metrics.timed('storage.save.write'):
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=json.dumps(request_data)
+            )
 
     def load_request(self, request_id: str) -> Dict[str, Any]:
-        key = self._find_key_by_request_id(request_id)
+        with metrics.timed('storage.load.find'):
+            key = self._find_key_by_request_id(request_id)
         if not key:
             raise FileNotFoundError(f"Request with ID {request_id} not found.")
-        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
-        content = response['Body'].read().decode('utf-8')
+        with metrics.timed('storage.load.read'):
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            content = response['Body'].read().decode('utf-8')
         return json.loads(content)
 
+    def load_request_by_identifier(self, identifier: str) -> Dict[str, Any]:
+        try:
+            with metrics.timed('storage.load.read'):
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=identifier)
+                return json.loads(response['Body'].read().decode('utf-8'))
+        except self.s3_client.exceptions.NoSuchKey:
+            # The key may differ from the identifier, e.g. when the timestamp contains '.'
+            return self.load_request(self._extract_request_id(identifier))
+
     def delete_request(self, request_id: str) -> None:
         key = self._find_key_by_request_id(request_id)
         if key:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
 
+    def _delete_by_identifier(self, identifier: str) -> None:
+        # here, identifier is the object key
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=identifier)
+
     def list_request_ids(self) -> List[str]:
         return [self._extract_request_id(obj['Key']) for obj in self._list_objects()]
 
     def list_keys(self) -> List[str]:
         return [obj['Key'] for obj in self._list_objects()]
 
+    def list_filenames(self) -> List[str]:
+        return self.list_keys()
+
     def search_requests(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
         results = []
         for key in self.list_keys():
@@ -67,6 +100,21 @@ class S3Storage(AbstractStorage, LogManagementMixin):
                 results.append(request_data)
         return results
 
+    def _make_loader(self) -> Callable[[str], Dict[str, Any]]:
+        # Resolve every key with a single listing instead of one per request ID
+        keys = {self._extract_request_id(key): key for key in self.list_keys()}
+
+        def load(request_id: str) -> Dict[str, Any]:
+            key = keys.get(request_id)
+            if key is None:
+                raise FileNotFoundError(f"Request with ID {request_id} not found.")
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            except self.s3_client.exceptions.NoSuchKey:
+                raise FileNotFoundError(f"Request with ID {request_id} not found.")
+            return json.loads(response['Body'].read().decode('utf-8'))
+        return load
+
     def _find_key_by_request_id(self, request_id: str) -> str:
         for key in self.list_keys():
             if key.endswith(f"_{request_id}.json"):
@@ -0,0 +1,291 @@
+import datetime
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from request_logger.core.events import EventBus
+from request_logger.core.metrics import metrics
+from request_logger.core.storage import AbstractStorage, FileStorage
+
+logger = logging.getLogger(__name__)
+
+COLD_TIER = 'cold'
+
+
+class _ReadCache:
+    """
+    Least recently used cache of cold records, kept as JSON files in a local
+    directory so that it survives restarts.
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, None]' = OrderedDict()
+        self._lock = Lock()
+        if max_entries:
+            os.makedirs(directory, exist_ok=True)
+            cached = [name for name in os.listdir(directory) if name.endswith('.json')]
+            cached.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+            for name in cached:
+                self._entries[name[:-5]] = None
+
+    def _path(self, request_id: str) -> str:
+        return os.path.join(self.directory, f'{request_id}.json')
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if request_id not in self._entries:
+                return None
+            self._entries.move_to_end(request_id)
+        try:
+            with open(self._path(request_id), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self.discard(request_id)
+            return None
+
+    def put(self, request_id: str, request_data: Dict[str, Any]) -> None:
+        if not self.max_entries:
+            return
+        tmp_path = f'{self._path(request_id)}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(request_data, f)
+        os.replace(tmp_path, self._path(request_id))
+        with self._lock:
+            self._entries[request_id] = None
+            self._entries.move_to_end(request_id)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+        for old_id in evicted:
+            self._remove(old_id)
+
+    def discard(self, request_id: str) -> None:
+        with self._lock:
+            self._entries.pop(request_id, None)
+        self._remove(request_id)
+
+    def _remove(self, request_id: str) -> None:
+        try:
+            os.remove(self._path(request_id))
+        except FileNotFoundError:
+            pass
+
+
+class TieredStorage(AbstractStorage):
+    """
+    Keeps recent requests in a hot FileStorage and moves older ones to a cold
+    storage (usually S3Storage) instead of deleting them.
+
+    New requests are only written to the hot tier. A background thread moves
+    the oldest hot requests to the cold tier once the hot tier holds more than
+    `max_logs` requests or they are older than `max_age`, in batches of
+    `batch_size` and at most `max_rate` requests per second, so that migration
+    does not compete with capture. The hot tier's metadata index covers both
+    tiers and records where each request lives, which is used to route loads
+    and searches. Cold reads are cached in `cache_dir`.
+
+    `max_logs` is the capacity of the hot tier; the cold tier applies its own
+    `max_logs`, so pass `max_logs=None` to it to keep everything.
+    """
+
+    def __init__(
+        self,
+        hot: FileStorage,
+        cold: AbstractStorage,
+        max_logs: Optional[int] = 1000,
+        max_age: Optional[datetime.timedelta] = None,
+        batch_size: int = 100,
+        interval: float = 5.0,
+        max_rate: Optional[float] = 50.0,
+        cache_dir: Optional[str] = None,
+        cache_size: int = 256,
+        background: bool = True,
+    ):
+        self.hot = hot
+        self.cold = cold
+        # Retention of the hot tier is replaced by migration
+        self.hot.max_logs = None
+        self.max_logs = max_logs
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_rate = max_rate
+        self.metadata_store = hot.metadata_store
+        self.cache = _ReadCache(cache_dir or f'{hot.storage_dir.rstrip(os.sep)}_cold_cache', cache_size)
+
+        self._migration_lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        if background:
+            self._thread = Thread(target=self._run_migrations, name='request-logger-tiering', daemon=True)
+            self._thread.start()
+
+    @property
+    def default_prefetch(self) -> int:
+        return max(self.hot.default_prefetch, self.cold.default_prefetch)
+
+    @property
+    def events(self) -> EventBus:
+        # Requests are saved through the hot tier, which publishes them
+        return self.hot.events
+
+    def save_request(self, request_id: str, request_data: Dict[str, Any]) -> None:
+        # Nothing else happens on the capture path; migration polls the index
+        self.hot.save_request(request_id, request_data)
+
+    def _locate(self, request_id: str) -> Tuple[str, Optional[str]]:
+        location = self.metadata_store.get_location(request_id)
+        if location is None:
+            raise FileNotFoundError(f"Request with ID {request_id} not found.")
+        timestamp, tier = location
+        return self.hot._generate_filename(request_id, timestamp), tier
+
+    def load_request(self, request_id: str) -> Dict[str, Any]:
+        identifier, tier = self._locate(request_id)
+        if tier != COLD_TIER:
+            try:
+                return self.hot.load_request_by_identifier(identifier)
+            except FileNotFoundError:
+                # Migrated between the index lookup and the read
+                identifier, tier = self._locate(request_id)
+                if tier != COLD_TIER:
+                    raise
+        return self._load_cold(request_id, identifier)
+
+    def _load_cold(self, request_id: str, identifier: str) -> Dict[str, Any]:
+        request_data = self.cache.get(request_id)
+        if request_data is not None:
+            metrics.increment('tiered_cache_hits')
+            return request_data
+        metrics.increment('tiered_cache_misses')
+        with metrics.timed('storage.load.cold'):
+            request_data = self.cold.load_request_by_identifier(identifier)
+        self.cache.put(request_id, request_data)
+        return request_data
+
+    def delete_request(self, request_id: str) -> None:
+        try:
+            identifier, _ = self._locate(request_id)
+        except FileNotFoundError:
+            return
+        self._delete_by_identifier(identifier)
+
+    def _delete_by_identifier(self, identifier: str) -> None:
+        request_id = self._extract_request_id(identifier)
+        location = self.metadata_store.get_location(request_id)
+        if location is not None and location[1] == COLD_TIER:
+            self.cold._delete_by_identifier(identifier)
+            self.cache.discard(request_id)
+            self.metadata_store.delete_request_metadata(request_id)
+        else:
+            self.hot._delete_by_identifier(identifier)
+
+    def search_requests(self, query: Dict[str, Any], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self.iter_requests(query=query, start_time=start_time, end_time=end_time))
+
+    def search_request_ids(self, query: Dict[str, Any], start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        # The hot tier's index covers both tiers
+        return self.hot.search_request_ids(query, start_time=start_time, end_time=end_time)
+
+    def count_by_fingerprint(self, query: Optional[Dict[str, Any]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict[str, int]:
+        return self.hot.count_by_fingerprint(query, start_time=start_time, end_time=end_time)
+
+    def representative_request_ids(self, query: Optional[Dict[str, Any]] = None, start_time: Optional[str] = None, end_time: Optional[str] = None) -> List[str]:
+        return self.hot.representative_request_ids(query, start_time=start_time, end_time=end_time)
+
+    def list_request_summaries(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return self.hot.list_request_summaries(*args, **kwargs)
+
+    def list_request_ids(self) -> List[str]:
+        return [self._extract_request_id(identifier) for identifier in self.get_sorted_identifiers()]
+
+    def list_filenames(self) -> List[str]:
+        return self.get_sorted_identifiers()
+
+    def get_sorted_identifiers(self) -> List[str]:
+        identifiers = []
+        after = None
+        while True:
+            page = self.metadata_store.list_requests(sort='timestamp', descending=False, after=after, limit=10000)
+            if not page:
+                return identifiers
+            identifiers.extend(self.hot._generate_filename(row['id'], row['timestamp']) for row in page)
+            after = (page[-1]['timestamp'], page[-1]['id'])
+
+    def _make_loader(self) -> Callable[[str], Dict[str, Any]]:
+        return self.load_request
+
+    def migrate(self, limit: Optional[int] = None) -> int:
+        """
+        Move the requests due for migration to the cold tier now, at most
+        `limit` of them. Returns the number of requests moved.
+        """
+        moved = 0
+        with self._migration_lock:
+            while limit is None or moved < limit:
+                batch = self._due_for_migration(self.batch_size if limit is None else min(self.batch_size, limit - moved))
+                if not batch or self._stop.is_set():
+                    break
+                moved += self._migrate_batch(batch)
+        return moved
+
+    def _due_for_migration(self, limit: int) -> List[Tuple[str, str]]:
+        due = 0
+        if self.max_logs is not None:
+            due = self.metadata_store.count_in_tier(None) - self.max_logs
+        if self.max_age is not None:
+            cutoff = (datetime.datetime.utcnow() - self.max_age).strftime('%Y%m%d%H%M%S%f')
+            due = max(due, self.metadata_store.count_in_tier(None, before=cutoff))
+        if due <= 0:
+            return []
+        return self.metadata_store.oldest_in_tier(None, limit=min(due, limit))
+
+    def _migrate_batch(self, batch: List[Tuple[str, str]]) -> int:
+        moved = []
+        started = time.monotonic()
+        with metrics.timed('storage.migrate.batch'):
+            for request_id, timestamp in batch:
+                identifier = self.hot._generate_filename(request_id, timestamp)
+                try:
+                    request_data = self.hot.load_request_by_identifier(identifier)
+                except FileNotFoundError:
+                    # Deleted meanwhile; drop the stale index entry
+                    self.metadata_store.delete_request_metadata(request_id)
+                    continue
+                self.cold.save_request(request_id, request_data)
+                moved.append((request_id, identifier))
+                if self.max_rate:
+                    # Pace migration so that it uses a bounded share of I/O
+                    delay = len(moved) / self.max_rate - (time.monotonic() - started)
+                    if delay > 0 and self._stop.wait(delay):
+                        break
+
+        # Records are readable from the cold tier before the hot copies go
+        self.metadata_store.set_tier([request_id for request_id, _ in moved], COLD_TIER)
+        for _, identifier in moved:
+            self.hot._remove_file(identifier)
+        metrics.increment('tiered_migrated', len(moved))
+        return len(moved)
+
+    def _run_migrations(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.migrate()
+            except Exception:
+                logger.exception("Moving requests to the cold tier failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._shutdown_prefetch()
+        self.hot.close()
+        close_cold = getattr(self.cold, 'close', None)
+        if close_cold is not None:
+            close_cold()
@@ -32,6 +32,18 @@ class RequestUtil:
 
         return request_kwargs
 
+    @staticmethod
+    def is_body_truncated(request_data: Dict[str, Any]) -> bool:
+        # Bodies over the logger's max_body_size, and streams logged before
+        # they were sent, are not recorded in full
+        data = request_data.get('data')
+        if isinstance(data, dict) and 'is_base64' in data and data.get('truncated'):
+            return True
+        return any(
+            isinstance(file_info, dict) and file_info.get('truncated')
+            for file_info in (request_data.get('files') or {}).values()
+        )
+
     @staticmethod
     def reconstruct_files( files_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not files_data:
@@ -52,3 +64,9 @@ class RequestUtil:
                 file_tuple += (content_type,)
             reconstructed_files[key] = file_tuple
         return reconstructed_files
+
+    @staticmethod
+    def decode_response_body(response_data: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not response_data or not response_data.get('content'):
+            return None
+        return base64.b64decode(response_data['content']).decode('utf-8', errors='replace')
@@ -1,16 +1,29 @@
+import asyncio
+import codecs
 import html
-from typing import Optional
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+from urllib.parse import urlencode
 from fastapi import FastAPI, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from request_logger.core.storage.file import FileStorage
 from request_logger.core.request_logger import RequestLogger
 from request_logger.core.replayer import Replayer
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi import HTTPException
 
+from request_logger.core.analytics import RollupStore
+from request_logger.core.events import make_request_filter
+from request_logger.core import metrics as metrics_module
+from request_logger.core.metrics import metrics
 from request_logger.core.util import RequestUtil
+from request_logger.web.jobs import ReplayJobManager
+from request_logger.web.tail import IndexTail
 
 app = FastAPI()
 
@@ -23,85 +36,241 @@ templates_dir = Path(__file__).parent / "templates"
 templates = Jinja2Templates(directory=str(templates_dir))
 
 # Initialize storage and logger
-storage = FileStorage(storage_dir='request_logs')
+# The logging process recovers the directory after a crash; this one only reads it
+storage = FileStorage(storage_dir='request_logs', recover=False)
 r_logger = RequestLogger(storage=storage)
 replayer = Replayer(storage=storage)
+# The logging process maintains the rollups (RequestLogger(rollups=...)); the
+# analytics page only reads the tables
+rollups = RollupStore()
+
+# Replays wait on remote servers, so they get their own pools instead of the
+# threadpool used for storage reads. A slow replay only holds one of these.
+replay_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="replay")
+bulk_replay_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bulk-replay")
+replay_jobs = ReplayJobManager(replayer, bulk_replay_executor)
+# Requests are saved by other processes, so the live tail follows the shared
+# metadata index rather than the events of this process's storage
+index_tail = IndexTail(storage.metadata_store)
+
+metrics.register_gauge('tail_subscribers', index_tail.events.subscriber_count)
+metrics.register_gauge('tail_queue_depth', index_tail.events.queue_depth)
+metrics.register_gauge('replay_jobs_running', lambda: sum(not job.finished for job in list(replay_jobs.jobs.values())))
+
+# The /debug endpoints start cProfile and tracemalloc in this process, so they
+# are only served when explicitly enabled
+PROFILING_ENABLED = os.environ.get('REQUEST_LOGGER_PROFILING') == '1'
+
+STREAM_CHUNK_SIZE = 8192
+SSE_POLL_INTERVAL = 0.25
+SSE_KEEPALIVE_INTERVAL = 15
+TAIL_BUFFER_SIZE = 500
+
+
+async def run_replay(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(replay_executor, lambda: func(*args, **kwargs))
+
+
+def _iter_response_text(response) -> Iterator[str]:
+    # Decode the body chunk by chunk as it arrives; chunks are escaped by the template
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+    finally:
+        response.close()
+
+
+def _error_html(message: str) -> str:
+    return f"""
+            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4">
+                <p class="font-bold">Error</p>
+                <p>{html.escape(message)}</p>
+            </div>
+            """
+
+
+PAGE_SIZE = 50
+
+
+def _request_page(query: dict, start_time: Optional[str], end_time: Optional[str], sort: str, order: str, after: Optional[str] = None, after_id: Optional[str] = None) -> dict:
+    """
+    Fetch one page of request summaries from the metadata index and build the
+    URL of the next page for infinite scrolling.
+    """
+    cursor = (after, after_id) if after_id is not None else None
+    summaries = r_logger.list_request_summaries(
+        query, start_time=start_time, end_time=end_time,
+        sort=sort, descending=(order == 'desc'), after=cursor, limit=PAGE_SIZE,
+    )
+    next_url = None
+    if len(summaries) == PAGE_SIZE:
+        last = summaries[-1]
+        params = {k: v for k, v in {**query, 'start_time': start_time, 'end_time': end_time}.items() if v}
+        params.update({'sort': sort, 'order': order, 'after': last[sort] or '', 'after_id': last['id']})
+        next_url = f"/requests?{urlencode(params)}"
+    return {"requests": summaries, "next_url": next_url}
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request):
-    # Retrieve list of request data
-    request_ids = r_logger.list_request_ids()
-    requests_data = []
-    for request_id in request_ids:
+async def index(request: Request, sort: str = 'timestamp', order: str = 'desc'):
+    # Only the first page of metadata is read; bodies are loaded on the detail view
+    try:
+        page = await run_in_threadpool(_request_page, {}, None, None, sort, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return templates.TemplateResponse("index.html", {"request": request, "sort": sort, "order": order, **page})
+
+
+@app.get("/requests", response_class=HTMLResponse)
+async def request_page(
+    request: Request,
+    method: Optional[str] = None,
+    url: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    sort: str = 'timestamp',
+    order: str = 'desc',
+    after: Optional[str] = None,
+    after_id: Optional[str] = None,
+):
+    # Further pages, appended to the list by htmx
+    query = {k: v for k, v in {'method': method, 'url': url}.items() if v}
+    try:
+        page = await run_in_threadpool(_request_page, query, start_time, end_time, sort, order, after, after_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return templates.TemplateResponse("request_list.html", {"request": request, "append": True, **page})
+
+@app.get("/analytics", response_class=HTMLResponse)
+async def analytics(request: Request, granularity: str = 'minute', start: Optional[str] = None, end: Optional[str] = None):
+    # Served from the rollup tables, so no request records are loaded
+    try:
+        per_bucket = await run_in_threadpool(rollups.requests_per_bucket, granularity, start, end)
+        latencies = await run_in_threadpool(rollups.latency_quantiles, 'host', (0.5, 0.95, 0.99), granularity, start, end)
+        payloads = await run_in_threadpool(rollups.top_payload_sizes, 10, granularity, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return templates.TemplateResponse("analytics.html", {
+        "request": request,
+        "granularity": granularity,
+        "per_bucket": per_bucket[-200:],
+        "latencies": latencies,
+        "payloads": payloads,
+    })
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _require_profiling():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled. Set REQUEST_LOGGER_PROFILING=1 to enable it.")
+
+
+@app.post("/debug/profile/start")
+async def profile_start():
+    _require_profiling()
+    try:
+        metrics_module.start_profiler()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse({"status": "started"})
+
+
+@app.post("/debug/profile/stop", response_class=PlainTextResponse)
+async def profile_stop(sort_by: str = 'cumulative', limit: int = 50):
+    _require_profiling()
+    try:
+        return PlainTextResponse(metrics_module.stop_profiler(sort_by=sort_by, limit=limit))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/debug/tracemalloc/start")
+async def tracemalloc_start(frames: int = 10):
+    _require_profiling()
+    metrics_module.start_tracemalloc(frames)
+    return JSONResponse({"status": "started"})
+
+
+@app.get("/debug/tracemalloc", response_class=PlainTextResponse)
+async def tracemalloc_snapshot(limit: int = 25, stop: bool = False):
+    _require_profiling()
+    try:
+        return PlainTextResponse(metrics_module.tracemalloc_report(limit=limit, stop=stop))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/tail")
+async def tail_requests(
+    request: Request,
+    method: Optional[str] = None,
+    host: Optional[str] = None,
+    path: Optional[str] = None,
+):
+    """
+    Push requests to the browser as server-sent events shortly after any
+    process saves them to the metadata index. Each client has a bounded
+    buffer; if it falls behind, the oldest events are dropped and a
+    `dropped` event reports how many.
+    """
+    subscription = index_tail.subscribe(maxsize=TAIL_BUFFER_SIZE, filter=make_request_filter(method, host, path))
+
+    async def event_stream():
+        reported_drops = 0
         try:
-            request_data = r_logger.load_request(request_id)
-            requests_data.append(request_data)
-        except FileNotFoundError:
-            continue
-    return templates.TemplateResponse("index.html", {"request": request, "requests": requests_data})
+            while not await request.is_disconnected():
+                summary = await subscription.aget(timeout=SSE_KEEPALIVE_INTERVAL)
+                if subscription.dropped != reported_drops:
+                    reported_drops = subscription.dropped
+                    yield f"event: dropped\ndata: {json.dumps({'dropped': reported_drops})}\n\n"
+                if summary is None:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: request\ndata: {json.dumps(summary)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 
 @app.get("/request/{request_id}", response_class=HTMLResponse)
 async def request_detail(request: Request, request_id: str):
     try:
-        request_data = r_logger.load_request(request_id)
+        request_data = await run_in_threadpool(r_logger.load_request, request_id)
         request_data.update(RequestUtil.parse_request_kwargs(request_data))
+        request_data['response_body'] = RequestUtil.decode_response_body(request_data.get('response'))
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Request not found")
     return templates.TemplateResponse("request_detail.html", {"request": request, "request_data": request_data})
 
 
-@app.post("/request/{request_id}/replay", response_class=HTMLResponse)
-async def replay_request(request_id: str):
-    try:
-        response = replayer.replay_request(request_id)
-        status_code = response.status_code
-        content = html.escape(response.text)
-
-        html_content = f"""
-        <div class="bg-green-100 border border-green-400 text-green-700 px-4 py-3 rounded relative" role="alert">
-          <strong class="font-bold">Replayed Successfully!</strong>
-          <span class="block sm:inline">Status Code: {status_code}</span>
-          <div class="mt-2">
-            <p class="font-semibold">Response Body:</p>
-            <pre class="bg-gray-100 p-4 rounded overflow-auto">{content}</pre>
-          </div>
-        </div>
-        """
-        return HTMLResponse(content=html_content)
-    except Exception as e:
-        error_message = html.escape(str(e))
-        html_content = f"""
-        <div class="bg-red-100 border border-red-400 text-red-700 px-4 py-3 rounded relative" role="alert">
-          <strong class="font-bold">Error:</strong>
-          <span class="block sm:inline">{error_message}</span>
-        </div>
-        """
-        return HTMLResponse(content=html_content, status_code=500)
-
 @app.post("/request/{request_id}/replay", response_class=HTMLResponse)
 async def replay_request(request: Request, request_id: str):
     try:
-        response = replayer.replay_request(request_id)
-        status_code = response.status_code
-        content = html.escape(response.text)
-
-        return templates.TemplateResponse("replay_result.html", {
-            "request": request,
-            "status_code": status_code,
-            "content": content,
-        })
+        # Only wait for the status line and headers; the body is streamed below
+        response = await run_replay(replayer.replay_request, request_id, stream=True)
     except Exception as e:
-        error_message = html.escape(str(e))
-        return HTMLResponse(
-            content=f"""
-            <div class="bg-red-100 border-l-4 border-red-500 text-red-700 p-4">
-                <p class="font-bold">Error</p>
-                <p>{error_message}</p>
-            </div>
-            """, 
-            status_code=500
-        )
+        return HTMLResponse(content=_error_html(str(e)), status_code=500)
+
+    template = templates.get_template("replay_result.html")
+    content = template.generate(
+        request=request,
+        status_code=response.status_code,
+        content_chunks=_iter_response_text(response),
+    )
+    return StreamingResponse(content, media_type="text/html")
 
 
 @app.post("/request/{request_id}/modify_replay", response_class=HTMLResponse)
@@ -109,18 +278,64 @@ async def modify_and_replay(request: Request, request_id: str):
     form_data = await request.form()
     modifications = dict(form_data)
     try:
-        response = replayer.replay_request(request_id, modifications=modifications)
+        response = await run_replay(replayer.replay_request, request_id, modifications=modifications)
         status_code = response.status_code
         content = f"<p>Modified request replayed successfully with status code: {status_code}</p>"
         return HTMLResponse(content=content)
     except Exception as e:
-        content = f"<p>Error replaying modified request: {str(e)}</p>"
+        content = f"<p>Error replaying modified request: {html.escape(str(e))}</p>"
         return HTMLResponse(content=content, status_code=500)
 
+
+@app.post("/replay/bulk")
+async def bulk_replay(
+    request_ids: Optional[List[str]] = Form(None),
+    method: Optional[str] = Form(None),
+    url: Optional[str] = Form(None),
+    unique: bool = Form(False),
+):
+    """
+    Start replaying several requests in the background. Progress is reported
+    as server-sent events at the returned events_url.
+    """
+    query = {}
+    if method:
+        query['method'] = method.upper()
+    if url:
+        query['url'] = url
+    if not request_ids and not query and not unique:
+        raise HTTPException(status_code=400, detail="Provide request_ids or a search query")
+
+    job = replay_jobs.start(request_ids=request_ids or None, query=query, unique=unique)
+    return JSONResponse({"job_id": job.id, "events_url": f"/replay/jobs/{job.id}/events"}, status_code=202)
+
+
+@app.get("/replay/jobs/{job_id}/events")
+async def bulk_replay_events(request: Request, job_id: str):
+    job = replay_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+
+    async def event_stream():
+        cursor = 0
+        while True:
+            events = job.events_since(cursor)
+            cursor += len(events)
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event['event'] == 'complete':
+                    return
+            if await request.is_disconnected():
+                return
+            if not events:
+                await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/request/{request_id}/modify_form", response_class=HTMLResponse)
 async def get_modify_form(request: Request, request_id: str):
     try:
-        request_data = r_logger.load_request(request_id)
+        request_data = await run_in_threadpool(r_logger.load_request, request_id)
         request_data.update(RequestUtil.parse_request_kwargs(request_data))
 
         return templates.TemplateResponse("modify_form.html", {"request": request, "request_data": request_data})
@@ -145,8 +360,8 @@ async def search_requests(
 
     # Perform the search
     try:
-        results = r_logger.search_requests(query, start_time=start_time, end_time=end_time)
+        page = await run_in_threadpool(_request_page, query, start_time, end_time, 'timestamp', 'desc')
     except ValueError as e:
         return HTMLResponse(content=f"<p class='text-red-500'>Error: {str(e)}</p>", status_code=400)
 
-    return templates.TemplateResponse("request_list.html", {"request": request, "requests": results})
+    return templates.TemplateResponse("request_list.html", {"request": request, **page})
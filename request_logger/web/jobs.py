@@ -0,0 +1,110 @@
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from request_logger.core.replayer import Replayer
+
+
+class ReplayJob:
+    """
+    A bulk replay running in the background. Progress is recorded as a list of
+    events that clients read from a cursor, so any number of clients can follow
+    the same job.
+    """
+
+    def __init__(self, request_ids: Optional[List[str]] = None, query: Optional[Dict[str, Any]] = None, unique: bool = False):
+        self.id = str(uuid.uuid4())
+        self.request_ids = request_ids
+        self.query = query
+        self.unique = unique
+        self.total: Optional[int] = None
+        self.done = 0
+        self.failed = 0
+        self.finished = False
+        self.events: List[Dict[str, Any]] = []
+        self._lock = Lock()
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append({'event': event, 'data': data})
+
+    def events_since(self, cursor: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self.events[cursor:]
+
+    def run(self, replayer: Replayer) -> None:
+        storage = replayer.storage
+        try:
+            request_ids = self.request_ids
+            if request_ids is None:
+                if self.unique:
+                    request_ids = storage.representative_request_ids(self.query)
+                else:
+                    request_ids = storage.search_request_ids(self.query or {})
+            self.total = len(request_ids)
+            self._emit('start', {'job_id': self.id, 'total': self.total})
+
+            # iter_requests skips requests that no longer exist; walk the IDs
+            # alongside it to report those as failed
+            pending_ids = iter(request_ids)
+            for request_data in storage.iter_requests(request_ids):
+                for request_id in pending_ids:
+                    if request_id == request_data['id']:
+                        break
+                    self._report_missing(request_id)
+                progress = {'request_id': request_data['id']}
+                try:
+                    response = replayer.replay_request_data(request_data)
+                    progress['status_code'] = response.status_code
+                except Exception as e:
+                    self.failed += 1
+                    progress['error'] = str(e)
+                self._report(progress)
+            for request_id in pending_ids:
+                self._report_missing(request_id)
+        except Exception as e:
+            self._emit('error', {'error': str(e)})
+        finally:
+            self.finished = True
+            self._emit('complete', {'done': self.done, 'total': self.total, 'failed': self.failed})
+
+    def _report_missing(self, request_id: str) -> None:
+        self.failed += 1
+        self._report({'request_id': request_id, 'error': f"Request with ID {request_id} not found."})
+
+    def _report(self, progress: Dict[str, Any]) -> None:
+        self.done += 1
+        progress.update({'done': self.done, 'total': self.total, 'failed': self.failed})
+        self._emit('progress', progress)
+
+
+class ReplayJobManager:
+    """
+    Starts replay jobs on an executor and keeps the most recent ones around so
+    their progress can still be read after they finish.
+    """
+
+    def __init__(self, replayer: Replayer, executor: Executor, max_jobs: int = 50):
+        self.replayer = replayer
+        self.executor = executor
+        self.max_jobs = max_jobs
+        self.jobs: 'OrderedDict[str, ReplayJob]' = OrderedDict()
+        self._lock = Lock()
+
+    def start(self, request_ids: Optional[List[str]] = None, query: Optional[Dict[str, Any]] = None, unique: bool = False) -> ReplayJob:
+        job = ReplayJob(request_ids=request_ids, query=query, unique=unique)
+        with self._lock:
+            self.jobs[job.id] = job
+            # Forget the oldest finished jobs; running ones are kept, whatever their age
+            excess = len(self.jobs) - self.max_jobs
+            if excess > 0:
+                finished = [job_id for job_id, old in self.jobs.items() if old.finished]
+                for job_id in finished[:excess]:
+                    del self.jobs[job_id]
+        self.executor.submit(job.run, self.replayer)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReplayJob]:
+        return self.jobs.get(job_id)
@@ -0,0 +1,52 @@
+// Live tail: prepend requests pushed by /tail to the request list
+(function () {
+  var toggle = document.getElementById('live-tail-toggle');
+  if (!toggle) {
+    return;
+  }
+  var source = null;
+
+  function appendRequest(summary) {
+    var list = document.querySelector('#request-list ul');
+    if (!list) {
+      document.getElementById('request-list').innerHTML = '<ul class="list-disc pl-5"></ul>';
+      list = document.querySelector('#request-list ul');
+    }
+    var item = document.createElement('li');
+    item.className = 'mb-2';
+    var link = document.createElement('a');
+    link.href = '/request/' + encodeURIComponent(summary.id);
+    link.setAttribute('hx-get', link.getAttribute('href'));
+    link.setAttribute('hx-target', '#details');
+    link.setAttribute('hx-swap', 'innerHTML');
+    link.className = 'text-blue-500 hover:underline';
+    link.textContent = '[' + summary.timestamp + '] ' + summary.method + ' - ' + summary.url;
+    item.appendChild(link);
+    list.insertBefore(item, list.firstChild);
+    htmx.process(item);
+  }
+
+  toggle.addEventListener('click', function () {
+    if (source) {
+      source.close();
+      source = null;
+      toggle.textContent = 'Start live tail';
+      return;
+    }
+    var params = new URLSearchParams();
+    ['method', 'host', 'path'].forEach(function (name) {
+      var input = document.getElementById('tail-' + name);
+      if (input && input.value) {
+        params.set(name, input.value);
+      }
+    });
+    source = new EventSource('/tail?' + params.toString());
+    source.addEventListener('request', function (event) {
+      appendRequest(JSON.parse(event.data));
+    });
+    source.addEventListener('dropped', function (event) {
+      document.getElementById('tail-status').textContent = JSON.parse(event.data).dropped + ' requests dropped';
+    });
+    toggle.textContent = 'Stop live tail';
+  });
+})();
@@ -0,0 +1,68 @@
+import logging
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Optional
+
+from request_logger.core.events import EventBus, Subscription
+from request_logger.core.metadata_store import MetadataStore
+
+logger = logging.getLogger(__name__)
+
+
+class IndexTail:
+    """
+    Follows the requests added to a metadata index by any process, so that
+    the web UI sees what a separate logging process saves. A background
+    thread polls the index for rows added since the previous poll, every
+    `interval` seconds while anyone is subscribed, and publishes their
+    summaries to `events`.
+    """
+
+    def __init__(self, metadata_store: MetadataStore, interval: float = 0.25, batch_size: int = 500):
+        self.metadata_store = metadata_store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.events = EventBus()
+        self._cursor = 0
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def subscribe(self, maxsize: int = 1000, filter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Subscription:
+        subscription = self.events.subscribe(maxsize=maxsize, filter=filter)
+        with self._lock:
+            if self._thread is None:
+                # Only requests added from now on are new
+                self._cursor = self.metadata_store.last_added()
+                self._thread = Thread(target=self._run, name='request-logger-tail', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def poll(self) -> int:
+        """
+        Publish the requests added since the previous poll and return how many.
+        """
+        if not self.events.subscriber_count():
+            # Nobody is listening; skip what was added meanwhile
+            self._cursor = self.metadata_store.last_added()
+            return 0
+        published = 0
+        while True:
+            rows = self.metadata_store.added_since(self._cursor, limit=self.batch_size)
+            for cursor, summary in rows:
+                self.events.publish(summary)
+                self._cursor = cursor
+            published += len(rows)
+            if len(rows) < self.batch_size:
+                return published
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling the metadata index for new requests failed")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from request_logger.cli import transfer
+from request_logger.cli.main import main
+from request_logger.cli.progress import Checkpoint, ordered_map
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage, TieredStorage
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = self._path('logs')
+        self.source = FileStorage(self.source_dir, max_logs=None, metadata_store=MetadataStore(self._path('metadata.db')))
+        for i in range(25):
+            request_id = f'req{i:02d}'
+            self.source.save_request(request_id, {
+                'id': request_id, 'timestamp': f'2024010100{i:02d}00000000',
+                'method': 'POST' if i % 2 else 'GET', 'url': f'https://example.com/{i}', 'fingerprint': None,
+            })
+
+    def tearDown(self):
+        self.source.close()
+        self.tmp_dir.cleanup()
+
+    def _path(self, *parts):
+        return os.path.join(self.tmp_dir.name, *parts)
+
+    def _run(self, *argv):
+        return main(list(argv))
+
+    def _open(self, name, db):
+        return FileStorage(self._path(name), max_logs=None, metadata_store=MetadataStore(self._path(db)))
+
+    def test_copy_between_file_storages(self):
+        code = self._run('copy', self.source_dir, f"{self._path('copy')}?db={self._path('copy.db')}", '--method', 'POST', '-q')
+        self.assertEqual(code, 0)
+
+        copied = self._open('copy', 'copy.db')
+        self.assertEqual(sorted(copied.list_request_ids()), [f'req{i:02d}' for i in range(1, 25, 2)])
+        self.assertEqual(len(copied.search_request_ids({'method': 'POST'})), 12)
+        copied.close()
+
+    def test_copy_refuses_shared_metadata_database(self):
+        self.assertEqual(self._run('copy', self.source_dir, self._path('copy'), '-q'), 2)
+
+    def test_copy_resumes_from_checkpoint(self):
+        checkpoint_path = self._path('copy.ckpt')
+        destination = f"{self._path('copy')}?db={self._path('copy.db')}"
+        job = {'command': 'copy', 'source': self.source_dir, 'destination': destination}
+        checkpoint = Checkpoint(checkpoint_path, job)
+        checkpoint.update(self.source.get_sorted_identifiers()[19], force=True)
+
+        self.assertEqual(self._run('copy', self.source_dir, destination, '--checkpoint', checkpoint_path, '-q'), 0)
+        copied = self._open('copy', 'copy.db')
+        self.assertEqual(sorted(copied.list_request_ids()), [f'req{i:02d}' for i in range(20, 25)])
+        copied.close()
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_export_import_roundtrip(self):
+        archive = self._path('archive')
+        self.assertEqual(self._run('export', self.source_dir, archive, '--segment-records', '10', '--gzip', '-q'), 0)
+        self.assertEqual(sorted(os.listdir(archive)), [f'requests-00000{i}.jsonl.gz' for i in range(3)])
+
+        self.assertEqual(self._run('import', archive, f"{self._path('restored')}?db={self._path('restored.db')}", '-q'), 0)
+        restored = self._open('restored', 'restored.db')
+        self.assertEqual(sorted(restored.list_request_ids()), sorted(self.source.list_request_ids()))
+        self.assertEqual(restored.load_request('req07'), self.source.load_request('req07'))
+        restored.close()
+
+    def test_rebuild_index(self):
+        os.remove(self._path('metadata.db'))
+        with open(os.path.join(self.source_dir, '20240102000000000000_broken.json'), 'w') as f:
+            f.write('{')
+
+        self.assertEqual(self._run('rebuild-index', self.source_dir, '-q'), 1)
+        store = MetadataStore(self._path('metadata.db'))
+        self.assertEqual(len(store.search({'url': 'example.com'})), 25)
+        store.close()
+
+    def test_verify_and_repair(self):
+        self.source.metadata_store.delete_request_metadata('req03')
+        os.remove(os.path.join(self.source_dir, self.source.get_sorted_identifiers()[5]))
+        path = os.path.join(self.source_dir, self.source.get_sorted_identifiers()[0])
+        with open(path) as f:
+            request_data = json.load(f)
+        request_data['method'] = 'PUT'
+        with open(path, 'w') as f:
+            json.dump(request_data, f)
+
+        self.assertEqual(self._run('verify', self.source_dir, '--deep', '-q'), 1)
+        self.assertEqual(self._run('verify', self.source_dir, '--deep', '--repair', '-q'), 0)
+        self.assertEqual(self._run('verify', self.source_dir, '--deep', '-q'), 0)
+
+    def test_verify_and_rebuild_keep_migrated_requests(self):
+        tiered = TieredStorage(self._open('hot', 'hot.db'), self._open('cold', 'cold.db'), max_logs=3, max_rate=None, background=False)
+        for i in range(5):
+            tiered.save_request(f'req{i}', {'id': f'req{i}', 'timestamp': f'2024010200{i:02d}00000000', 'method': 'GET', 'url': 'https://example.com/'})
+        self.assertEqual(tiered.migrate(), 2)
+        tiered.close()
+        hot = f"{self._path('hot')}?db={self._path('hot.db')}"
+
+        self.assertEqual(self._run('verify', hot, '--deep', '-q'), 0)
+        self.assertEqual(self._run('verify', hot, '--deep', '--repair', '-q'), 0)
+        self.assertEqual(self._run('rebuild-index', hot, '-q'), 0)
+        store = MetadataStore(self._path('hot.db'))
+        self.assertEqual(store.count_in_tier(None), 3)
+        self.assertEqual(store.count_in_tier('cold'), 2)
+        self.assertEqual(store.get_location('req0'), ('20240102000000000000', 'cold'))
+        store.close()
+
+    def test_compact(self):
+        before = sum(os.path.getsize(os.path.join(self.source_dir, f)) for f in os.listdir(self.source_dir))
+        self.assertEqual(self._run('compact', self.source_dir, '-q'), 0)
+        after = sum(os.path.getsize(os.path.join(self.source_dir, f)) for f in os.listdir(self.source_dir))
+        self.assertLess(after, before)
+        self.assertEqual(self.source.load_request('req04')['url'], 'https://example.com/4')
+
+    def test_select_requests_pages_through_matches(self):
+        identifiers = self.source.get_sorted_identifiers()
+        # A second request at an existing timestamp, and an index row without a file
+        self.source.save_request('req05b', {
+            'id': 'req05b', 'timestamp': '20240101000500000000', 'method': 'POST',
+            'url': 'https://example.com/5b', 'fingerprint': None,
+        })
+        self.source.metadata_store.add_request_metadata({
+            'id': 'gone', 'timestamp': '20240101000700000000', 'method': 'POST', 'url': 'https://example.com/gone',
+        })
+        with patch.object(transfer, 'SELECT_PAGE_SIZE', 3), \
+                patch.object(self.source, 'search_request_ids', side_effect=AssertionError):
+            pairs = transfer.select_requests(self.source, {'method': 'POST'}, after=identifiers[2])
+            self.assertNotIsInstance(pairs, list)
+            selected = [request_id for _, request_id in pairs]
+            count = transfer.count_requests(self.source, {'method': 'POST'}, after=identifiers[2])
+        self.assertEqual(selected, ['req03', 'req05', 'req05b'] + [f'req{i:02d}' for i in range(7, 25, 2)])
+        self.assertEqual(count, len(selected))
+
+    def test_select_requests_without_query(self):
+        identifiers = self.source.get_sorted_identifiers()
+        pairs = list(transfer.select_requests(self.source, after=identifiers[22]))
+        self.assertEqual(pairs, [(identifiers[23], 'req23'), (identifiers[24], 'req24')])
+
+
+class TestOrderedMap(unittest.TestCase):
+    def test_preserves_order(self):
+        results = [result for _, result in ordered_map(lambda x: x * 2, range(100), workers=4)]
+        self.assertEqual(results, [x * 2 for x in range(100)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from threading import Thread
+
+from request_logger.core.analytics import LatencySketch, RollupStore
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.request_logger import RequestLogger
+from request_logger.core.storage import FileStorage
+
+
+class TestLatencySketch(unittest.TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        sketch = LatencySketch(relative_accuracy=0.01)
+        for value in range(1, 1001):
+            sketch.add(value)
+        self.assertAlmostEqual(sketch.quantile(0.5), 500, delta=500 * 0.01 + 1)
+        self.assertAlmostEqual(sketch.quantile(0.95), 950, delta=950 * 0.01 + 1)
+
+    def test_merge(self):
+        left, right = LatencySketch(), LatencySketch()
+        for value in range(1, 501):
+            left.add(value)
+        for value in range(501, 1001):
+            right.add(value)
+        merged = LatencySketch.from_json(left.to_json())
+        merged.merge(right)
+        self.assertEqual(merged.count, 1000)
+        self.assertAlmostEqual(merged.quantile(0.99), 990, delta=990 * 0.01 + 1)
+
+
+class TestRollupStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.tmp_dir.name, 'metadata.db')
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            max_logs=2,
+            metadata_store=MetadataStore(db_path=db_path),
+        )
+        self.rollups = RollupStore(db_path=db_path, flush_every=3).attach(self.storage)
+
+    def test_rollups_outlive_retention(self):
+        for i in range(5):
+            request_id = f'req{i}'
+            self.storage.save_request(request_id, {
+                'id': request_id,
+                'timestamp': f'2024010112{i:02d}00000000',
+                'method': 'GET',
+                'url': f'https://api.example.com/users/{i}',
+                'response': {'status_code': 200, 'content': 'aGVsbG8=', 'elapsed_ms': 10.0 * (i + 1)},
+            })
+
+        self.assertEqual(len(self.storage.list_request_ids()), 2)
+        per_hour = self.rollups.requests_per_bucket('hour')
+        self.assertEqual(per_hour, [{
+            'bucket': '2024010112', 'method': 'GET', 'host': 'api.example.com',
+            'path': '/users/{id}', 'count': 5, 'errors': 0,
+        }])
+        self.assertEqual(len(self.rollups.requests_per_bucket('minute')), 5)
+
+        latency = self.rollups.latency_quantiles(group_by='host')
+        self.assertEqual(latency[0]['count'], 5)
+        self.assertAlmostEqual(latency[0]['p50'], 30.0, delta=0.5)
+        self.assertEqual(self.rollups.top_payload_sizes()[0]['max_response_bytes'], 5)
+
+    def test_logger_maintains_rollups_for_readers(self):
+        self.rollups.detach(self.storage)
+        writer = RollupStore(db_path=self.rollups.db_path, flush_every=1)
+        self.addCleanup(writer.close)
+        logger = RequestLogger(storage=self.storage, max_logs=2, rollups=writer)
+
+        logger.log_request('POST', 'https://api.example.com/users/7', json={'a': 1})
+        rows = self.rollups.requests_per_bucket('hour')
+        self.assertEqual([(row['method'], row['path'], row['count']) for row in rows], [('POST', '/users/{id}', 1)])
+
+    def test_concurrent_flushes_keep_every_latency(self):
+        stores = [RollupStore(db_path=self.rollups.db_path, flush_every=1) for _ in range(2)]
+        for store in stores:
+            self.addCleanup(store.close)
+
+        def record(store):
+            for i in range(50):
+                store.record({
+                    'timestamp': '20240101120000000000',
+                    'method': 'GET',
+                    'url': 'https://api.example.com/users',
+                    'response': {'status_code': 200, 'elapsed_ms': float(i + 1)},
+                })
+
+        threads = [Thread(target=record, args=(store,)) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latency = self.rollups.latency_quantiles(group_by='host', granularity='minute')
+        self.assertEqual(latency[0]['count'], 100)
+        self.assertEqual(self.rollups.requests_per_bucket('minute')[0]['count'], 100)
+
+    def tearDown(self):
+        self.rollups.close()
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
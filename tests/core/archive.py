@@ -0,0 +1,135 @@
+import base64
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from request_logger.core.archive import ParquetArchive, ParquetSegmentWriter, record_to_row, row_to_record
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def make_request(i, day=1):
+    return {
+        'id': f'req{day}-{i:03d}',
+        'timestamp': f'202401{day:02d}{i // 60 % 24:02d}{i % 60:02d}00000000',
+        'method': 'POST' if i % 2 else 'GET',
+        'url': f'https://API{i % 3}.example.com/items/{i}?page=1',
+        'headers': {'Content-Type': 'application/json', 'Content-Length': '11'},
+        'data': None,
+        'json': {'n': i},
+        'files': None,
+        'original_kwargs': {'json': {'n': i}},
+        'fingerprint': f'fp{i % 5}',
+        'response': {
+            'status_code': 404 if i % 10 == 0 else 200, 'reason': 'OK', 'headers': {},
+            'content': base64.b64encode(b'{"ok": true}').decode('utf-8'), 'elapsed_ms': 1.5,
+        },
+    }
+
+
+class TestArchiveRows(unittest.TestCase):
+    def test_roundtrip(self):
+        request_data = make_request(7)
+        row = record_to_row(request_data)
+        self.assertEqual(row['host'], 'api1.example.com')
+        self.assertEqual(row['path'], '/items/7')
+        self.assertEqual(row['response_size'], 12)
+        self.assertEqual(row_to_record(row), request_data)
+
+    def test_without_bodies(self):
+        record = row_to_record(record_to_row(make_request(7), include_bodies=False))
+        self.assertIsNone(record['json'])
+        self.assertIsNone(record['response']['content'])
+        self.assertEqual(record['response']['status_code'], 200)
+
+
+@unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+class TestParquetArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'archive')
+        writer = ParquetSegmentWriter(os.path.join(self.path, 'requests-000000.parquet'), row_group_size=50)
+        for day in (1, 2):
+            for i in range(120):
+                writer.write(make_request(i, day))
+        writer.close()
+        self.archive = ParquetArchive(self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_partitions(self):
+        self.assertEqual(sorted(os.listdir(self.path)), ['date=2024-01-01', 'date=2024-01-02'])
+        self.assertEqual(self.archive.count(), 240)
+
+    def test_search(self):
+        self.assertEqual(len(self.archive.search_request_ids({'method': 'post'})), 120)
+        self.assertEqual(len(self.archive.search_request_ids({'url': 'api1.EXAMPLE'})), 80)
+        self.assertEqual(self.archive.count({'status_code': 404, 'host': 'api0.example.com'}), 8)
+        self.assertEqual(self.archive.count({'path': '/items/11'}), 22)
+
+    def test_time_range(self):
+        ids = self.archive.search_request_ids({}, start_time='2024-01-02 00:00:00', end_time='2024-01-02 00:09:00')
+        self.assertEqual(sorted(ids), [f'req2-{i:03d}' for i in range(10)])
+
+    def test_load_request(self):
+        self.assertEqual(self.archive.load_request('req2-033'), make_request(33, 2))
+        with self.assertRaises(FileNotFoundError):
+            self.archive.load_request('missing')
+
+    def test_file_storage_searches_archive(self):
+        storage = FileStorage(
+            os.path.join(self.tmp_dir.name, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(self.tmp_dir.name, 'metadata.db')),
+            archive=self.archive,
+        )
+        live = make_request(0, 3)
+        storage.save_request(live['id'], live)
+
+        results = storage.search_requests({'url': 'api0.example.com/items/0?'})
+        self.assertEqual(sorted(r['id'] for r in results), ['req1-000', 'req2-000', 'req3-000'])
+        storage.close()
+
+    def test_file_storage_skips_archive_for_recent_ranges(self):
+        storage = FileStorage(
+            os.path.join(self.tmp_dir.name, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(self.tmp_dir.name, 'metadata.db')),
+            archive=self.archive,
+        )
+        live = make_request(0, 3)
+        storage.save_request(live['id'], live)
+
+        with patch.object(self.archive, 'iter_requests', wraps=self.archive.iter_requests) as archive_search:
+            results = storage.search_requests({}, start_time='2024-01-03 00:00:00')
+            self.assertEqual([r['id'] for r in results], ['req3-000'])
+            archive_search.assert_not_called()
+
+            results = storage.search_requests({}, start_time='2024-01-02 01:59:00')
+            self.assertEqual(sorted(r['id'] for r in results), ['req2-119', 'req3-000'])
+            self.assertEqual(archive_search.call_count, 1)
+        storage.close()
+
+    def test_file_storage_skips_empty_archive(self):
+        empty = os.path.join(self.tmp_dir.name, 'empty')
+        os.makedirs(empty)
+        archive = ParquetArchive(empty)
+        self.assertTrue(archive.is_empty())
+        self.assertFalse(self.archive.is_empty())
+
+        storage = FileStorage(
+            os.path.join(self.tmp_dir.name, 'logs'), max_logs=None,
+            metadata_store=MetadataStore(os.path.join(self.tmp_dir.name, 'metadata.db')),
+            archive=archive,
+        )
+        with patch.object(archive, 'iter_requests') as archive_search:
+            storage.search_requests({'method': 'GET'})
+            archive_search.assert_not_called()
+        storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+from request_logger.core.storage import AbstractStorage
+
+
+class ListStorage(AbstractStorage):
+    """
+    Minimal backend relying on the defaults of AbstractStorage.
+    """
+
+    def __init__(self):
+        self.records = {}
+
+    def save_request(self, request_id, request_data):
+        self.records[request_id] = request_data
+
+    def load_request(self, request_id):
+        if request_id not in self.records:
+            raise FileNotFoundError(request_id)
+        return self.records[request_id]
+
+    def delete_request(self, request_id):
+        self.records.pop(request_id, None)
+
+    def _delete_by_identifier(self, identifier):
+        self.delete_request(self._extract_request_id(identifier))
+
+    def search_requests(self, query):
+        return [r for r in self.records.values() if all(r.get(k) == v for k, v in query.items())]
+
+    def list_request_ids(self):
+        return list(self.records)
+
+    def list_filenames(self):
+        return [f"{r['timestamp']}_{r['id']}.json" for r in self.records.values()]
+
+    def get_sorted_identifiers(self):
+        return sorted(self.list_filenames())
+
+
+class TestAbstractStorageDefaults(unittest.TestCase):
+    def setUp(self):
+        self.storage = ListStorage()
+        for i, day in enumerate(('01', '02', '03')):
+            self.storage.save_request(f'r{i}', {'id': f'r{i}', 'timestamp': f'202401{day}000000000000', 'method': 'GET'})
+
+    def test_search_request_ids_applies_time_range(self):
+        ids = self.storage.search_request_ids({'method': 'GET'}, start_time='2024-01-02 00:00:00', end_time='2024-01-02 23:59:59')
+        self.assertEqual(ids, ['r1'])
+
+    def test_iter_requests_applies_time_range(self):
+        loaded = [r['id'] for r in self.storage.iter_requests(query={}, start_time='2024-01-02 00:00:00')]
+        self.assertEqual(loaded, ['r1', 'r2'])
+
+    def test_invalid_time_format(self):
+        with self.assertRaises(ValueError):
+            self.storage.search_request_ids({}, start_time='yesterday')
+
+    def test_iter_requests_loads_sequentially_by_default(self):
+        threads = set()
+        load = self.storage.load_request
+
+        def record_thread(request_id):
+            threads.add(threading.current_thread())
+            return load(request_id)
+
+        self.storage.load_request = record_thread
+        self.assertEqual([r['id'] for r in self.storage.iter_requests(['r0', 'r1'])], ['r0', 'r1'])
+        self.assertEqual(threads, {threading.current_thread()})
+
+    def test_prefetch_window_and_executor_reuse(self):
+        for i in range(3, 20):
+            self.storage.save_request(f'r{i}', {'id': f'r{i}', 'timestamp': '20240104000000000000'})
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        load = self.storage.load_request
+
+        def slow_load(request_id):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.005)
+            with lock:
+                state['running'] -= 1
+            return load(request_id)
+
+        self.storage.load_request = slow_load
+        ids = [f'r{i}' for i in range(20)]
+        loaded = [r['id'] for r in self.storage.iter_requests(ids + ['missing'], prefetch=3)]
+        self.assertEqual(loaded, ids)
+        self.assertLessEqual(state['peak'], 3)
+
+        executor = self.storage._prefetch_executor()
+        list(self.storage.iter_requests(ids, prefetch=3))
+        self.assertIs(self.storage._prefetch_executor(), executor)
+        self.storage._shutdown_prefetch()
+
+
+if __name__ == '__main__':
+    unittest.main()
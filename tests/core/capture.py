@@ -0,0 +1,152 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter
+
+from request_logger.core.capture import BodyCapture, encode_body
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.replayer import Replayer
+from request_logger.core.request_logger import RequestLogger
+from request_logger.core.storage import FileStorage
+
+
+class ConsumingAdapter(BaseAdapter):
+    """
+    Reads the request body the way a transport would and answers 200.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if hasattr(body, 'read'):
+            body = b''.join(iter(lambda: body.read(1000), b''))
+        elif body is not None and not isinstance(body, (bytes, str)):
+            body = b''.join(body)
+        self.sent.append((request.headers.get('Content-Length'), body))
+        response = requests.models.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response._content = b''
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class RedirectingAdapter(ConsumingAdapter):
+    """
+    Answers the first request with a 307 redirect to /moved.
+    """
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if len(self.sent) == 1:
+            response.status_code = 307
+            response.headers['Location'] = 'https://example.com/moved'
+            response.url = request.url
+        return response
+
+
+class FailingAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        raise requests.ConnectionError('Connection refused')
+
+    def close(self):
+        pass
+
+
+class TestEncodeBody(unittest.TestCase):
+    def test_small_bodies_are_kept(self):
+        self.assertEqual(encode_body(b'abc', 10), {'content': 'YWJj', 'is_base64': True})
+        self.assertEqual(encode_body('abc', 10), {'content': 'abc', 'is_base64': False})
+
+    def test_large_bodies_are_truncated(self):
+        body = b'x' * 100
+        self.assertEqual(encode_body(body, 3), {
+            'content': 'eHh4', 'is_base64': True, 'truncated': True,
+            'size': 100, 'sha256': hashlib.sha256(body).hexdigest(),
+        })
+        record = encode_body('é' * 10, 4)
+        self.assertEqual((record['content'], record['size']), ('éééé', 20))
+
+    def test_capture_spills_to_disk(self):
+        capture = BodyCapture(max_size=None, spill_threshold=10)
+        for _ in range(5):
+            capture.write(b'0123456789')
+        self.assertTrue(capture._buffer._rolled)
+        self.assertEqual(capture.result(), encode_body(b'0123456789' * 5, None))
+
+
+class TestStreamingCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            metadata_store=MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db')),
+        )
+        self.logger = RequestLogger(storage=self.storage, max_logs=None, max_body_size=1000, spill_threshold=100)
+        self.adapter = ConsumingAdapter()
+        self.session = self.logger.get_logged_session()
+        self.session.mount('https://', self.adapter)
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def _logged(self):
+        return self.storage.load_request(self.storage.list_request_ids()[0])
+
+    def test_generator_body(self):
+        self.session.post('https://example.com/upload', data=(chunk for chunk in (b'abc', b'def')))
+        self.assertEqual(self.adapter.sent, [(None, b'abcdef')])
+        self.assertEqual(self._logged()['data'], encode_body(b'abcdef'))
+
+    def test_file_body_keeps_length(self):
+        self.session.post('https://example.com/upload', data=io.BytesIO(b'y' * 5000))
+        self.assertEqual(self.adapter.sent, [('5000', b'y' * 5000)])
+        data = self._logged()['data']
+        self.assertEqual((data['truncated'], data['size']), (True, 5000))
+        self.assertEqual(data['sha256'], hashlib.sha256(b'y' * 5000).hexdigest())
+
+        with self.assertRaises(ValueError):
+            Replayer(self.storage).replay_request(self._logged()['id'])
+
+    def test_failed_send_is_truncated(self):
+        self.session.mount('https://', FailingAdapter())
+        with self.assertRaises(requests.ConnectionError):
+            self.session.post('https://example.com/upload', data=io.BytesIO(b'abc'))
+        data = self._logged()['data']
+        self.assertTrue(data['truncated'])
+        self.assertNotIn('sha256', data)
+
+        with self.assertRaises(ValueError):
+            Replayer(self.storage).replay_request(self._logged()['id'])
+
+    def test_file_body_is_rewound_on_redirect(self):
+        adapter = RedirectingAdapter()
+        self.session.mount('https://', adapter)
+        body = io.BytesIO(b'--' + b'z' * 10)
+        body.read(2)
+        response = self.session.post('https://example.com/upload', data=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(adapter.sent, [('10', b'z' * 10), ('10', b'z' * 10)])
+        self.assertEqual(self._logged()['data'], encode_body(b'z' * 10))
+
+    def test_upload_file_object(self):
+        self.session.post('https://example.com/upload', files={'file': ('a.txt', io.BytesIO(b'content'))})
+        logged = self._logged()
+        self.assertEqual(logged['files']['file']['content'], encode_body(b'content')['content'])
+        self.assertIn(b'content', self.adapter.sent[0][1])
+        self.assertNotIn('data', logged['original_kwargs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
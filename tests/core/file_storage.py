@@ -0,0 +1,231 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from request_logger.core.events import make_request_filter
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage
+from request_logger.core.storage.file import RECOVERY_MARKER
+
+
+class TestFileStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.metadata_store = MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db'))
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            max_logs=None,
+            metadata_store=self.metadata_store,
+        )
+
+    def _save(self, request_id, method='GET', url='https://example.com/api', timestamp='20240101000000000000', fingerprint=None):
+        request_data = {'id': request_id, 'timestamp': timestamp, 'method': method, 'url': url, 'fingerprint': fingerprint}
+        self.storage.save_request(request_id, request_data)
+        return request_data
+
+    def test_iter_requests_preserves_order(self):
+        ids = [f'req{i}' for i in range(20)]
+        for i, request_id in enumerate(ids):
+            self._save(request_id, timestamp=f'202401010000{i:02d}000000')
+
+        wanted = list(reversed(ids))
+        loaded = [r['id'] for r in self.storage.iter_requests(wanted, prefetch=4)]
+        self.assertEqual(loaded, wanted)
+
+    def test_iter_requests_skips_missing(self):
+        self._save('a')
+        self._save('b')
+        loaded = [r['id'] for r in self.storage.iter_requests(['a', 'missing', 'b'], prefetch=2)]
+        self.assertEqual(loaded, ['a', 'b'])
+
+    def test_iter_requests_with_query(self):
+        self._save('a', method='GET')
+        self._save('b', method='POST')
+        loaded = [r['id'] for r in self.storage.iter_requests(query={'method': 'POST'})]
+        self.assertEqual(loaded, ['b'])
+
+    def test_group_by_fingerprint(self):
+        self._save('a', timestamp='20240101000001000000', fingerprint='fp1')
+        self._save('b', timestamp='20240101000002000000', fingerprint='fp2')
+        self._save('c', timestamp='20240101000000000000', fingerprint='fp1')
+        self._save('d', timestamp='20240101000003000000')
+
+        self.assertEqual(self.storage.count_by_fingerprint(), {'fp1': 2, 'fp2': 1, 'd': 1})
+        self.assertEqual(self.storage.representative_request_ids(), ['c', 'b', 'd'])
+        self.assertEqual(self.storage.representative_request_ids({'fingerprint': 'fp1'}), ['c'])
+
+    def test_save_publishes_to_subscribers(self):
+        with self.storage.events.subscribe(maxsize=2, filter=make_request_filter(method='POST')) as subscription:
+            self._save('a', method='GET')
+            for request_id in ('b', 'c', 'd'):
+                self._save(request_id, method='POST')
+
+            self.assertEqual(subscription.dropped, 1)
+            self.assertEqual(subscription.get(timeout=0)['id'], 'c')
+            self.assertEqual(subscription.get(timeout=0)['id'], 'd')
+            self.assertIsNone(subscription.get(timeout=0))
+
+    def _reopen(self, clean=False, **kwargs):
+        if clean:
+            self.storage.close()
+        else:
+            # A crashed process releases its lock along with its descriptors
+            self.storage.metadata_store.close()
+            if self.storage._lock_fd is not None:
+                os.close(self.storage._lock_fd)
+                self.storage._lock_fd = None
+        self.metadata_store = MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db'))
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            max_logs=None,
+            metadata_store=self.metadata_store,
+            **kwargs,
+        )
+
+    def _write_raw(self, filename, content):
+        with open(os.path.join(self.storage.storage_dir, filename), 'w') as f:
+            f.write(content)
+
+    def test_recovery_after_crash(self):
+        self._save('a', timestamp='20240101000001000000')
+        self._save('b', timestamp='20240101000002000000')
+        # Crash between the file write and the index update of 'c', a lost
+        # file for 'b', a torn record and an interrupted temporary write
+        self._write_raw('20240101000003000000_c.json', '{"id": "c", "timestamp": "20240101000003000000", "method": "POST", "url": "/c"}')
+        os.remove(os.path.join(self.storage.storage_dir, '20240101000002000000_b.json'))
+        self._write_raw('20240101000004000000_d.json', '{"id": "d"')
+        self._write_raw('.20240101000005000000_e.json.tmp', '{')
+
+        self._reopen()
+        self.assertEqual(self.storage.search_request_ids({'method': 'POST'}), ['c'])
+        self.assertEqual(self.storage.search_request_ids({'method': 'GET'}), ['a'])
+        self.assertEqual(sorted(os.listdir(self.storage.storage_dir)), [
+            '.recovery', '.recovery.lock', '20240101000001000000_a.json', '20240101000003000000_c.json', '20240101000004000000_d.json.corrupt',
+        ])
+
+    def test_recovery_is_skipped_after_clean_close(self):
+        self._save('a')
+        self._reopen(clean=True)
+        self._write_raw('20240101000001000000_b.json', '{"id": "b", "timestamp": "20240101000001000000", "method": "GET", "url": "/b"}')
+        self._reopen(clean=True)
+        self.assertEqual(self.storage.search_request_ids({'method': 'GET'}), ['a'])
+
+    def test_recovery_starts_at_sync_point(self):
+        self._reopen(sync_records=2)
+        for i in range(4):
+            self._save(f'r{i}', timestamp=f'2024010100000{i}000000')
+        self._wait_for_sync_point('20240101000003000000_r3.json')
+        self.metadata_store.delete_request_metadata('r0')
+        self.metadata_store.delete_request_metadata('r3')
+        self._write_raw('20240101000004000000_r4.json', '{"id": "r4", "timestamp": "20240101000004000000", "method": "GET", "url": "/"}')
+
+        self._reopen()
+        self.assertEqual(sorted(self.storage.search_request_ids({'method': 'GET'})), ['r1', 'r2', 'r4'])
+
+    def _wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "condition was never met")
+            time.sleep(0.01)
+
+    def _wait_for_sync_point(self, identifier):
+        # The marker is advanced by the sync thread, not by save_request
+        self._wait_until(lambda: self.storage._read_marker().get('synced') == identifier)
+
+    def test_save_leaves_sync_to_background_thread(self):
+        self._reopen(clean=True, sync_records=1)
+        threads = []
+        with patch.object(self.storage, '_write_marker', side_effect=lambda clean: threads.append(threading.current_thread().name)):
+            self._save('a')
+            self._wait_until(lambda: threads)
+        self.assertEqual(threads, ['request-logger-sync'])
+
+    def test_sync_point_waits_for_saves_in_progress(self):
+        self._reopen(clean=True, durability='group', sync_interval=60)
+        # 'b' has been captured before 'c' but is still being saved
+        self.storage._in_flight['20240101000001000000_b.json'] = 1
+        self._save('a', timestamp='20240101000000000000')
+        self._save('c', timestamp='20240101000002000000')
+        self.storage.sync()
+        self.assertEqual(self.storage._read_marker()['synced'], '20240101000000000000_a.json')
+
+        self.storage._end_save('20240101000001000000_b.json', saved=True)
+        self.storage.sync()
+        self.assertEqual(self.storage._read_marker()['synced'], '20240101000002000000_c.json')
+
+    def test_durability_modes(self):
+        for durability in ('group', 'record'):
+            self._reopen(clean=True, durability=durability, sync_records=2)
+            for i in range(3):
+                self._save(f'{durability}{i}')
+            self.storage.sync()
+            self.assertEqual(self.storage.load_request(f'{durability}2')['id'], f'{durability}2')
+        with self.assertRaises(ValueError):
+            FileStorage(storage_dir=self.storage.storage_dir, metadata_store=self.metadata_store, durability='always')
+
+    def test_group_sync_checkpoints_index_before_marker(self):
+        self._reopen(clean=True, durability='group', sync_interval=60)
+        self._save('a')
+        calls = MagicMock()
+        with patch.object(self.metadata_store, 'checkpoint', wraps=self.metadata_store.checkpoint) as checkpoint, \
+                patch.object(self.storage, '_write_marker', wraps=self.storage._write_marker) as write_marker:
+            calls.attach_mock(checkpoint, 'checkpoint')
+            calls.attach_mock(write_marker, 'write_marker')
+            self.storage.sync()
+        self.assertEqual([c[0] for c in calls.mock_calls], ['checkpoint', 'write_marker'])
+        self.assertEqual(self.storage._read_marker()['synced'], '20240101000000000000_a.json')
+
+    def test_group_sync_keeps_recovery_point_when_checkpoint_blocked(self):
+        self._reopen(clean=True, durability='group', sync_interval=60)
+        self._save('a')
+        with patch.object(self.metadata_store, 'checkpoint', return_value=False):
+            self.storage.sync()
+        self.assertIsNone(self.storage._read_marker()['synced'])
+
+    def _open_second(self, **kwargs):
+        return FileStorage(
+            storage_dir=self.storage.storage_dir,
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db')),
+            **kwargs,
+        )
+
+    @unittest.skipIf(os.name != 'posix', 'needs fcntl')
+    def test_second_open_leaves_recovery_to_lock_holder(self):
+        self._save('a')
+        # A write in progress in the first storage
+        self._write_raw('.20240101000001000000_b.json.tmp', '{')
+        os.remove(os.path.join(self.storage.storage_dir, RECOVERY_MARKER))
+
+        second = self._open_second()
+        second.save_request('c', {'id': 'c', 'timestamp': '20240101000002000000', 'method': 'GET', 'url': '/c'})
+        second.close()
+        self.assertTrue(os.path.exists(os.path.join(self.storage.storage_dir, '.20240101000001000000_b.json.tmp')))
+        self.assertFalse(os.path.exists(os.path.join(self.storage.storage_dir, RECOVERY_MARKER)))
+
+        # Once the first storage is gone, the next open takes over recovery
+        self._reopen()
+        self.assertFalse(os.path.exists(os.path.join(self.storage.storage_dir, '.20240101000001000000_b.json.tmp')))
+        self.assertEqual(self.storage._read_marker()['clean'], False)
+
+    def test_read_only_open_never_touches_marker(self):
+        self._reopen(clean=True)
+        self._write_raw('.20240101000001000000_b.json.tmp', '{')
+        marker_path = os.path.join(self.storage.storage_dir, RECOVERY_MARKER)
+        os.remove(marker_path)
+
+        reader = self._open_second(recover=False)
+        reader.close()
+        self.assertFalse(os.path.exists(marker_path))
+        self.assertTrue(os.path.exists(os.path.join(self.storage.storage_dir, '.20240101000001000000_b.json.tmp')))
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
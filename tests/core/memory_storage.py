@@ -0,0 +1,114 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage, MemoryStorage
+
+
+class TestMemoryStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = MemoryStorage(max_logs=5, max_bytes=None)
+
+    def _save(self, request_id, method='GET', url='https://example.com/api', timestamp='20240101000000000000', fingerprint=None, body=''):
+        request_data = {'id': request_id, 'timestamp': timestamp, 'method': method, 'url': url, 'fingerprint': fingerprint, 'data': body}
+        self.storage.save_request(request_id, request_data)
+        return request_data
+
+    def test_save_and_load(self):
+        saved = self._save('a')
+        loaded = self.storage.load_request('a')
+        self.assertEqual(loaded, saved)
+        loaded['method'] = 'POST'
+        self.assertEqual(self.storage.load_request('a')['method'], 'GET')
+        with self.assertRaises(FileNotFoundError):
+            self.storage.load_request('missing')
+
+    def test_evicts_oldest_over_capacity(self):
+        for i in range(8):
+            self._save(f'r{i}', timestamp=f'2024010100000{i}000000')
+        self.assertEqual(self.storage.list_request_ids(), [f'r{i}' for i in range(3, 8)])
+
+    def test_evicts_over_byte_budget(self):
+        self.storage = MemoryStorage(max_logs=None, max_bytes=1000)
+        for i in range(10):
+            self._save(f'r{i}', body='x' * 200)
+        self.assertLessEqual(self.storage.nbytes, 1000)
+        self.assertEqual(self.storage.list_request_ids()[-1], 'r9')
+        self.assertLess(len(self.storage), 10)
+
+        self._save('big', body='x' * 5000)
+        self.assertEqual(self.storage.list_request_ids(), ['big'])
+
+    def test_search(self):
+        self._save('a', method='GET', url='https://example.com/users', timestamp='20240101000000000000', fingerprint='fp1')
+        self._save('b', method='POST', url='https://example.com/users', timestamp='20240102000000000000', fingerprint='fp2')
+        self._save('c', method='POST', url='https://example.com/items', timestamp='20240103000000000000', fingerprint='fp2')
+
+        self.assertEqual([r['id'] for r in self.storage.search_requests({'method': 'post', 'url': 'USERS'})], ['b'])
+        self.assertEqual(self.storage.search_request_ids({}, start_time='2024-01-02 00:00:00'), ['b', 'c'])
+        self.assertEqual(self.storage.count_by_fingerprint(), {'fp2': 2, 'fp1': 1})
+        self.assertEqual([s['id'] for s in self.storage.list_request_summaries(limit=2)], ['c', 'b'])
+
+    def test_delete(self):
+        self._save('a')
+        self._save('b')
+        self.storage.delete_request('a')
+        self.assertEqual(self.storage.list_request_ids(), ['b'])
+        self.storage._delete_by_identifier(self.storage.list_filenames()[0])
+        self.assertEqual(len(self.storage), 0)
+        self.assertEqual(self.storage.nbytes, 0)
+
+
+class TestMemoryStorageSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.target = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db')),
+        )
+
+    def tearDown(self):
+        self.target.close()
+        self.tmp_dir.cleanup()
+
+    def _fill(self, storage, count, start=0):
+        for i in range(start, start + count):
+            storage.save_request(f'r{i}', {'id': f'r{i}', 'timestamp': f'202401010000{i:02d}000000', 'method': 'GET', 'url': '/'})
+
+    def test_snapshot_is_incremental(self):
+        storage = MemoryStorage(snapshot_to=self.target)
+        self._fill(storage, 3)
+        self.assertEqual(storage.snapshot(), 3)
+        self._fill(storage, 2, start=3)
+        self.assertEqual(storage.snapshot(), 2)
+        self.assertEqual(sorted(self.target.list_request_ids()), [f'r{i}' for i in range(5)])
+
+    def test_snapshot_on_close(self):
+        storage = MemoryStorage(snapshot_to=self.target, snapshot_interval=60)
+        self._fill(storage, 2)
+        storage.close()
+        self.assertEqual(sorted(self.target.list_request_ids()), ['r0', 'r1'])
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'requires SIGUSR1')
+    def test_snapshot_on_signal(self):
+        storage = MemoryStorage(snapshot_to=self.target)
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            storage.snapshot_on_signal()
+            self._fill(storage, 2)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            deadline = time.monotonic() + 5
+            while len(self.target.list_request_ids()) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(sorted(self.target.list_request_ids()), ['r0', 'r1'])
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+            storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage
+
+
+class TestMetadataPagination(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db'))
+        # 120 requests sharing 12 timestamps, so pages split runs of equal sort keys
+        self.records = [
+            {'id': f'r{i:03d}', 'timestamp': f'2024010100{i // 10:02d}00000000', 'method': 'POST' if i % 3 else 'GET', 'url': f'https://example.com/{i % 4}'}
+            for i in range(120)
+        ]
+        self.store.add_many(self.records)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _all_pages(self, sort='timestamp', descending=True, limit=50, **kwargs):
+        rows, after = [], None
+        while True:
+            page = self.store.list_requests(sort=sort, descending=descending, after=after, limit=limit, **kwargs)
+            rows.extend(page)
+            if len(page) < limit:
+                return rows
+            after = (page[-1][sort], page[-1]['id'])
+
+    def test_pages_cover_every_row_once(self):
+        for descending in (True, False):
+            rows = self._all_pages(descending=descending)
+            expected = sorted(self.records, key=lambda r: (r['timestamp'], r['id']), reverse=descending)
+            self.assertEqual([r['id'] for r in rows], [r['id'] for r in expected])
+
+    def test_ties_are_broken_on_id(self):
+        rows = self._all_pages(sort='method', descending=False, limit=7)
+        keys = [(r['method'], r['id']) for r in rows]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(r['id'] for r in rows)), 120)
+
+    def test_cursor_is_stable_when_rows_are_added(self):
+        first = self.store.list_requests(limit=50)
+        # A newer request must not shift the next page of a descending listing
+        self.store.add_request_metadata({'id': 'new', 'timestamp': '20250101000000000000', 'method': 'GET', 'url': '/'})
+        second = self.store.list_requests(after=(first[-1]['timestamp'], first[-1]['id']), limit=50)
+        expected = sorted(self.records, key=lambda r: (r['timestamp'], r['id']), reverse=True)[50:100]
+        self.assertEqual([r['id'] for r in second], [r['id'] for r in expected])
+
+    def test_filters_apply_to_every_page(self):
+        rows = self._all_pages(query={'method': 'GET'}, limit=9)
+        self.assertEqual(len(rows), 40)
+        self.assertTrue(all(r['method'] == 'GET' for r in rows))
+
+    def test_resaving_keeps_tier(self):
+        self.store.set_tier(['r000'], 'cold')
+        self.store.add_request_metadata({**self.records[0], 'method': 'PUT'})
+        self.store.add_many([self.records[0]])
+        self.assertEqual(self.store.get_location('r000'), (self.records[0]['timestamp'], 'cold'))
+        self.assertEqual(len(self._all_pages(hot_only=True)), 119)
+
+    def test_unknown_sort_field(self):
+        with self.assertRaises(ValueError):
+            self.store.list_requests(sort='id; DROP TABLE request_metadata')
+
+    def test_file_storage_summaries(self):
+        # Summaries come from the index alone; there are no files to recover
+        storage = FileStorage(storage_dir=os.path.join(self.tmp_dir.name, 'logs'), max_logs=None, metadata_store=self.store, recover=False)
+        summaries = storage.list_request_summaries(
+            start_time='2024-01-01 00:05:00', sort='timestamp', descending=False, limit=5,
+        )
+        self.assertEqual([s['id'] for s in summaries], ['r050', 'r051', 'r052', 'r053', 'r054'])
+        self.assertEqual(set(summaries[0]), {'id', 'timestamp', 'method', 'url', 'fingerprint'})
+
+
+if __name__ == '__main__':
+    unittest.main()
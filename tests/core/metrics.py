@@ -0,0 +1,49 @@
+import unittest
+
+from request_logger.core.metrics import MetricsHook, MetricsRegistry
+
+
+class RecordingHook(MetricsHook):
+    def __init__(self):
+        self.observed = []
+
+    def observe(self, stage, seconds):
+        self.observed.append(stage)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(buckets=(0.001, 1.0))
+
+    def test_timed_records_stage(self):
+        hook = RecordingHook()
+        self.registry.add_hook(hook)
+        with self.registry.timed('storage.save'):
+            pass
+        self.registry.observe('storage.save', 0.5)
+
+        self.assertEqual(self.registry.snapshot()['storage.save']['count'], 2)
+        self.assertEqual(hook.observed, ['storage.save', 'storage.save'])
+
+    def test_disabled_registry_records_nothing(self):
+        self.registry.enabled = False
+        with self.registry.timed('storage.save'):
+            pass
+        self.registry.increment('events_dropped')
+        self.assertEqual(self.registry.snapshot(), {})
+
+    def test_render_prometheus(self):
+        self.registry.observe('log_request', 0.5)
+        self.registry.increment('events_dropped', 3)
+        self.registry.register_gauge('tail_queue_depth', lambda: 7)
+
+        text = self.registry.render_prometheus()
+        self.assertIn('request_logger_stage_seconds_bucket{stage="log_request",le="0.001"} 0', text)
+        self.assertIn('request_logger_stage_seconds_bucket{stage="log_request",le="1"} 1', text)
+        self.assertIn('request_logger_stage_seconds_count{stage="log_request"} 1', text)
+        self.assertIn('request_logger_events_dropped_total 3', text)
+        self.assertIn('request_logger_tail_queue_depth 7', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.playback import PlaybackAdapter, PlaybackIndex, PlaybackMissError, PlaybackServer
+from request_logger.core.request_logger import RequestLogger
+from request_logger.core.storage import FileStorage
+
+
+def fake_response(status_code, content, headers=None):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.reason = 'OK'
+    response.headers.update(headers or {'Content-Type': 'application/json'})
+    response._content = content
+    return response
+
+
+class TestPlayback(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            metadata_store=MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db')),
+        )
+        self.logger = RequestLogger(storage=self.storage, max_logs=None, capture_responses=True)
+
+    def _record(self, method, url, response, **kwargs):
+        send = MagicMock(return_value=response)
+        self.logger._send_and_log(send, method, url, **kwargs)
+
+    def test_adapter_matches_normalised_request(self):
+        self._record('GET', 'https://example.com/items?b=2&a=1', fake_response(200, b'{"items": []}'))
+        self._record('POST', 'https://example.com/items', fake_response(201, b'{"id": 1}'), json={'name': 'x', 'size': 2})
+
+        session = requests.Session()
+        session.mount('https://', PlaybackAdapter(PlaybackIndex(self.storage)))
+
+        response = session.get('https://EXAMPLE.com/items?a=1&b=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'items': []})
+
+        response = session.post('https://example.com/items', json={'size': 2, 'name': 'x'})
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertRaises(PlaybackMissError):
+            session.get('https://example.com/other')
+
+    def test_ambiguous_cycle(self):
+        self._record('GET', 'https://example.com/counter', fake_response(200, b'1'))
+        self._record('GET', 'https://example.com/counter', fake_response(200, b'2'))
+
+        index = PlaybackIndex(self.storage, on_ambiguous='cycle')
+        session = requests.Session()
+        session.mount('https://', PlaybackAdapter(index))
+        bodies = [session.get('https://example.com/counter').content for _ in range(3)]
+        self.assertEqual(bodies, [b'1', b'2', b'1'])
+
+    def test_ambiguous_uses_capture_order(self):
+        for body in (b'1', b'2', b'3'):
+            self._record('GET', 'https://example.com/counter', fake_response(200, body))
+
+        for policy, expected in (('first', b'1'), ('last', b'3')):
+            index = PlaybackIndex(self.storage, on_ambiguous=policy)
+            session = requests.Session()
+            session.mount('https://', PlaybackAdapter(index))
+            self.assertEqual(session.get('https://example.com/counter').content, expected)
+
+    def test_server(self):
+        self._record('GET', 'https://example.com/health', fake_response(200, b'ok', {'Content-Type': 'text/plain'}))
+
+        index = PlaybackIndex(self.storage, include_host=False, on_missing='not_found')
+        with PlaybackServer(index) as server:
+            self.assertEqual(requests.get(f"{server.url}/health").text, 'ok')
+            self.assertEqual(requests.get(f"{server.url}/missing").status_code, 404)
+
+    def test_server_rejects_index_matching_on_host(self):
+        with self.assertRaises(ValueError):
+            PlaybackServer(PlaybackIndex(self.storage))
+
+    def test_large_response_bodies_are_truncated(self):
+        self.logger.max_body_size = 4
+        self._record('GET', 'https://example.com/large', fake_response(200, b'0123456789'))
+        response = self.storage.search_requests({'url': '/large'})[0]['response']
+        self.assertEqual((response['truncated'], response['size']), (True, 10))
+
+        index = PlaybackIndex(self.storage, on_missing='not_found')
+        self.assertEqual(len(index), 0)
+
+    def test_responses_are_not_captured_by_default(self):
+        logger = RequestLogger(storage=self.storage, max_logs=None)
+        logger._send_and_log(MagicMock(return_value=fake_response(200, b'ok')), 'GET', 'https://example.com/plain')
+        self.assertNotIn('response', self.storage.search_requests({'url': '/plain'})[0])
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+
+from request_logger.core import storage
+from request_logger.core.storage import FileStorage, available_backends, get_backend, register_backend
+
+
+class TestStorageRegistry(unittest.TestCase):
+    def test_builtin_backends(self):
+        self.assertIs(get_backend('file'), FileStorage)
+        self.assertTrue({'file', 's3', 'postgres'} <= set(available_backends()))
+
+    def test_lazy_attribute(self):
+        self.assertIs(storage.S3Storage, get_backend('s3'))
+        with self.assertRaises(AttributeError):
+            storage.MissingStorage
+
+    def test_register_by_path(self):
+        register_backend('test-file', 'request_logger.core.storage.file:FileStorage')
+        self.assertIs(get_backend('test-file'), FileStorage)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend('does-not-exist')
+
+    def test_core_import_skips_optional_dependencies(self):
+        code = (
+            "import sys, request_logger.core;"
+            "from request_logger.core.storage import S3Storage;"
+            "S3Storage('bucket');"
+            "print(','.join(m for m in ('boto3', 'botocore', 'pyarrow', 'psycopg2') if m in sys.modules))"
+        )
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
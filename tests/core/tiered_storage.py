@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.storage import FileStorage, TieredStorage
+
+
+class TestTieredStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        root = self.tmp_dir.name
+        hot = FileStorage(
+            storage_dir=os.path.join(root, 'hot'),
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=os.path.join(root, 'hot.db')),
+        )
+        self.cold = FileStorage(
+            storage_dir=os.path.join(root, 'cold'),
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=os.path.join(root, 'cold.db')),
+        )
+        self.storage = TieredStorage(
+            hot, self.cold, max_logs=3, max_rate=None,
+            cache_dir=os.path.join(root, 'cache'), cache_size=2, background=False,
+        )
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def _save(self, request_id, method='GET', timestamp='20240101000000000000'):
+        request_data = {'id': request_id, 'timestamp': timestamp, 'method': method, 'url': 'https://example.com/api'}
+        self.storage.save_request(request_id, request_data)
+        return request_data
+
+    def _save_many(self, count):
+        for i in range(count):
+            self._save(f'req{i}', method='POST' if i % 2 else 'GET', timestamp=f'202401010000{i:02d}000000')
+
+    def test_migrates_oldest_over_capacity(self):
+        self._save_many(5)
+        self.assertEqual(self.storage.migrate(), 2)
+        self.assertEqual(sorted(self.cold.list_request_ids()), ['req0', 'req1'])
+        self.assertEqual(len(self.storage.hot.list_filenames()), 3)
+        self.assertEqual(self.storage.migrate(), 0)
+
+    def test_load_routes_by_tier(self):
+        self._save_many(5)
+        self.storage.migrate()
+        self.assertEqual(self.storage.load_request('req0')['id'], 'req0')
+        self.assertEqual(self.storage.load_request('req4')['id'], 'req4')
+        with self.assertRaises(FileNotFoundError):
+            self.storage.load_request('missing')
+
+    def test_cold_reads_are_cached(self):
+        self._save_many(5)
+        self.storage.migrate()
+        self.storage.load_request('req0')
+        self.cold.delete_request('req0')
+        self.assertEqual(self.storage.load_request('req0')['id'], 'req0')
+
+    def test_search_and_listing_cover_both_tiers(self):
+        self._save_many(5)
+        self.storage.migrate()
+        found = sorted(r['id'] for r in self.storage.search_requests({'method': 'POST'}))
+        self.assertEqual(found, ['req1', 'req3'])
+        self.assertEqual(self.storage.list_request_ids(), [f'req{i}' for i in range(5)])
+
+    def test_delete_from_either_tier(self):
+        self._save_many(5)
+        self.storage.migrate()
+        self.storage.delete_request('req0')
+        self.storage.delete_request('req4')
+        self.assertEqual(self.storage.list_request_ids(), ['req1', 'req2', 'req3'])
+        self.assertNotIn('req0', self.cold.list_request_ids())
+
+
+if __name__ == '__main__':
+    unittest.main()
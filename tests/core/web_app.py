@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from request_logger.core.metadata_store import MetadataStore
+from request_logger.core.replayer import Replayer
+from request_logger.core.request_logger import RequestLogger
+from request_logger.core.storage import FileStorage
+
+try:
+    from fastapi.testclient import TestClient
+except ImportError:  # The web UI is optional
+    TestClient = None
+
+
+@unittest.skipIf(TestClient is None, 'requires fastapi')
+class TestWebApp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The app opens request_logs/ in the working directory on import
+        cls.import_dir = tempfile.TemporaryDirectory()
+        cwd = os.getcwd()
+        os.chdir(cls.import_dir.name)
+        try:
+            from request_logger.web import app as app_module
+        finally:
+            os.chdir(cwd)
+        cls.app_module = app_module
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.import_dir.cleanup()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = FileStorage(
+            storage_dir=os.path.join(self.tmp_dir.name, 'logs'),
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=os.path.join(self.tmp_dir.name, 'metadata.db')),
+        )
+        self.replayer = Replayer(self.storage)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.index_tail = self.app_module.IndexTail(self.storage.metadata_store, interval=0.01)
+        self.addCleanup(self.index_tail.stop)
+        patches = {
+            'storage': self.storage,
+            'r_logger': RequestLogger(storage=self.storage, max_logs=None),
+            'replayer': self.replayer,
+            'replay_jobs': self.app_module.ReplayJobManager(self.replayer, self.executor),
+            'index_tail': self.index_tail,
+            'SSE_KEEPALIVE_INTERVAL': 0.05,
+            'SSE_POLL_INTERVAL': 0.01,
+        }
+        for name, value in patches.items():
+            patcher = patch.object(self.app_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(self.app_module.app)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def _save(self, request_id, timestamp, method='GET', url='https://example.com/api'):
+        self.storage.save_request(request_id, {'id': request_id, 'timestamp': timestamp, 'method': method, 'url': url})
+
+    def _ids(self, html):
+        return re.findall(r'href="/request/([^"]+)"', html)
+
+    def _next_url(self, html):
+        match = re.search(r'hx-get="(/requests\?[^"]+)"', html)
+        return match.group(1).replace('&amp;', '&') if match else None
+
+    def test_infinite_scroll_pages(self):
+        page_size = self.app_module.PAGE_SIZE
+        # Five requests per timestamp, so page boundaries fall inside runs of equal keys
+        for i in range(page_size * 2 + 7):
+            self._save(f'r{i:03d}', f'2024010100{i // 5:04d}000000')
+
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        ids = self._ids(response.text)
+        next_url = self._next_url(response.text)
+        self.assertEqual(len(ids), page_size)
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            ids += self._ids(response.text)
+            next_url = self._next_url(response.text)
+
+        expected = sorted((f'2024010100{i // 5:04d}000000', f'r{i:03d}') for i in range(page_size * 2 + 7))
+        self.assertEqual(ids, [request_id for _, request_id in reversed(expected)])
+
+    def test_requests_partial_filters_and_rejects_bad_sort(self):
+        self._save('a', '20240101000000000000', method='GET')
+        self._save('b', '20240101000001000000', method='POST')
+        response = self.client.get('/requests', params={'method': 'POST', 'sort': 'url', 'order': 'asc'})
+        self.assertEqual(self._ids(response.text), ['b'])
+        self.assertEqual(self.client.get('/requests', params={'sort': 'id'}).status_code, 400)
+
+    def _first_tail_event(self, save, **filters):
+        # TestClient buffers whole responses, so the endless stream is read directly
+        async def first_event():
+            request = MagicMock()
+            request.is_disconnected = AsyncMock(return_value=False)
+            params = {'method': None, 'host': None, 'path': None, **filters}
+            response = await self.app_module.tail_requests(request, **params)
+            self.assertEqual(response.media_type, 'text/event-stream')
+            save()
+            events = response.body_iterator
+            try:
+                async for chunk in events:
+                    if chunk.startswith('event: request'):
+                        return json.loads(chunk.split('data: ', 1)[1])
+            finally:
+                await events.aclose()
+
+        return asyncio.run(first_event())
+
+    def test_tail_streams_matching_requests(self):
+        self._save('old', '20231231000000000000', method='POST')
+
+        def save():
+            self._save('a', '20240101000000000000', method='GET')
+            self._save('b', '20240101000001000000', method='POST')
+
+        self.assertEqual(self._first_tail_event(save, method='POST')['id'], 'b')
+        self.assertEqual(self.index_tail.events.subscriber_count(), 0)
+
+    def test_tail_follows_requests_saved_by_another_logger(self):
+        # As in a separate logging process: its own storage, index connection and event bus
+        other_storage = FileStorage(
+            storage_dir=self.storage.storage_dir,
+            max_logs=None,
+            metadata_store=MetadataStore(db_path=self.storage.metadata_store.db_path),
+        )
+        self.addCleanup(other_storage.close)
+        logger = RequestLogger(storage=other_storage, max_logs=None)
+
+        summary = self._first_tail_event(lambda: logger.log_request('PUT', 'https://example.com/items/1', json={'a': 1}))
+        self.assertEqual((summary['method'], summary['url']), ('PUT', 'https://example.com/items/1'))
+
+    def test_bulk_replay_events(self):
+        self._save('a', '20240101000000000000')
+        self._save('b', '20240101000001000000')
+        response_mock = MagicMock(status_code=204)
+        with patch.object(self.replayer, 'replay_request_data', return_value=response_mock):
+            started = self.client.post('/replay/bulk', data={'request_ids': ['a', 'b']})
+            self.assertEqual(started.status_code, 202)
+            with self.client.stream('GET', started.json()['events_url']) as response:
+                events = [line[len('event: '):] for line in response.iter_lines() if line.startswith('event: ')]
+                self.assertEqual(events[0], 'start')
+                self.assertEqual(events[-1], 'complete')
+        job = self.app_module.replay_jobs.get(started.json()['job_id'])
+        self.assertEqual((job.done, job.total, job.failed), (2, 2, 0))
+
+
+    def test_bulk_replay_counts_missing_requests(self):
+        self._save('a', '20240101000000000000')
+        response_mock = MagicMock(status_code=204)
+        with patch.object(self.replayer, 'replay_request_data', return_value=response_mock):
+            started = self.client.post('/replay/bulk', data={'request_ids': ['missing', 'a', 'gone']})
+            with self.client.stream('GET', started.json()['events_url']) as response:
+                data = [json.loads(line[len('data: '):]) for line in response.iter_lines() if line.startswith('data: ')]
+        self.assertEqual([d.get('request_id') for d in data[1:-1]], ['missing', 'a', 'gone'])
+        self.assertEqual(data[-1], {'done': 3, 'total': 3, 'failed': 2})
+
+
+class TestReplayJobManager(unittest.TestCase):
+    def test_evicts_finished_jobs_behind_running_ones(self):
+        executor = MagicMock()
+        manager = self._manager(executor)
+        running = manager.start(request_ids=['a'])
+        finished = []
+        for _ in range(4):
+            job = manager.start(request_ids=['a'])
+            job.finished = True
+            finished.append(job)
+        manager.start(request_ids=['a'])
+
+        self.assertIn(running.id, manager.jobs)
+        self.assertEqual(len(manager.jobs), 3)
+        self.assertNotIn(finished[0].id, manager.jobs)
+
+    def _manager(self, executor):
+        from request_logger.web.jobs import ReplayJobManager
+        return ReplayJobManager(MagicMock(), executor, max_jobs=3)
+
+
+if __name__ == '__main__':
+    unittest.main()